@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import HealthRiskPrediction
+from .models import HealthRiskPrediction, ModelTrainingJob
+from .training import ACTIVE_STATUSES, mark_job_failed
 
 
 @admin.register(HealthRiskPrediction)
@@ -8,3 +9,20 @@ class HealthRiskPredictionAdmin(admin.ModelAdmin):
     list_filter = ['risk_level', 'prediction_date', 'has_family_history']
     search_fields = ['patient__first_name', 'patient__last_name']
     readonly_fields = ['prediction_date', 'risk_level', 'risk_score', 'recommendations']
+
+
+@admin.register(ModelTrainingJob)
+class ModelTrainingJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'progress', 'requested_by', 'created_at', 'heartbeat_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = [
+        'requested_by', 'status', 'progress', 'log', 'created_at', 'started_at', 'heartbeat_at', 'finished_at',
+    ]
+    actions = ['mark_failed']
+    
+    @admin.action(description='Mark selected queued/running jobs as failed')
+    def mark_failed(self, request, queryset):
+        jobs = list(queryset.filter(status__in=ACTIVE_STATUSES))
+        for job in jobs:
+            mark_job_failed(job, f"Marked as failed by {request.user.username}.")
+        self.message_user(request, f'{len(jobs)} training job(s) marked as failed.')
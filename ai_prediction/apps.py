@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class AiPredictionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_prediction'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the feature store receivers)
+        # The risk model is warmed by the WSGI/ASGI entry points (see ml_model.warm_start),
+        # not here, so management commands and tests never train a model on startup
@@ -0,0 +1,132 @@
+"""
+Streaming training data from stored records
+
+Labelled examples come from two sources:
+- HealthRiskPrediction rows, using the inputs recorded at prediction time
+  (except population re-scores, which are the model's own output on inputs
+  that the visits source already covers)
+- MedicalVisit rows joined to their Patient, using the vitals taken at the visit
+
+A patient is labelled diabetic when their chronic conditions or any visit
+diagnosis mention diabetes. Rows are read with QuerySet.iterator() and handed
+out as fixed-size NumPy chunks, so memory stays flat however large the
+tables grow. Each source is ordered by id, and the highest id seen is the
+watermark that incremental retraining resumes from.
+"""
+
+from itertools import islice
+
+import numpy as np
+from django.db.models import BooleanField, Case, Exists, OuterRef, Q, Value, When
+
+from medical.models import MedicalVisit
+from .models import HealthRiskPrediction
+from .rescoring import RESCORE_NOTE
+
+
+SOURCES = ('predictions', 'visits')
+
+
+def diabetic_label():
+    """
+    Annotation: True when the row's patient has a recorded diabetes diagnosis
+    """
+    diagnosed = MedicalVisit.objects.filter(patient=OuterRef('patient'), diagnosis__icontains='diabetes')
+    return Case(
+        When(Q(patient__chronic_conditions__icontains='diabetes') | Exists(diagnosed), then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def prediction_rows(after_id=0):
+    """
+    (id, age, bmi, bp_systolic, bp_diastolic, family_history, label) from stored predictions
+    
+    Re-score rows are left out: a population re-score writes one row per
+    patient per model version, which would weight the training data towards
+    whoever was re-scored most often.
+    """
+    return HealthRiskPrediction.objects.filter(id__gt=after_id).exclude(notes=RESCORE_NOTE).annotate(
+        label=diabetic_label(),
+    ).order_by('id').values_list(
+        'id', 'age', 'bmi', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+        'has_family_history', 'label',
+    )
+
+
+def visit_rows(after_id=0):
+    """
+    (id, visit_date, date_of_birth, height, weight, bp_systolic, bp_diastolic,
+    family_history_mentions_diabetes, label) from visits with complete vitals
+    """
+    return MedicalVisit.objects.filter(
+        id__gt=after_id,
+        blood_pressure_systolic__isnull=False,
+        blood_pressure_diastolic__isnull=False,
+        patient__height__isnull=False,
+        patient__weight__isnull=False,
+    ).annotate(
+        family_history_flag=Case(
+            When(patient__family_history__icontains='diabetes', then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+        label=diabetic_label(),
+    ).order_by('id').values_list(
+        'id', 'visit_date', 'patient__date_of_birth', 'patient__height', 'patient__weight',
+        'blood_pressure_systolic', 'blood_pressure_diastolic', 'family_history_flag', 'label',
+    )
+
+
+def prediction_chunk(rows):
+    ids, age, bmi, bp_systolic, bp_diastolic, family_history, label = zip(*rows)
+    X = np.column_stack([
+        np.array(age, dtype=float),
+        np.array(bmi, dtype=float),
+        np.array(bp_systolic, dtype=float),
+        np.array(bp_diastolic, dtype=float),
+        np.array(family_history, dtype=float),
+    ])
+    return X, np.array(label, dtype=float), max(ids)
+
+
+def visit_chunk(rows):
+    ids, visit_date, dob, height, weight, bp_systolic, bp_diastolic, family_history, label = zip(*rows)
+    # Age at the time of the visit, same rule as Patient.get_age()
+    age = np.array([
+        v.year - d.year - ((v.month, v.day) < (d.month, d.day)) for v, d in zip(visit_date, dob)
+    ], dtype=float)
+    height_m = np.array(height, dtype=float) / 100
+    X = np.column_stack([
+        age,
+        np.round(np.array(weight, dtype=float) / height_m ** 2, 2),
+        np.array(bp_systolic, dtype=float),
+        np.array(bp_diastolic, dtype=float),
+        np.array(family_history, dtype=float),
+    ])
+    return X, np.array(label, dtype=float), max(ids)
+
+
+def iter_training_chunks(watermark=None, chunk_size=5000):
+    """
+    Stream labelled training data as (source, X, y, last_id) chunks
+    
+    Args:
+        watermark: dict of source -> last id already trained on ({} or None for all rows)
+        chunk_size: rows per chunk, also used as the database fetch size
+    """
+    watermark = watermark or {}
+    sources = {
+        'predictions': (prediction_rows, prediction_chunk),
+        'visits': (visit_rows, visit_chunk),
+    }
+    for source in SOURCES:
+        queryset, build_chunk = sources[source]
+        rows = queryset(watermark.get(source, 0)).iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            X, y, last_id = build_chunk(chunk)
+            yield source, X, y, last_id
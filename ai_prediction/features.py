@@ -0,0 +1,89 @@
+"""
+Per-patient feature store for risk prediction
+
+PatientRiskFeatures rows are recomputed from the source tables whenever a
+patient or one of their visits changes, and in bulk by the
+backfill_risk_features command. Migration 0007 backfills existing patients,
+and readers compute any row still missing on the spot, so a patient without
+a row is never mistaken for one without inputs.
+"""
+
+from decimal import Decimal
+
+from django.db.models import BooleanField, Case, OuterRef, Subquery, Value, When
+
+from medical.models import MedicalVisit
+from patients.models import Patient
+from .models import PatientRiskFeatures
+
+
+BACKFILL_CHUNK_SIZE = 2000
+
+FEATURE_FIELDS = ['bmi', 'blood_pressure_systolic', 'blood_pressure_diastolic', 'has_family_history', 'updated_at']
+
+
+def refresh_patient_features(patient_ids):
+    """
+    Recompute and upsert the stored features of the given patients in one query
+    
+    Blood pressure comes from each patient's latest visit and family history
+    is flagged when it mentions diabetes.
+    
+    Returns:
+        list of PatientRiskFeatures
+    """
+    latest_visit = MedicalVisit.objects.filter(patient=OuterRef('pk')).order_by('-visit_date')
+    rows = Patient.objects.filter(pk__in=patient_ids).annotate(
+        latest_bp_systolic=Subquery(latest_visit.values('blood_pressure_systolic')[:1]),
+        latest_bp_diastolic=Subquery(latest_visit.values('blood_pressure_diastolic')[:1]),
+        has_diabetes_history=Case(
+            When(family_history__icontains='diabetes', then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    ).values_list('pk', 'height', 'weight', 'latest_bp_systolic', 'latest_bp_diastolic', 'has_diabetes_history')
+    
+    features = []
+    for patient_id, height, weight, bp_systolic, bp_diastolic, family_history in rows:
+        bmi = None
+        if height and weight:
+            # Same rule as Patient.calculate_bmi()
+            height_m = float(height) / 100
+            bmi = Decimal(f'{float(weight) / (height_m ** 2):.2f}')
+        features.append(PatientRiskFeatures(
+            patient_id=patient_id,
+            bmi=bmi,
+            blood_pressure_systolic=bp_systolic,
+            blood_pressure_diastolic=bp_diastolic,
+            has_family_history=family_history,
+        ))
+    
+    PatientRiskFeatures.objects.bulk_create(
+        features, update_conflicts=True, unique_fields=['patient'], update_fields=FEATURE_FIELDS,
+    )
+    return features
+
+
+def get_patient_features(patient):
+    """
+    Stored features of a patient, computing them on the spot if not yet backfilled
+    """
+    try:
+        return patient.risk_features
+    except PatientRiskFeatures.DoesNotExist:
+        return refresh_patient_features([patient.pk])[0]
+
+
+def backfill_missing_features(patients):
+    """
+    Compute the stored features of the patients in a queryset that have none yet
+    
+    Returns:
+        Number of patients backfilled
+    """
+    if patients.query.is_sliced:
+        patients = Patient.objects.filter(pk__in=list(patients.values_list('pk', flat=True)))
+    missing = list(patients.filter(risk_features__isnull=True).order_by().values_list('pk', flat=True))
+    for start in range(0, len(missing), BACKFILL_CHUNK_SIZE):
+        refresh_patient_features(missing[start:start + BACKFILL_CHUNK_SIZE])
+    return len(missing)
@@ -1,5 +1,5 @@
 from django import forms
-from .models import HealthRiskPrediction
+from .models import HealthRiskPrediction, ModelTrainingJob
 
 
 class HealthRiskPredictionForm(forms.ModelForm):
@@ -17,3 +17,16 @@ class HealthRiskPredictionForm(forms.ModelForm):
             'has_family_history': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
+
+
+class ModelTrainingJobForm(forms.ModelForm):
+    """
+    Form for starting a background model training job
+    """
+    class Meta:
+        model = ModelTrainingJob
+        fields = ['source', 'incremental']
+        widgets = {
+            'source': forms.Select(attrs={'class': 'form-control'}),
+            'incremental': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        }
@@ -0,0 +1,25 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from ai_prediction.features import refresh_patient_features
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored risk model inputs (PatientRiskFeatures) for every patient'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Patients recomputed per query')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        patient_ids = Patient.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=chunk_size)
+        total = 0
+        while True:
+            chunk = list(islice(patient_ids, chunk_size))
+            if not chunk:
+                break
+            total += len(refresh_patient_features(chunk))
+            self.stdout.write(f'{total} patients refreshed')
+        self.stdout.write(self.style.SUCCESS(f'Feature store backfilled for {total} patients.'))
@@ -0,0 +1,278 @@
+"""
+Prediction benchmark suite
+
+Measures model loading, training, single and batch scoring, and the
+end-to-end predict_risk view, writes the results as JSON and optionally
+compares them with a stored baseline run:
+
+    python manage.py benchmark_predictor --output bench.json
+    python manage.py benchmark_predictor --baseline bench.json
+
+Every metric is measured once as warm-up and then --repeats times; the
+median is reported together with its noise (median absolute deviation
+relative to the median). A metric only counts as regressed if it moved by
+more than its tolerance: --tolerance (more for tail latencies), widened to
+NOISE_MULTIPLIER times the noise of either run.
+"""
+
+import json
+import platform
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ai_prediction.ml_model import HealthRiskPredictor, fit_estimators, predictor, synthetic_training_data
+
+
+# Tail latencies are inherently noisier than medians and totals
+P99_TOLERANCE_FACTOR = 2.5
+
+# Changes within this many noise widths of either run are not regressions
+NOISE_MULTIPLIER = 4
+
+
+class RollbackBenchmarkData(Exception):
+    """
+    Raised to roll back the fixture rows created for the view benchmark
+    """
+
+
+class Command(BaseCommand):
+    help = 'Benchmark model loading, training and prediction latency/throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5000, help='Single-row predictions to time')
+        parser.add_argument('--load-repeats', type=int, default=20, help='Cold load_model() calls to time')
+        parser.add_argument('--train-sizes', default='300,3000,30000',
+                            help='Comma-separated synthetic training set sizes (rows)')
+        parser.add_argument('--batch-size', type=int, default=100000, help='Rows per predict_many() call')
+        parser.add_argument('--view-requests', type=int, default=50, help='predict_risk requests to time (0 to skip)')
+        parser.add_argument('--repeats', type=int, default=5, help='Measurements per metric after one warm-up run')
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--baseline', help='Compare results with this JSON file from an earlier run')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative regression against the baseline (default 0.2 = 20%%), '
+                                 'x2.5 for p99 latencies and never below 4x the measured noise')
+
+    def handle(self, *args, **options):
+        self.metrics = {}
+        self.repeats = max(options['repeats'], 1)
+        predictor.ensure_loaded()
+        rows = self.random_rows(options['iterations'])
+
+        self.bench_cold_load(options['load_repeats'])
+        for size in [int(size) for size in options['train_sizes'].split(',') if size]:
+            self.bench_training(size)
+        self.bench_single_predict(rows)
+        self.bench_batch_predict(options['batch_size'])
+        if options['view_requests']:
+            self.bench_view(options['view_requests'])
+
+        results = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'model_version': predictor.model_version,
+            'repeats': self.repeats,
+            'metrics': self.metrics,
+        }
+        for name, metric in self.metrics.items():
+            self.stdout.write(f"{name:<32} {metric['value']:>14.2f} {metric['unit']:<7} (noise {metric['noise']:.1%})")
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(results, output_file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        self.check_cache_pays_off()
+        if options['baseline']:
+            self.compare(options['baseline'], options['tolerance'])
+
+    def check_cache_pays_off(self):
+        """
+        A cache hit must cost less than scoring afresh, or the cache is pure overhead
+        """
+        if 'predict_cached_p50' not in self.metrics:
+            return
+        cached, uncached = self.metrics['predict_cached_p50']['value'], self.metrics['predict_uncached_p50']['value']
+        if cached >= uncached:
+            raise CommandError(f'Cached predict() ({cached:.2f} us) is not faster than uncached ({uncached:.2f} us)')
+        self.stdout.write(f'Cache hit saves {1 - cached / uncached:.0%} of an uncached predict()')
+
+    def record(self, name, values, unit, better='lower'):
+        values = np.asarray(values, dtype=float)
+        median = float(np.median(values))
+        noise = float(np.median(np.abs(values - median)) / median) if median else 0.0
+        self.metrics[name] = {
+            'value': median, 'noise': noise, 'samples': values.tolist(), 'unit': unit, 'better': better,
+        }
+
+    def measure(self, name, sample, unit, better='lower'):
+        """
+        Record the median of self.repeats measurements taken after one warm-up run
+
+        Args:
+            sample: Callable returning one measurement, or {suffix: measurement}
+                to record several metrics (e.g. p50 and p99) from one run
+        """
+        sample()
+        runs = [sample() for _ in range(self.repeats)]
+        if isinstance(runs[0], dict):
+            for suffix in runs[0]:
+                self.record(f'{name}_{suffix}', [run[suffix] for run in runs], unit, better)
+        else:
+            self.record(name, runs, unit, better)
+
+    def measure_latencies(self, name, func, args_list):
+        def sample():
+            samples_us = self.time_each(func, args_list)
+            return {'p50': np.percentile(samples_us, 50), 'p99': np.percentile(samples_us, 99)}
+        self.measure(name, sample, 'us')
+
+    @staticmethod
+    def random_rows(count):
+        rng = np.random.default_rng(42)
+        return np.column_stack([
+            rng.integers(20, 80, count),
+            rng.uniform(18, 40, count).round(2),
+            rng.integers(100, 170, count),
+            rng.integers(60, 110, count),
+            rng.integers(0, 2, count),
+        ])
+
+    @staticmethod
+    def time_each(func, args_list):
+        samples = []
+        for args in args_list:
+            start = time.perf_counter()
+            func(*args)
+            samples.append((time.perf_counter() - start) * 1e6)
+        return np.array(samples)
+
+    def bench_cold_load(self, repeats):
+        def sample():
+            # Fastest of a few loads per run: a single load is dominated by scheduling noise
+            timings = []
+            for _ in range(repeats):
+                fresh = HealthRiskPredictor()
+                start = time.perf_counter()
+                fresh.load_model()
+                timings.append((time.perf_counter() - start) * 1e3)
+            return min(timings)
+        self.measure('cold_load_model', sample, 'ms')
+
+    def bench_training(self, size):
+        X, y = synthetic_training_data(max(size // 3, 1))
+
+        def sample():
+            start = time.perf_counter()
+            fit_estimators(X, y)
+            return (time.perf_counter() - start) * 1e3
+        self.measure(f'train_{len(X)}_rows', sample, 'ms')
+
+        # Full train_model() including publishing, against a throwaway registry
+        if size == 300:
+            def sample_publish():
+                with tempfile.TemporaryDirectory() as registry_dir, override_settings(AI_MODEL_REGISTRY_DIR=registry_dir):
+                    fresh = HealthRiskPredictor()
+                    start = time.perf_counter()
+                    fresh.train_model(report=lambda percent, message: None)
+                    return (time.perf_counter() - start) * 1e3
+            self.measure('train_model_publish', sample_publish, 'ms')
+
+    def bench_single_predict(self, rows):
+        row_list = rows.tolist()
+
+        # sklearn reference path vs the compiled scorer
+        model, scaler = predictor.load_estimators()
+        self.measure_latencies(
+            'sklearn_predict_proba',
+            lambda row: model.predict_proba(scaler.transform(row.reshape(1, -1))),
+            [(row,) for row in rows[:1000]],
+        )
+        self.measure_latencies('compiled_score', predictor.scorer.score, [(row,) for row in row_list])
+
+        # predict() with the memo cache disabled, then on a warm cache
+        cache_size = predictor.prediction_cache.maxsize
+        predictor.prediction_cache.maxsize = 0
+        try:
+            self.measure_latencies('predict_uncached', predictor.predict, row_list)
+        finally:
+            predictor.prediction_cache.maxsize = cache_size
+        self.measure_latencies('predict_cached', predictor.predict, [row_list[0]] * len(row_list))
+
+    def bench_batch_predict(self, batch_size):
+        rows = self.random_rows(batch_size)
+
+        def sample():
+            start = time.perf_counter()
+            predictor.predict_many(rows)
+            return batch_size / (time.perf_counter() - start)
+        self.measure('predict_many_throughput', sample, 'rows/s', better='higher')
+
+    def bench_view(self, requests):
+        from accounts.models import User
+        from medical.models import MedicalVisit
+        from patients.models import Patient
+
+        try:
+            with transaction.atomic():
+                # Unique names, so existing rows never collide (everything is rolled back anyway)
+                suffix = uuid.uuid4().hex[:12]
+                user = User.objects.create_user(username=f'benchmark-{suffix}', password='benchmark', role='DOCTOR')
+                patient = Patient.objects.create(
+                    first_name='Bench', last_name='Mark', date_of_birth='1970-01-01', gender='O',
+                    national_id=f'BENCHMARK-{suffix}', phone_number='000', address='-',
+                    height=175, weight=85, family_history='Father: diabetes',
+                )
+                MedicalVisit.objects.create(
+                    patient=patient, doctor=user, chief_complaint='-', symptoms='-', diagnosis='-',
+                    blood_pressure_systolic=135, blood_pressure_diastolic=88,
+                )
+                client = Client()
+                client.force_login(user)
+                url = reverse('predict_risk', args=[patient.id])
+                data = {
+                    'age': 56, 'bmi': '27.76', 'blood_pressure_systolic': 135,
+                    'blood_pressure_diastolic': 88, 'has_family_history': 'on',
+                }
+                self.measure_latencies('view_get', client.get, [(url,)] * requests)
+                self.measure_latencies('view_post', client.post, [(url, data)] * requests)
+                raise RollbackBenchmarkData
+        except RollbackBenchmarkData:
+            pass
+
+    def compare(self, baseline_path, tolerance):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)['metrics']
+
+        regressions = []
+        for name, metric in self.metrics.items():
+            if name not in baseline or not baseline[name]['value']:
+                continue
+            ratio = metric['value'] / baseline[name]['value']
+            change = ratio - 1 if metric['better'] == 'lower' else 1 - ratio
+            allowed = max(
+                tolerance * (P99_TOLERANCE_FACTOR if name.endswith('_p99') else 1),
+                NOISE_MULTIPLIER * max(metric['noise'], baseline[name].get('noise', 0.0)),
+            )
+            line = (
+                f"{name:<32} {baseline[name]['value']:>14.2f} -> {metric['value']:>14.2f} {metric['unit']} "
+                f"({change:+.1%}, allowed {allowed:.0%})"
+            )
+            if change > allowed:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"Regressed beyond tolerance: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
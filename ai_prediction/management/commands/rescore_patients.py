@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ai_prediction.ml_model import predictor
+from ai_prediction.rescoring import id_ranges, pending_patients, rescore_range
+from ai_prediction.workers import init_worker
+
+
+class Command(BaseCommand):
+    help = 'Re-score all active patients with the current risk model using a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Worker processes (1 runs in-process)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Patients per work unit')
+        parser.add_argument('--force', action='store_true',
+                            help='Also re-score patients already scored by the current model version')
+
+    def handle(self, *args, **options):
+        predictor.ensure_loaded()
+        version = predictor.model_version
+        force = options['force']
+
+        ranges = id_ranges(pending_patients(version, force), options['chunk_size'])
+        if not ranges:
+            self.stdout.write(self.style.SUCCESS(f'All active patients are already scored by model {version}.'))
+            return
+        self.stdout.write(f'Re-scoring with model {version}: {len(ranges)} chunks, {options["workers"]} workers')
+
+        start = time.perf_counter()
+        scored = skipped = done = 0
+
+        def progress(result):
+            nonlocal scored, skipped, done
+            scored += result[0]
+            skipped += result[1]
+            done += 1
+            rate = scored / (time.perf_counter() - start)
+            self.stdout.write(f'[{done}/{len(ranges)}] scored {scored}, skipped {skipped} ({rate:,.0f} patients/s)')
+
+        if options['workers'] <= 1:
+            for first_id, last_id in ranges:
+                progress(rescore_range(first_id, last_id, version, force))
+        else:
+            # Forked workers must open their own database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker) as pool:
+                futures = [pool.submit(rescore_range, first_id, last_id, version, force) for first_id, last_id in ranges]
+                for future in as_completed(futures):
+                    progress(future.result())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {scored} patients scored, {skipped} skipped for missing blood pressure.'
+        ))
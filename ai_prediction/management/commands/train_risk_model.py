@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from ai_prediction.ml_model import predictor
+
+
+class Command(BaseCommand):
+    help = 'Train and publish a new version of the health risk model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['synthetic', 'records'], default='synthetic',
+                            help='Train on generated synthetic data or on stored predictions and visits')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per streamed chunk (records only)')
+        parser.add_argument('--epochs', type=int, default=5, help='SGD passes over the data (records only)')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only train on records added since the current model (records only)')
+        parser.add_argument('--samples-per-class', type=int, default=100, help='Synthetic rows per risk group')
+
+    def handle(self, *args, **options):
+        def report(percent, message):
+            self.stdout.write(f'[{percent:3d}%] {message}')
+
+        if options['source'] == 'records':
+            predictor.train_from_records(
+                report=report,
+                chunk_size=options['chunk_size'],
+                epochs=options['epochs'],
+                incremental=options['incremental'],
+            )
+        else:
+            predictor.train_model(report=report, samples_per_class=options['samples_per_class'])
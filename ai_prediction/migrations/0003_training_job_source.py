@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 01:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_prediction', '0002_modeltrainingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modeltrainingjob',
+            name='incremental',
+            field=models.BooleanField(default=False, help_text='Only train on records added since the current model'),
+        ),
+        migrations.AddField(
+            model_name='modeltrainingjob',
+            name='source',
+            field=models.CharField(choices=[('SYNTHETIC', 'Synthetic data'), ('RECORDS', 'Stored patient records')], default='SYNTHETIC', max_length=10),
+        ),
+    ]
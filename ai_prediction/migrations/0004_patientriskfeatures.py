@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-18 01:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0001_initial'),
+        ('ai_prediction', '0003_training_job_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientRiskFeatures',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='risk_features', serialize=False, to='patients.patient')),
+                ('bmi', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('blood_pressure_systolic', models.IntegerField(blank=True, help_text='From the latest visit', null=True)),
+                ('blood_pressure_diastolic', models.IntegerField(blank=True, help_text='From the latest visit', null=True)),
+                ('has_family_history', models.BooleanField(default=False, help_text='Family history mentions diabetes')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_prediction', '0004_patientriskfeatures'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='healthriskprediction',
+            index=models.Index(fields=['prediction_date'], name='ai_predicti_predict_f7db4f_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_prediction', '0005_prediction_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modeltrainingjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last sign of life from the training worker', null=True),
+        ),
+    ]
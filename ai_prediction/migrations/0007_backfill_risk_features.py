@@ -0,0 +1,50 @@
+# Generated by Django 4.2 on 2026-10-18 04:05
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_risk_features(apps, schema_editor):
+    # Same computation as features.refresh_patient_features(), on the historical models
+    Patient = apps.get_model('patients', 'Patient')
+    MedicalVisit = apps.get_model('medical', 'MedicalVisit')
+    PatientRiskFeatures = apps.get_model('ai_prediction', 'PatientRiskFeatures')
+    
+    latest_visit = MedicalVisit.objects.filter(patient=OuterRef('pk')).order_by('-visit_date')
+    rows = Patient.objects.filter(risk_features__isnull=True).annotate(
+        latest_bp_systolic=Subquery(latest_visit.values('blood_pressure_systolic')[:1]),
+        latest_bp_diastolic=Subquery(latest_visit.values('blood_pressure_diastolic')[:1]),
+    ).values_list('pk', 'height', 'weight', 'latest_bp_systolic', 'latest_bp_diastolic', 'family_history')
+    
+    batch = []
+    for patient_id, height, weight, bp_systolic, bp_diastolic, family_history in rows.iterator(chunk_size=2000):
+        bmi = None
+        if height and weight:
+            height_m = float(height) / 100
+            bmi = Decimal(f'{float(weight) / (height_m ** 2):.2f}')
+        batch.append(PatientRiskFeatures(
+            patient_id=patient_id,
+            bmi=bmi,
+            blood_pressure_systolic=bp_systolic,
+            blood_pressure_diastolic=bp_diastolic,
+            has_family_history='diabetes' in (family_history or '').lower(),
+        ))
+        if len(batch) >= 2000:
+            PatientRiskFeatures.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    PatientRiskFeatures.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0001_initial'),
+        ('patients', '0001_initial'),
+        ('ai_prediction', '0006_training_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_risk_features, migrations.RunPython.noop),
+    ]
@@ -3,12 +3,242 @@ AI Health Risk Prediction Module
 Uses Logistic Regression to predict diabetes risk based on patient health metrics
 """
 
+import io
+import math
 import numpy as np
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import StandardScaler
 import joblib
 import os
+import threading
+import time
+from datetime import date
 from django.conf import settings
+from django.db.models import QuerySet
+
+from .prediction_cache import PredictionCache
+from .registry import ModelRegistry, atomic_write
+
+
+# Risk level bands applied to the predicted probability
+RISK_LEVELS = np.array(['LOW', 'MEDIUM', 'HIGH'], dtype=object)
+RISK_THRESHOLDS = np.array([0.4, 0.7])
+
+FEATURE_NAMES = ['Age', 'BMI', 'BP Systolic', 'BP Diastolic', 'Family History']
+
+# Fixed layout of the compact scorer artifact (scorer.npy)
+SCORER_FORMAT = 1
+SCORER_DTYPE = np.dtype([
+    ('format', '<u2'),
+    ('version', '<U32'),
+    ('mean', '<f8', (len(FEATURE_NAMES),)),
+    ('scale', '<f8', (len(FEATURE_NAMES),)),
+    ('coef', '<f8', (len(FEATURE_NAMES),)),
+    ('intercept', '<f8'),
+    ('thresholds', '<f8', (2,)),
+])
+
+
+def patient_feature_matrix(patients, return_ids=False):
+    """
+    Build the model input matrix for a Patient queryset in a single query
+
+    Inputs are read from the PatientRiskFeatures store (see features.py):
+    blood pressure of the latest visit and whether family history mentions
+    diabetes, matching the prediction form prefill. Patients without a
+    stored row are computed first; missing inputs (no height/weight, no
+    visit BP) are returned as NaN.
+
+    Returns:
+        numpy array of shape (n_patients, 5) in queryset order,
+        or (patient_ids, features) when return_ids is True
+    """
+    from .features import backfill_missing_features
+    
+    backfill_missing_features(patients)
+    rows = list(patients.values_list(
+        'pk', 'date_of_birth', 'risk_features__bmi',
+        'risk_features__blood_pressure_systolic', 'risk_features__blood_pressure_diastolic',
+        'risk_features__has_family_history',
+    ))
+    if not rows:
+        features = np.empty((0, len(FEATURE_NAMES)))
+        return ([], features) if return_ids else features
+
+    ids, dob, bmi, bp_systolic, bp_diastolic, family_history = zip(*rows)
+
+    # Age in whole years, same rule as Patient.get_age()
+    today = date.today()
+    birth_year = np.array([d.year for d in dob])
+    birthday_pending = np.array([(today.month, today.day) < (d.month, d.day) for d in dob])
+    age = today.year - birth_year - birthday_pending
+
+    features = np.column_stack([
+        age,
+        np.array(bmi, dtype=float),
+        np.array(bp_systolic, dtype=float),
+        np.array(bp_diastolic, dtype=float),
+        np.array(family_history, dtype=float),
+    ])
+    return (list(ids), features) if return_ids else features
+
+
+def synthetic_training_data(samples_per_class=100, seed=42):
+    """
+    Generate the synthetic training set
+    
+    Features: age, bmi, bp_systolic, bp_diastolic, family_history
+    Labels: 0 = no diabetes, 1 = diabetes
+    
+    Returns:
+        tuple: (X, y) with 3 * samples_per_class rows
+    """
+    n = samples_per_class
+    np.random.seed(seed)
+    
+    # Low risk patients
+    low_risk = np.column_stack([
+        np.random.normal(35, 10, n),  # age
+        np.random.normal(22, 2, n),   # bmi
+        np.random.normal(115, 10, n), # systolic
+        np.random.normal(75, 8, n),   # diastolic
+        np.random.binomial(1, 0.1, n) # family history
+    ])
+    low_risk_labels = np.zeros(n)
+    
+    # Medium risk patients
+    medium_risk = np.column_stack([
+        np.random.normal(50, 10, n),  # age
+        np.random.normal(27, 2, n),   # bmi
+        np.random.normal(130, 10, n), # systolic
+        np.random.normal(85, 8, n),   # diastolic
+        np.random.binomial(1, 0.4, n) # family history
+    ])
+    medium_risk_labels = np.random.binomial(1, 0.5, n)
+    
+    # High risk patients
+    high_risk = np.column_stack([
+        np.random.normal(60, 8, n),   # age
+        np.random.normal(32, 3, n),   # bmi
+        np.random.normal(145, 10, n), # systolic
+        np.random.normal(95, 8, n),   # diastolic
+        np.random.binomial(1, 0.7, n) # family history
+    ])
+    high_risk_labels = np.ones(n)
+    
+    # Combine all data
+    X = np.vstack([low_risk, medium_risk, high_risk])
+    y = np.hstack([low_risk_labels, medium_risk_labels, high_risk_labels])
+    return X, y
+
+
+def fit_estimators(X, y):
+    """
+    Fit the StandardScaler + LogisticRegression pair on a training set
+    
+    Returns:
+        tuple: (scaler, model)
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+    
+    # Standardize features
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+    
+    # Train Logistic Regression model
+    model = LogisticRegression(random_state=42, max_iter=1000)
+    model.fit(X_scaled, y)
+    return scaler, model
+
+
+class CompiledScorer:
+    """
+    Closed-form scorer exported from a fitted StandardScaler + LogisticRegression
+    
+    Holds only the fitted floats, so request-time scoring needs neither sklearn
+    nor its input validation. Probabilities follow the same arithmetic as
+    scaler.transform() followed by model.predict_proba()[:, 1].
+    """
+    
+    def __init__(self, mean, scale, coef, intercept, thresholds=RISK_THRESHOLDS, version=None):
+        self.version = version
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.coef = np.asarray(coef, dtype=float)
+        self.intercept = float(intercept)
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        
+        # Plain Python copies for the single-row path
+        self._terms = tuple(zip(self.mean.tolist(), self.scale.tolist(), self.coef.tolist()))
+        self._low, self._high = self.thresholds.tolist()
+    
+    @classmethod
+    def from_estimator(cls, scaler, model, version=None):
+        """
+        Export a fitted scaler and binary logistic regression model
+        """
+        return cls(scaler.mean_, scaler.scale_, model.coef_[0], model.intercept_[0], version=version)
+    
+    @classmethod
+    def load(cls, path):
+        """
+        Load a scorer saved with to_bytes()
+        
+        The file is memory-mapped read-only, so every worker shares one
+        page-cached copy and nothing is unpickled.
+        """
+        record = np.load(path, mmap_mode='r')
+        if record['format'] != SCORER_FORMAT:
+            raise ValueError(f"Unsupported scorer artifact format {record['format']} in {path}")
+        return cls(
+            record['mean'], record['scale'], record['coef'], record['intercept'],
+            thresholds=record['thresholds'], version=str(record['version']),
+        )
+    
+    def to_bytes(self, version=None):
+        """
+        Serialize to the fixed SCORER_DTYPE .npy layout
+        """
+        record = np.zeros((), dtype=SCORER_DTYPE)
+        record['format'] = SCORER_FORMAT
+        record['version'] = version or self.version or ''
+        record['mean'] = self.mean
+        record['scale'] = self.scale
+        record['coef'] = self.coef
+        record['intercept'] = self.intercept
+        record['thresholds'] = self.thresholds
+        buffer = io.BytesIO()
+        np.save(buffer, record, allow_pickle=False)
+        return buffer.getvalue()
+    
+    def score(self, features):
+        """
+        Probability of the positive class for one feature row (pure Python)
+        """
+        z = self.intercept
+        for value, (mean, scale, coef) in zip(features, self._terms):
+            z += (value - mean) / scale * coef
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        e = math.exp(z)
+        return e / (1.0 + e)
+    
+    def score_many(self, features):
+        """
+        Probabilities of the positive class for a 2-D feature array
+        """
+        z = ((features - self.mean) / self.scale) @ self.coef + self.intercept
+        with np.errstate(over='ignore'):
+            return 1.0 / (1.0 + np.exp(-z))
+    
+    def risk_level(self, risk_score):
+        if risk_score < self._low:
+            return 'LOW'
+        if risk_score < self._high:
+            return 'MEDIUM'
+        return 'HIGH'
+    
+    def risk_levels(self, risk_scores):
+        return RISK_LEVELS[np.digitize(risk_scores, self.thresholds)]
 
 
 class HealthRiskPredictor:
@@ -31,79 +261,227 @@ class HealthRiskPredictor:
     def __init__(self):
         self.model = None
         self.scaler = None
-        self.model_version = "1.0"
+        self.scorer = None
+        self.model_version = None
+        self.registry = ModelRegistry(
+            getattr(settings, 'AI_MODEL_REGISTRY_DIR', os.path.join(settings.BASE_DIR, 'ai_prediction', 'model_registry')),
+            keep=getattr(settings, 'AI_MODEL_REGISTRY_KEEP', 5),
+        )
+        self.reload_interval = getattr(settings, 'AI_MODEL_RELOAD_INTERVAL', 2.0)
+        self.prediction_cache = PredictionCache(
+            maxsize=getattr(settings, 'AI_PREDICTION_CACHE_SIZE', 1024),
+            shared_alias=getattr(settings, 'AI_PREDICTION_SHARED_CACHE', None),
+        )
+        # Artifacts written before the registry existed; imported as version 1.0
         self.model_path = os.path.join(settings.BASE_DIR, 'ai_prediction', 'trained_model.pkl')
         self.scaler_path = os.path.join(settings.BASE_DIR, 'ai_prediction', 'scaler.pkl')
+        self._lock = threading.RLock()
+        self._generation = None
+        self._next_check = 0.0
+    
+    def ensure_loaded(self):
+        """
+        Load the model exactly once per process, training it if no saved model exists
+        
+        Called by warm_start() at server startup so requests never pay this cost;
+        the lock keeps concurrent callers from loading or training twice.
+        """
+        if self.scorer is not None:
+            self.refresh_if_stale()
+            return
+        with self._lock:
+            if self.scorer is None:
+                if not self.load_model():
+                    self.train_model()
     
-    def train_model(self):
+    def refresh_if_stale(self):
+        """
+        Reload when another process has published a new model version
+        
+        At most one stat() of the registry pointer every reload_interval seconds,
+        so every worker picks up a retrained model within seconds of publication.
+        """
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        if self.registry.generation() != self._generation:
+            with self._lock:
+                if self.registry.generation() != self._generation:
+                    self.load_model()
+    
+    def train_model(self, report=None, samples_per_class=100):
         """
         Train the model with synthetic training data
         In a real-world scenario, this would use actual patient data
+        
+        Args:
+            report: optional callable(percent, message) receiving progress updates;
+                messages are printed when omitted
+            samples_per_class: synthetic patients generated per risk group
+        
+        The fit runs without holding the predictor lock, so requests keep
+        scoring (and reloading) the current model; _publish() swaps it.
         """
-        # Synthetic training data (features: age, bmi, bp_systolic, bp_diastolic, family_history)
-        # Labels: 0 = no diabetes, 1 = diabetes
-        
-        # Generate synthetic training data
-        np.random.seed(42)
-        
-        # Low risk patients
-        low_risk = np.column_stack([
-            np.random.normal(35, 10, 100),  # age
-            np.random.normal(22, 2, 100),   # bmi
-            np.random.normal(115, 10, 100), # systolic
-            np.random.normal(75, 8, 100),   # diastolic
-            np.random.binomial(1, 0.1, 100) # family history
-        ])
-        low_risk_labels = np.zeros(100)
-        
-        # Medium risk patients
-        medium_risk = np.column_stack([
-            np.random.normal(50, 10, 100),  # age
-            np.random.normal(27, 2, 100),   # bmi
-            np.random.normal(130, 10, 100), # systolic
-            np.random.normal(85, 8, 100),   # diastolic
-            np.random.binomial(1, 0.4, 100) # family history
-        ])
-        medium_risk_labels = np.random.binomial(1, 0.5, 100)
-        
-        # High risk patients
-        high_risk = np.column_stack([
-            np.random.normal(60, 8, 100),   # age
-            np.random.normal(32, 3, 100),   # bmi
-            np.random.normal(145, 10, 100), # systolic
-            np.random.normal(95, 8, 100),   # diastolic
-            np.random.binomial(1, 0.7, 100) # family history
-        ])
-        high_risk_labels = np.ones(100)
-        
-        # Combine all data
-        X_train = np.vstack([low_risk, medium_risk, high_risk])
-        y_train = np.hstack([low_risk_labels, medium_risk_labels, high_risk_labels])
-        
-        # Standardize features
-        self.scaler = StandardScaler()
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        
-        # Train Logistic Regression model
-        self.model = LogisticRegression(random_state=42, max_iter=1000)
-        self.model.fit(X_train_scaled, y_train)
-        
-        # Save model and scaler
-        joblib.dump(self.model, self.model_path)
-        joblib.dump(self.scaler, self.scaler_path)
-        
-        print(f"Model trained successfully!")
-        print(f"Training accuracy: {self.model.score(X_train_scaled, y_train):.2f}")
+        if report is None:
+            report = lambda percent, message: print(message)
+        report(10, "Generating training data...")
+        X_train, y_train = synthetic_training_data(samples_per_class)
+        
+        report(30, f"Fitting model on {len(X_train)} samples...")
+        scaler, model = fit_estimators(X_train, y_train)
+        accuracy = model.score(scaler.transform(X_train), y_train)
+        
+        self._publish(model, scaler, report, {
+            'trainer': 'logistic_regression',
+            'source': 'synthetic',
+            'training_samples': len(X_train),
+            'training_accuracy': round(accuracy, 4),
+        })
+    
+    def train_from_records(self, report=None, chunk_size=5000, epochs=5, incremental=False):
+        """
+        Train on stored predictions and visits with an out-of-core SGD logistic model
+        
+        Records are streamed in chunks (see datasets.py): one pass to fit the
+        scaler statistics, then `epochs` passes of SGDClassifier.partial_fit,
+        so memory does not grow with the size of the tables.
+        
+        Args:
+            report: optional callable(percent, message) receiving progress updates
+            chunk_size: rows per streamed chunk
+            epochs: passes over the data for the SGD fit
+            incremental: continue from the current version's model, reading only
+                records added since its watermark (scaler statistics stay fixed)
+        
+        Like train_model(), fits without holding the predictor lock.
+        """
+        if report is None:
+            report = lambda percent, message: print(message)
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.preprocessing import StandardScaler
+        from .datasets import iter_training_chunks
+        
+        base_version = self.registry.current_version()
+        base = self.registry.metadata(base_version) if base_version else {}
+        if incremental and base.get('trainer') != 'sgd':
+            report(0, "Current model was not trained on records; running a full retrain.")
+            incremental = False
+        
+        if incremental:
+            watermark = base['watermark']
+            artifacts = self.registry.load(base_version, ['model', 'scaler'])
+            model, scaler = artifacts['model'], artifacts['scaler']
+            report(5, f"Continuing from version {base_version} (watermark {watermark})...")
+        else:
+            watermark = {}
+            model = SGDClassifier(loss='log_loss', random_state=42)
+            scaler = StandardScaler()
+            report(5, "Computing feature statistics...")
+            for source, X, y, last_id in iter_training_chunks(watermark, chunk_size):
+                scaler.partial_fit(X)
+        
+        new_watermark = dict(watermark)
+        for epoch in range(epochs):
+            report(10 + 70 * epoch // epochs, f"Epoch {epoch + 1}/{epochs}...")
+            samples = correct = 0
+            for source, X, y, last_id in iter_training_chunks(watermark, chunk_size):
+                X_scaled = scaler.transform(X)
+                if hasattr(model, 'coef_'):
+                    # Progressive validation: score each chunk before learning from it
+                    correct += int((model.predict(X_scaled) == y).sum())
+                model.partial_fit(X_scaled, y, classes=np.array([0.0, 1.0]))
+                samples += len(X)
+                new_watermark[source] = max(new_watermark.get(source, 0), last_id)
+            
+            if not samples:
+                if incremental:
+                    report(100, "No new records since the last training run; model unchanged.")
+                    return
+                raise ValueError("No labelled records with complete inputs to train on.")
+        
+        self._publish(model, scaler, report, {
+            'trainer': 'sgd',
+            'source': 'records',
+            'base_version': base_version if incremental else None,
+            'training_samples': samples,
+            'training_accuracy': round(correct / samples, 4),
+            'watermark': new_watermark,
+        })
+    
+    def _publish(self, model, scaler, report, metadata):
+        """
+        Publish fitted estimators as a new registry version and start serving it
+        """
+        report(80, "Publishing model artifacts...")
+        scorer = CompiledScorer.from_estimator(scaler, model)
+        with self._lock:
+            version = self.registry.publish(
+                {'model': model, 'scaler': scaler},
+                metadata=metadata,
+                files={'scorer.npy': scorer.to_bytes},
+            )
+            scorer.version = version
+            
+            # Swap in the new model; requests keep scoring with the old one until here
+            self._generation = self.registry.generation()
+            self.model, self.scaler, self.model_version = model, scaler, version
+            self.scorer = scorer
+        
+        report(100, f"Model version {version} trained successfully!")
+        report(100, f"Training accuracy: {metadata['training_accuracy']:.2f}")
     
     def load_model(self):
         """
-        Load the trained model and scaler
+        Load the current model version from the registry
+        
+        Only the compact scorer artifact is read; the sklearn estimators are
+        loaded on demand by load_estimators().
         """
-        if os.path.exists(self.model_path) and os.path.exists(self.scaler_path):
-            self.model = joblib.load(self.model_path)
-            self.scaler = joblib.load(self.scaler_path)
-            return True
-        return False
+        with self._lock:
+            generation = self.registry.generation()
+            version = self.registry.current_version()
+            if version is None:
+                version = self._import_legacy_model()
+                if version is None:
+                    return False
+                generation = self.registry.generation()
+            
+            scorer_path = self.registry.path(version, 'scorer.npy')
+            if not os.path.exists(scorer_path):
+                # Versions published before the compact artifact existed
+                artifacts = self.registry.load(version, ['model', 'scaler'])
+                atomic_write(scorer_path, CompiledScorer.from_estimator(
+                    artifacts['scaler'], artifacts['model']
+                ).to_bytes(version))
+            
+            self._generation = generation
+            self.model, self.scaler, self.model_version = None, None, version
+            self.scorer = CompiledScorer.load(scorer_path)
+        return True
+    
+    def load_estimators(self):
+        """
+        Load the sklearn model and scaler of the served version (e.g. for retraining)
+        """
+        self.ensure_loaded()
+        with self._lock:
+            if self.model is None:
+                artifacts = self.registry.load(self.model_version, ['model', 'scaler'])
+                self.model, self.scaler = artifacts['model'], artifacts['scaler']
+        return self.model, self.scaler
+    
+    def _import_legacy_model(self):
+        """
+        Move pickles from before the registry existed into it as version 1.0
+        """
+        if not (os.path.exists(self.model_path) and os.path.exists(self.scaler_path)):
+            return None
+        return self.registry.publish(
+            {'model': joblib.load(self.model_path), 'scaler': joblib.load(self.scaler_path)},
+            metadata={'imported_from': 'trained_model.pkl'},
+            version='1.0',
+        )
     
     def predict(self, age, bmi, bp_systolic, bp_diastolic, has_family_history):
         """
@@ -121,45 +499,111 @@ class HealthRiskPredictor:
                 risk_level: 'LOW', 'MEDIUM', or 'HIGH'
                 risk_score: probability score (0-1)
         """
-        # Load model if not already loaded
-        if self.model is None:
-            if not self.load_model():
-                self.train_model()
+        risk_level, risk_score, model_version = self.predict_with_version(
+            age, bmi, bp_systolic, bp_diastolic, has_family_history
+        )
+        return risk_level, risk_score
+    
+    def predict_with_version(self, age, bmi, bp_systolic, bp_diastolic, has_family_history):
+        """
+        Same as predict(), also returning the version of the model that scored it
         
-        # Prepare input features
-        family_history_binary = 1 if has_family_history else 0
-        features = np.array([[age, bmi, bp_systolic, bp_diastolic, family_history_binary]])
+        Inputs are rounded to their recorded precision (whole years and mmHg,
+        BMI to 2 decimals) and results are memoized per model version.
         
-        # Standardize features
-        features_scaled = self.scaler.transform(features)
+        Returns:
+            tuple: (risk_level, risk_score, model_version)
+        """
+        # Normally already loaded at startup by AiPredictionConfig.ready()
+        self.ensure_loaded()
+        scorer = self.scorer
         
-        # Predict probability
-        risk_score = self.model.predict_proba(features_scaled)[0][1]
+        # Prepare input features
+        features = self.prediction_cache.normalize(age, bmi, bp_systolic, bp_diastolic, has_family_history)
+        cached = self.prediction_cache.get(scorer.version, features)
+        if cached is not None:
+            risk_level, risk_score = cached
+            return risk_level, risk_score, scorer.version
+        
+        # Predict probability with the compiled scorer (no sklearn at request time)
+        risk_score = scorer.score(features)
         
         # Determine risk level
-        if risk_score < 0.4:
-            risk_level = 'LOW'
-        elif risk_score < 0.7:
-            risk_level = 'MEDIUM'
+        risk_level = scorer.risk_level(risk_score)
+        risk_score = round(risk_score, 4)
+        
+        self.prediction_cache.set(scorer.version, features, (risk_level, risk_score))
+        return risk_level, risk_score, scorer.version
+    
+    def predict_many(self, rows):
+        """
+        Predict diabetes risk for a batch of patients
+        
+        Args:
+            rows: 2-D array or list of feature rows
+                (age, bmi, bp_systolic, bp_diastolic, has_family_history),
+                or a Patient queryset
+        
+        Returns:
+            tuple: (risk_levels, risk_scores) numpy arrays aligned with the input rows
+                Rows with missing inputs get a None risk level and a NaN score
+        """
+        risk_levels, risk_scores, model_version = self.predict_many_with_version(rows)
+        return risk_levels, risk_scores
+    
+    def predict_many_with_version(self, rows):
+        """
+        Same as predict_many(), also returning the version of the model that scored the batch
+        
+        Returns:
+            tuple: (risk_levels, risk_scores, model_version)
+        """
+        self.ensure_loaded()
+        scorer = self.scorer
+        
+        if isinstance(rows, QuerySet):
+            features = patient_feature_matrix(rows)
         else:
-            risk_level = 'HIGH'
+            features = np.asarray(rows, dtype=float).reshape(-1, len(FEATURE_NAMES))
+        # Same recorded precision as predict(), so both paths agree on any input
+        features = self.prediction_cache.normalize_many(features)
         
-        return risk_level, round(risk_score, 4)
+        risk_scores = np.full(len(features), np.nan)
+        risk_levels = np.full(len(features), None, dtype=object)
+        
+        complete = ~np.isnan(features).any(axis=1)
+        if complete.any():
+            scores = scorer.score_many(features[complete])
+            risk_levels[complete] = scorer.risk_levels(scores)
+            risk_scores[complete] = np.round(scores, 4)
+        
+        return risk_levels, risk_scores, scorer.version
     
     def get_feature_importance(self):
         """
         Get feature importance (coefficients) from the model
         """
-        if self.model is None:
+        if self.scorer is None:
             if not self.load_model():
                 return None
         
-        feature_names = ['Age', 'BMI', 'BP Systolic', 'BP Diastolic', 'Family History']
-        coefficients = self.model.coef_[0]
+        coefficients = self.scorer.coef.tolist()
         
-        importance = dict(zip(feature_names, coefficients))
+        importance = dict(zip(FEATURE_NAMES, coefficients))
         return importance
 
 
 # Initialize global predictor instance
 predictor = HealthRiskPredictor()
+
+
+def warm_start():
+    """
+    Load (or train) the risk model before a server process takes requests
+    
+    Called from emr_project.wsgi/asgi only, so the gunicorn master loads it
+    once before forking while management commands and tests do not train or
+    publish a model as a side effect of starting Django.
+    """
+    if getattr(settings, 'AI_PREDICTION_WARM_START', True):
+        predictor.ensure_loaded()
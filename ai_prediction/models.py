@@ -41,6 +41,7 @@ class HealthRiskPrediction(models.Model):
         indexes = [
             models.Index(fields=['patient', '-prediction_date']),
             models.Index(fields=['risk_level']),
+            models.Index(fields=['prediction_date']),
         ]
     
     def __str__(self):
@@ -77,3 +78,64 @@ class HealthRiskPrediction(models.Model):
             - Maintain balanced diet and regular exercise
             - Monitor any changes in health status
             """
+
+
+class ModelTrainingJob(models.Model):
+    """
+    Background (re)training run of the risk prediction model
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    SOURCE_CHOICES = [
+        ('SYNTHETIC', 'Synthetic data'),
+        ('RECORDS', 'Stored patient records'),
+    ]
+    
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='training_jobs')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='SYNTHETIC')
+    incremental = models.BooleanField(default=False, help_text="Only train on records added since the current model")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent complete")
+    log = models.TextField(blank=True, default='')
+    
+    # System Fields
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True, help_text="Last sign of life from the training worker")
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Training job #{self.id} - {self.get_status_display()}"
+    
+    def is_finished(self):
+        return self.status in ('SUCCEEDED', 'FAILED')
+
+
+class PatientRiskFeatures(models.Model):
+    """
+    Denormalized copy of each patient's current risk model inputs
+    
+    Kept up to date by Patient/MedicalVisit signals (see signals.py) so form
+    prefill and batch scoring are a single indexed read. Age is derived from
+    Patient.date_of_birth at read time since it changes without any save.
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='risk_features')
+    
+    bmi = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    blood_pressure_systolic = models.IntegerField(blank=True, null=True, help_text="From the latest visit")
+    blood_pressure_diastolic = models.IntegerField(blank=True, null=True, help_text="From the latest visit")
+    has_family_history = models.BooleanField(default=False, help_text="Family history mentions diabetes")
+    
+    # System Fields
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Risk features: {self.patient.get_full_name()}"
@@ -0,0 +1,123 @@
+"""
+Memoization of risk predictions
+
+Entries are keyed on the rounded feature tuple plus the model version, so a
+newly published model never serves results computed by the previous one. The
+in-process LRU is checked first; an optional Django cache alias lets all
+workers share results.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.core.cache import caches
+
+
+class PredictionCache:
+    """
+    Bounded, thread-safe LRU cache of (risk_level, risk_score) results
+    """
+    
+    def __init__(self, maxsize=1024, shared_alias=None, shared_timeout=3600):
+        self.maxsize = maxsize
+        self.shared_alias = shared_alias
+        self.shared_timeout = shared_timeout
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def normalize(age, bmi, bp_systolic, bp_diastolic, has_family_history):
+        """
+        Round inputs to the precision they are recorded with, giving the cache key
+        (and the features that are scored, so cached and fresh results agree)
+        
+        Plain Python on the hot path (a NumPy call per value costs more than
+        scoring), computed exactly as normalize_many() does: round half to
+        even, and BMI as rint(bmi * 100) / 100 like np.round(bmi, 2).
+        """
+        return (
+            round(age),
+            round(float(bmi) * 100) / 100,
+            round(bp_systolic),
+            round(bp_diastolic),
+            1 if has_family_history else 0,
+        )
+    
+    @staticmethod
+    def normalize_many(features):
+        """
+        normalize() of every row of an (n, 5) feature array; NaN (missing) stays NaN
+        """
+        normalized = np.round(features)
+        normalized[:, 1] = np.round(features[:, 1], 2)
+        family_history = features[:, 4]
+        normalized[:, 4] = np.where(np.isnan(family_history), np.nan, family_history != 0)
+        return normalized
+    
+    def get(self, version, features):
+        if not self.maxsize:
+            return None
+        with self._lock:
+            if version != self._version:
+                # A new model was published: everything cached so far is stale
+                self._entries.clear()
+                self._version = version
+            result = self._entries.get(features)
+            if result is not None:
+                self._entries.move_to_end(features)
+                self.hits += 1
+                return result
+        
+        if self.shared_alias:
+            result = caches[self.shared_alias].get(self._shared_key(version, features))
+            if result is not None:
+                result = tuple(result)
+                self._store(version, features, result)
+                with self._lock:
+                    self.hits += 1
+                return result
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def set(self, version, features, result):
+        if not self.maxsize:
+            return
+        self._store(version, features, result)
+        if self.shared_alias:
+            caches[self.shared_alias].set(self._shared_key(version, features), result, self.shared_timeout)
+    
+    def _store(self, version, features, result):
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[features] = result
+            self._entries.move_to_end(features)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    @staticmethod
+    def _shared_key(version, features):
+        return 'risk-prediction:%s:%s' % (version, ':'.join(str(value) for value in features))
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
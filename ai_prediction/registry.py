@@ -0,0 +1,158 @@
+"""
+Versioned model artifact registry
+
+Layout under the registry root:
+
+    1.0/model.pkl, 1.0/scaler.pkl, 1.0/scorer.npy, 1.0/metadata.json
+    1.1/...
+    CURRENT        <- name of the version being served
+
+A version is written into a temporary directory and renamed into place, then
+CURRENT is swapped with an atomic rename. Readers therefore only ever see
+complete versions, and the (inode, mtime) of CURRENT acts as a cheap
+generation counter that workers can poll to notice a new model.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import joblib
+from django.utils import timezone
+
+
+MODEL_MAJOR_VERSION = 1
+VERSION_PATTERN = re.compile(r'^(\d+)\.(\d+)$')
+
+
+def atomic_write(path, data):
+    """
+    Write bytes to path via a temporary file and an atomic rename, so readers
+    never see a partially written file
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ModelRegistry:
+    """
+    Filesystem registry of trained model versions with a "current" pointer
+    """
+    
+    def __init__(self, root, keep=5):
+        self.root = str(root)
+        self.keep = keep
+        self.pointer_path = os.path.join(self.root, 'CURRENT')
+    
+    def version_dir(self, version):
+        return os.path.join(self.root, version)
+    
+    def path(self, version, filename):
+        return os.path.join(self.root, version, filename)
+    
+    def versions(self):
+        """
+        Published versions, oldest first
+        """
+        if not os.path.isdir(self.root):
+            return []
+        matches = [VERSION_PATTERN.match(name) for name in os.listdir(self.root)]
+        return [m.group(0) for m in sorted(
+            (m for m in matches if m), key=lambda m: (int(m.group(1)), int(m.group(2)))
+        )]
+    
+    def current_version(self):
+        try:
+            with open(self.pointer_path) as pointer:
+                return pointer.read().strip() or None
+        except FileNotFoundError:
+            return None
+    
+    def generation(self):
+        """
+        Cheap change marker for the current pointer (a single stat call)
+        """
+        try:
+            stat = os.stat(self.pointer_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+    
+    def next_version(self):
+        minors = [int(VERSION_PATTERN.match(v).group(2)) for v in self.versions()
+                  if VERSION_PATTERN.match(v).group(1) == str(MODEL_MAJOR_VERSION)]
+        return f"{MODEL_MAJOR_VERSION}.{max(minors) + 1 if minors else 0}"
+    
+    def publish(self, artifacts, metadata=None, version=None, files=None):
+        """
+        Store artifacts as a new version and make it current
+        
+        Args:
+            artifacts: dict of name -> object, each pickled to <name>.pkl
+            metadata: optional JSON-serialisable dict saved with the version
+            version: explicit version name (defaults to the next minor version)
+            files: optional dict of filename -> callable(version) returning the file's bytes
+        
+        Returns:
+            str: the published version
+        """
+        os.makedirs(self.root, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=self.root, prefix='.staging-')
+        try:
+            for name, obj in artifacts.items():
+                joblib.dump(obj, os.path.join(staging_dir, f'{name}.pkl'))
+            
+            # Claim a version directory; retry if another process took the name first
+            while True:
+                version = version or self.next_version()
+                metadata = dict(metadata or {}, version=version, published_at=timezone.now().isoformat())
+                with open(os.path.join(staging_dir, 'metadata.json'), 'w') as metadata_file:
+                    json.dump(metadata, metadata_file, indent=2)
+                for filename, build in (files or {}).items():
+                    with open(os.path.join(staging_dir, filename), 'wb') as version_file:
+                        version_file.write(build(version))
+                try:
+                    os.rename(staging_dir, self.version_dir(version))
+                    break
+                except OSError:
+                    if not os.path.isdir(self.version_dir(version)):
+                        raise
+                    version = None
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        
+        atomic_write(self.pointer_path, version.encode())
+        self.prune()
+        return version
+    
+    def load(self, version, names):
+        """
+        Load the named artifacts of a version
+        """
+        return {name: joblib.load(os.path.join(self.version_dir(version), f'{name}.pkl')) for name in names}
+    
+    def metadata(self, version):
+        try:
+            with open(os.path.join(self.version_dir(version), 'metadata.json')) as metadata_file:
+                return json.load(metadata_file)
+        except FileNotFoundError:
+            return {}
+    
+    def prune(self):
+        """
+        Delete old versions beyond the retention count, never the current one
+        """
+        current = self.current_version()
+        old_versions = self.versions()[:-self.keep] if self.keep else []
+        for version in old_versions:
+            if version != current:
+                shutil.rmtree(self.version_dir(version), ignore_errors=True)
@@ -0,0 +1,99 @@
+"""
+Population re-scoring
+
+Active patients are split into contiguous id ranges that worker processes
+score independently: features are built for the whole range in one query,
+scored with the batch path, and saved with bulk_create. Patients that already
+have a prediction from the serving model version are skipped, so an
+interrupted run can simply be started again. Pool workers are set up by
+workers.init_worker.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from medical.models import MedicalVisit
+from patients.chart import invalidate_chart_summaries
+from patients.models import Patient
+from .ml_model import patient_feature_matrix, predictor
+from .models import HealthRiskPrediction
+
+
+RESCORE_NOTE = 'Population re-score'
+
+
+def pending_patients(model_version, force=False):
+    """
+    Active, scoreable patients without a prediction from the given model version
+    """
+    patients = Patient.objects.filter(
+        Exists(MedicalVisit.objects.filter(patient=OuterRef('pk'))),
+        is_active=True,
+        height__isnull=False,
+        weight__isnull=False,
+    )
+    if not force:
+        patients = patients.exclude(Exists(HealthRiskPrediction.objects.filter(
+            patient=OuterRef('pk'), model_version=model_version,
+        )))
+    return patients
+
+
+def id_ranges(patients, chunk_size):
+    """
+    Split a patient queryset into (first_id, last_id) ranges of up to chunk_size patients
+    """
+    ranges = []
+    first_id = last_id = None
+    count = 0
+    for patient_id in patients.order_by('id').values_list('id', flat=True).iterator(chunk_size=chunk_size):
+        if first_id is None:
+            first_id = patient_id
+        last_id = patient_id
+        count += 1
+        if count == chunk_size:
+            ranges.append((first_id, last_id))
+            first_id, count = None, 0
+    if first_id is not None:
+        ranges.append((first_id, last_id))
+    return ranges
+
+
+def rescore_range(first_id, last_id, model_version, force=False):
+    """
+    Score every pending patient in an id range and store the predictions
+    
+    Returns:
+        tuple: (scored, skipped) counts; skipped patients have no blood
+        pressure on their latest visit
+    """
+    patients = pending_patients(model_version, force).filter(id__gte=first_id, id__lte=last_id).order_by('id')
+    # Patients without stored features are computed by patient_feature_matrix
+    patient_ids, features = patient_feature_matrix(patients, return_ids=True)
+    risk_levels, risk_scores, scored_version = predictor.predict_many_with_version(features)
+    
+    predictions = []
+    for patient_id, row, risk_level, risk_score in zip(patient_ids, features, risk_levels, risk_scores):
+        if risk_level is None:
+            continue
+        prediction = HealthRiskPrediction(
+            patient_id=patient_id,
+            age=int(row[0]),
+            bmi=Decimal(f'{row[1]:.2f}'),
+            blood_pressure_systolic=int(row[2]),
+            blood_pressure_diastolic=int(row[3]),
+            has_family_history=bool(row[4]),
+            risk_level=risk_level,
+            risk_score=Decimal(f'{risk_score:.4f}'),
+            model_version=scored_version,
+            notes=RESCORE_NOTE,
+        )
+        prediction.recommendations = prediction.get_recommendations()
+        predictions.append(prediction)
+    
+    with transaction.atomic():
+        HealthRiskPrediction.objects.bulk_create(predictions, batch_size=1000)
+        invalidate_chart_summaries([prediction.patient_id for prediction in predictions])
+    return len(predictions), len(patient_ids) - len(predictions)
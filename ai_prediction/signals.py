@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from medical.models import MedicalVisit
+from patients.models import Patient
+from patients.signals import patients_imported
+from .features import refresh_patient_features
+
+
+# Refreshes run after commit, so cascading patient deletes are not resurrected
+@receiver(post_save, sender=Patient)
+def refresh_features_on_patient_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: refresh_patient_features([instance.pk]))
+
+
+@receiver(post_save, sender=MedicalVisit)
+@receiver(post_delete, sender=MedicalVisit)
+def refresh_features_on_visit_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: refresh_patient_features([instance.patient_id]))
+
+
+@receiver(patients_imported)
+def refresh_features_on_import(sender, patient_ids, **kwargs):
+    transaction.on_commit(lambda: refresh_patient_features(patient_ids))
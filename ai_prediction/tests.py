@@ -1,3 +1,514 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from multiprocessing import get_context
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from medical.models import MedicalVisit
+from patients.models import Patient
+from .datasets import prediction_rows
+from .ml_model import SCORER_FORMAT, CompiledScorer, HealthRiskPredictor, fit_estimators, patient_feature_matrix
+from .prediction_cache import PredictionCache
+from .registry import ModelRegistry, atomic_write
+from .models import HealthRiskPrediction, ModelTrainingJob, PatientRiskFeatures
+from .rescoring import RESCORE_NOTE, id_ranges, pending_patients, rescore_range
+from .training import get_active_job
+from .workers import init_worker
+
+
+class CompiledScorerParityTests(SimpleTestCase):
+    """
+    The compiled scorer must reproduce scaler.transform + predict_proba
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        X = np.column_stack([
+            rng.normal(45, 15, 500),
+            rng.normal(27, 5, 500),
+            rng.normal(130, 15, 500),
+            rng.normal(85, 10, 500),
+            rng.integers(0, 2, 500),
+        ])
+        y = (X[:, 1] + rng.normal(0, 3, 500) > 27).astype(int)
+
+        self.scaler = StandardScaler().fit(X)
+        self.model = LogisticRegression(random_state=42, max_iter=1000).fit(self.scaler.transform(X), y)
+        self.scorer = CompiledScorer.from_estimator(self.scaler, self.model)
+        self.rows = np.column_stack([
+            rng.uniform(18, 90, 1000),
+            rng.uniform(15, 45, 1000),
+            rng.uniform(90, 200, 1000),
+            rng.uniform(50, 120, 1000),
+            rng.integers(0, 2, 1000),
+        ])
+        self.expected = self.model.predict_proba(self.scaler.transform(self.rows))[:, 1]
+
+    def test_single_row_matches_predict_proba(self):
+        for row, expected in zip(self.rows.tolist(), self.expected):
+            self.assertAlmostEqual(self.scorer.score(row), expected, places=12)
+
+    def test_batch_matches_predict_proba(self):
+        np.testing.assert_allclose(self.scorer.score_many(self.rows), self.expected, rtol=0, atol=1e-12)
+
+    def save(self, data):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'scorer.npy')
+        atomic_write(path, data)
+        return path
+
+    def test_artifact_round_trip(self):
+        loaded = CompiledScorer.load(self.save(self.scorer.to_bytes('1.3')))
+
+        self.assertEqual(loaded.version, '1.3')
+        for field in ('mean', 'scale', 'coef', 'thresholds'):
+            np.testing.assert_array_equal(getattr(loaded, field), getattr(self.scorer, field))
+        self.assertEqual(loaded.intercept, self.scorer.intercept)
+        # Arrays are read-only views of the memory-mapped file, not copies
+        self.assertFalse(loaded.coef.flags.writeable)
+        np.testing.assert_array_equal(loaded.score_many(self.rows), self.scorer.score_many(self.rows))
+        for row in self.rows[:50].tolist():
+            self.assertEqual(loaded.score(row), self.scorer.score(row))
+
+    def test_artifact_version_defaults_to_scorer_version(self):
+        self.scorer.version = '2.0'
+        self.assertEqual(CompiledScorer.load(self.save(self.scorer.to_bytes())).version, '2.0')
+
+    def test_unknown_artifact_format_is_rejected(self):
+        record = np.load(io.BytesIO(self.scorer.to_bytes('1.0'))).copy()
+        record['format'] = SCORER_FORMAT + 1
+        buffer = io.BytesIO()
+        np.save(buffer, record, allow_pickle=False)
+        with self.assertRaises(ValueError):
+            CompiledScorer.load(self.save(buffer.getvalue()))
+
+    def test_predictor_single_and_batch_agree(self):
+        with tempfile.TemporaryDirectory() as registry_dir, override_settings(AI_MODEL_REGISTRY_DIR=registry_dir):
+            predictor = HealthRiskPredictor()
+        predictor.scaler, predictor.model, predictor.scorer = self.scaler, self.model, self.scorer
+
+        risk_levels, risk_scores = predictor.predict_many(self.rows)
+        for row, risk_level, risk_score in zip(self.rows[:200], risk_levels, risk_scores):
+            self.assertEqual(predictor.predict(*row), (risk_level, risk_score))
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """
+    Versions are published whole, named in order and pruned around CURRENT
+    """
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        self.registry = ModelRegistry(self.root, keep=3)
+
+    def publish(self, **kwargs):
+        return self.registry.publish({'model': {'weights': [1, 2]}}, **kwargs)
+
+    def test_publish_makes_version_current(self):
+        self.assertIsNone(self.registry.current_version())
+        self.assertIsNone(self.registry.generation())
+        version = self.publish(metadata={'trainer': 'test'}, files={'extra.bin': lambda version: version.encode()})
+
+        self.assertEqual(version, '1.0')
+        self.assertEqual(self.registry.current_version(), '1.0')
+        self.assertEqual(self.registry.load('1.0', ['model']), {'model': {'weights': [1, 2]}})
+        self.assertEqual(self.registry.metadata('1.0')['trainer'], 'test')
+        self.assertEqual(self.registry.metadata('1.0')['version'], '1.0')
+        with open(self.registry.path('1.0', 'extra.bin'), 'rb') as extra:
+            self.assertEqual(extra.read(), b'1.0')
+        self.assertEqual(sorted(os.listdir(self.root)), ['1.0', 'CURRENT'])
+
+    def test_versions_are_numbered_in_numeric_order(self):
+        self.publish()
+        self.publish(version='1.9')
+        self.assertEqual(self.publish(), '1.10')
+        self.assertEqual(self.registry.versions(), ['1.0', '1.9', '1.10'])
+        self.assertEqual(self.registry.current_version(), '1.10')
+
+    def test_taken_version_name_moves_to_next(self):
+        self.publish()
+        # Another process publishes 1.1 between next_version() and the rename
+        os.mkdir(self.registry.version_dir('1.1'))
+        atomic_write(self.registry.path('1.1', 'metadata.json'), b'{}')
+        with mock.patch.object(self.registry, 'next_version', side_effect=['1.1', '1.2']):
+            self.assertEqual(self.publish(), '1.2')
+
+    def test_failed_publish_leaves_no_trace(self):
+        self.publish()
+        generation = self.registry.generation()
+
+        def fail(version):
+            raise RuntimeError('disk full')
+
+        with self.assertRaises(RuntimeError):
+            self.publish(files={'scorer.npy': fail})
+        self.assertEqual(sorted(os.listdir(self.root)), ['1.0', 'CURRENT'])
+        self.assertEqual(self.registry.generation(), generation)
+
+    def test_prune_keeps_newest_and_current(self):
+        for _ in range(5):
+            self.publish()
+        self.assertEqual(self.registry.versions(), ['1.2', '1.3', '1.4'])
+
+        # Roll back to 1.2, then keep a single version
+        atomic_write(self.registry.pointer_path, b'1.2')
+        self.registry.keep = 1
+        self.registry.prune()
+        self.assertEqual(self.registry.versions(), ['1.2', '1.4'])
+        self.assertEqual(self.registry.current_version(), '1.2')
+
+    def test_generation_changes_with_current(self):
+        self.publish()
+        generation = self.registry.generation()
+        self.publish()
+        self.assertNotEqual(self.registry.generation(), generation)
+
+    @override_settings(AI_MODEL_RELOAD_INTERVAL=0)
+    def test_worker_reloads_when_current_changes(self):
+        report = lambda percent, message: None
+        with override_settings(AI_MODEL_REGISTRY_DIR=self.root):
+            trainer, worker = HealthRiskPredictor(), HealthRiskPredictor()
+        trainer.train_model(report=report, samples_per_class=20)
+        worker.ensure_loaded()
+        self.assertEqual(worker.model_version, '1.0')
+
+        trainer.train_model(report=report, samples_per_class=20)
+        worker.ensure_loaded()
+        self.assertEqual(worker.model_version, '1.1')
+        self.assertEqual(worker.scorer.version, '1.1')
+        self.assertEqual(worker.predict(50, 31.0, 150, 95, True), trainer.predict(50, 31.0, 150, 95, True))
+
+        # Rolling CURRENT back is picked up the same way
+        atomic_write(trainer.registry.pointer_path, b'1.0')
+        worker.refresh_if_stale()
+        self.assertEqual(worker.model_version, '1.0')
+
+
+class TrainingLockTests(SimpleTestCase):
+    def test_fit_runs_without_holding_the_predictor_lock(self):
+        acquired = []
+
+        def fit(X, y):
+            def try_lock():
+                got = predictor._lock.acquire(timeout=1)
+                acquired.append(got)
+                if got:
+                    predictor._lock.release()
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            return fit_estimators(X, y)
+
+        with tempfile.TemporaryDirectory() as registry_dir, override_settings(AI_MODEL_REGISTRY_DIR=registry_dir):
+            predictor = HealthRiskPredictor()
+            with mock.patch('ai_prediction.ml_model.fit_estimators', side_effect=fit):
+                predictor.train_model(report=lambda percent, message: None, samples_per_class=20)
+
+        self.assertEqual(acquired, [True])
+        self.assertIsNotNone(predictor.scorer)
+
+
+class PredictionCacheTests(SimpleTestCase):
+    """
+    Bounded LRU of prediction results, scoped to one model version
+    """
+
+    def test_hits_and_misses_are_counted(self):
+        cache = PredictionCache(maxsize=4)
+        self.assertIsNone(cache.get('1.0', (40, 25.0, 120, 80, 0)))
+        cache.set('1.0', (40, 25.0, 120, 80, 0), ('LOW', 0.1))
+        self.assertEqual(cache.get('1.0', (40, 25.0, 120, 80, 0)), ('LOW', 0.1))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = PredictionCache(maxsize=2)
+        cache.get('1.0', ('a',))
+        cache.set('1.0', ('a',), ('LOW', 0.1))
+        cache.set('1.0', ('b',), ('LOW', 0.2))
+        cache.get('1.0', ('a',))
+        cache.set('1.0', ('c',), ('HIGH', 0.9))
+        self.assertEqual(cache.get('1.0', ('a',)), ('LOW', 0.1))
+        self.assertIsNone(cache.get('1.0', ('b',)))
+        self.assertEqual(cache.get('1.0', ('c',)), ('HIGH', 0.9))
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_new_model_version_clears_entries(self):
+        cache = PredictionCache(maxsize=4)
+        cache.get('1.0', ('a',))
+        cache.set('1.0', ('a',), ('LOW', 0.1))
+        self.assertIsNone(cache.get('2.0', ('a',)))
+        self.assertEqual(cache.stats()['size'], 0)
+        # A late write for the old version is not stored
+        cache.set('1.0', ('b',), ('LOW', 0.2))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = PredictionCache(maxsize=0)
+        cache.set('1.0', ('a',), ('LOW', 0.1))
+        self.assertIsNone(cache.get('1.0', ('a',)))
+
+    def test_normalize_many_matches_normalize(self):
+        rng = np.random.default_rng(1)
+        rows = np.column_stack([
+            rng.uniform(18, 90, 500), rng.uniform(15, 45, 500), rng.uniform(90, 200, 500),
+            rng.uniform(50, 120, 500), rng.integers(0, 2, 500),
+        ])
+        rows[::7, 1] = np.round(rows[::7, 1], 3) + 0.005
+        # Exact halves, where round-half-to-even must agree
+        rows[::5, 0] = np.floor(rows[::5, 0]) + 0.5
+        rows[::3, 2] = np.floor(rows[::3, 2]) + 0.5
+        for row, normalized in zip(rows, PredictionCache.normalize_many(rows)):
+            self.assertEqual(PredictionCache.normalize(*row), tuple(normalized))
+
+    def test_normalize_returns_plain_python_numbers(self):
+        normalized = PredictionCache.normalize(np.float64(40.5), np.float64(25.125), 120.4, 80.6, True)
+        self.assertEqual(normalized, (40, 25.12, 120, 81, 1))
+        self.assertEqual([type(value) for value in normalized], [int, float, int, int, int])
+
+
+@override_settings(AI_TRAINING_JOB_STALE_AFTER=300)
+class StaleTrainingJobTests(TestCase):
+    """
+    A job whose worker stopped must not block new training runs forever
+    """
+
+    def test_running_job_without_heartbeat_is_failed(self):
+        job = ModelTrainingJob.objects.create(status='RUNNING', heartbeat_at=timezone.now() - timedelta(minutes=10))
+        self.assertIsNone(get_active_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertIsNotNone(job.finished_at)
+        self.assertIn('No heartbeat', job.log)
+
+    def test_abandoned_queued_job_is_failed(self):
+        job = ModelTrainingJob.objects.create()
+        ModelTrainingJob.objects.filter(id=job.id).update(created_at=timezone.now() - timedelta(minutes=10))
+        self.assertIsNone(get_active_job())
+
+    def test_job_with_recent_heartbeat_stays_active(self):
+        job = ModelTrainingJob.objects.create(status='RUNNING', heartbeat_at=timezone.now() - timedelta(seconds=30))
+        self.assertEqual(get_active_job(), job)
+
+
+class PredictionRowsTests(TestCase):
+    """
+    Population re-scores must not feed back into the training data
+    """
+
+    def test_rescore_rows_are_excluded(self):
+        patient = Patient.objects.create(
+            first_name='Ada', last_name='Byron', date_of_birth='1970-01-01', gender='F',
+            national_id='DS-0001', phone_number='000', address='-',
+        )
+        inputs = dict(
+            patient=patient, age=55, bmi=27, blood_pressure_systolic=130, blood_pressure_diastolic=85,
+            risk_level='MEDIUM', risk_score=0.5,
+        )
+        manual = HealthRiskPrediction.objects.create(**inputs)
+        HealthRiskPrediction.objects.create(notes=RESCORE_NOTE, **inputs)
+        self.assertEqual([row[0] for row in prediction_rows()], [manual.id])
+
+
+class FeatureBackfillTests(TestCase):
+    """
+    Patients without a stored feature row are computed, not treated as missing inputs
+    """
+
+    def test_missing_feature_rows_are_computed(self):
+        patient = Patient.objects.create(
+            first_name='Ada', last_name='Byron', date_of_birth='1970-01-01', gender='F',
+            national_id='FS-0001', phone_number='000', address='-', height=170, weight=80,
+            family_history='Mother: diabetes',
+        )
+        MedicalVisit.objects.create(
+            patient=patient, chief_complaint='-', symptoms='-', diagnosis='-',
+            blood_pressure_systolic=130, blood_pressure_diastolic=85,
+        )
+        PatientRiskFeatures.objects.all().delete()
+
+        features = patient_feature_matrix(Patient.objects.filter(pk=patient.pk))
+        self.assertEqual(features[0, 1:].tolist(), [27.68, 130.0, 85.0, 1.0])
+        self.assertTrue(PatientRiskFeatures.objects.filter(patient=patient).exists())
+
+
+class TrainFromRecordsTests(TestCase):
+    """
+    Full runs read every record; incremental runs only those past the watermark
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(20):
+            cls.add_patient(number)
+
+    @classmethod
+    def add_patient(cls, number):
+        diabetic = number % 2 == 0
+        patient = Patient.objects.create(
+            first_name='Test', last_name=f'Patient {number}', date_of_birth=f'{1940 + number}-01-01', gender='O',
+            national_id=f'TRAIN-{number}', phone_number='000', address='-', height=170, weight=60 + number * 2,
+            chronic_conditions='Type 2 diabetes' if diabetic else '',
+        )
+        visit = MedicalVisit.objects.create(
+            patient=patient, chief_complaint='-', symptoms='-', diagnosis='-',
+            blood_pressure_systolic=150 if diabetic else 115, blood_pressure_diastolic=95 if diabetic else 75,
+        )
+        prediction = HealthRiskPrediction.objects.create(
+            patient=patient, age=40 + number, bmi=20 + number, blood_pressure_systolic=130,
+            blood_pressure_diastolic=85, risk_level='MEDIUM', risk_score=0.5,
+        )
+        return visit, prediction
+
+    def setUp(self):
+        registry_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(registry_dir.cleanup)
+        with override_settings(AI_MODEL_REGISTRY_DIR=registry_dir.name):
+            self.predictor = HealthRiskPredictor()
+
+    def train(self, **kwargs):
+        self.predictor.train_from_records(report=lambda percent, message: None, chunk_size=7, epochs=2, **kwargs)
+        return self.predictor.registry.metadata(self.predictor.model_version)
+
+    def watermark(self):
+        return {
+            'predictions': HealthRiskPrediction.objects.latest('id').id,
+            'visits': MedicalVisit.objects.latest('id').id,
+        }
+
+    def test_full_run_reads_every_record(self):
+        metadata = self.train()
+        self.assertEqual(metadata['trainer'], 'sgd')
+        self.assertIsNone(metadata['base_version'])
+        self.assertEqual(metadata['training_samples'], 40)
+        self.assertEqual(metadata['watermark'], self.watermark())
+
+    def test_incremental_run_reads_only_new_records(self):
+        first = self.train()
+        scaler_mean = self.predictor.scaler.mean_.copy()
+        self.add_patient(20)
+        self.add_patient(21)
+
+        metadata = self.train(incremental=True)
+        self.assertEqual(metadata['base_version'], first['version'])
+        self.assertEqual(metadata['training_samples'], 4)
+        self.assertEqual(metadata['watermark'], self.watermark())
+        self.assertNotEqual(metadata['watermark'], first['watermark'])
+        # Scaler statistics stay those of the full run
+        np.testing.assert_array_equal(self.predictor.scaler.mean_, scaler_mean)
+
+        # A full run starts over from every record
+        metadata = self.train()
+        self.assertIsNone(metadata['base_version'])
+        self.assertEqual(metadata['training_samples'], 44)
+
+    def test_incremental_run_without_new_records_keeps_model(self):
+        self.train()
+        version = self.predictor.model_version
+        self.train(incremental=True)
+        self.assertEqual(self.predictor.model_version, version)
+        self.assertEqual(self.predictor.registry.versions(), [version])
+
+    def test_incremental_run_over_synthetic_model_is_full(self):
+        self.predictor.train_model(report=lambda percent, message: None, samples_per_class=20)
+        metadata = self.train(incremental=True)
+        self.assertIsNone(metadata['base_version'])
+        self.assertEqual(metadata['training_samples'], 40)
+
+
+class RescoreRangeTests(TestCase):
+    """
+    A re-score skips what the serving model already scored, so a stopped run resumes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patients = {}
+        for number, (name, height, bp, active) in enumerate([
+            ('scored', 170, 130, True),
+            ('scored_too', 165, 145, True),
+            ('no_bp', 170, None, True),
+            ('no_height', None, 130, True),
+            ('inactive', 170, 130, False),
+        ]):
+            patient = cls.patients[name] = Patient.objects.create(
+                first_name='Test', last_name=name, date_of_birth='1970-01-01', gender='O',
+                national_id=f'RESCORE-{number}', phone_number='000', address='-',
+                height=height, weight=80, is_active=active,
+            )
+            MedicalVisit.objects.create(
+                patient=patient, chief_complaint='-', symptoms='-', diagnosis='-',
+                blood_pressure_systolic=bp, blood_pressure_diastolic=bp and 85,
+            )
+        PatientRiskFeatures.objects.all().delete()
+
+    def setUp(self):
+        registry_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(registry_dir.cleanup)
+        with override_settings(AI_MODEL_REGISTRY_DIR=registry_dir.name):
+            self.predictor = HealthRiskPredictor()
+        self.predictor.train_model(report=lambda percent, message: None, samples_per_class=20)
+        patcher = mock.patch('ai_prediction.rescoring.predictor', self.predictor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.version = self.predictor.model_version
+
+    def pending(self, force=False):
+        return sorted(patient.last_name for patient in pending_patients(self.version, force))
+
+    def rescore_all(self, force=False):
+        ids = [patient.id for patient in self.patients.values()]
+        return rescore_range(min(ids), max(ids), self.version, force)
+
+    def test_scores_complete_patients_and_skips_missing_blood_pressure(self):
+        self.assertEqual(self.pending(), ['no_bp', 'scored', 'scored_too'])
+        self.assertEqual(self.rescore_all(), (2, 1))
+
+        predictions = HealthRiskPrediction.objects.filter(notes=RESCORE_NOTE)
+        self.assertEqual(
+            sorted(predictions.values_list('patient__last_name', flat=True)), ['scored', 'scored_too'],
+        )
+        self.assertEqual(set(predictions.values_list('model_version', flat=True)), {self.version})
+        # Features of patients without a stored row were computed on the way
+        self.assertEqual(PatientRiskFeatures.objects.filter(patient__is_active=True).count(), 3)
+
+    def test_second_run_resumes_with_unscored_patients(self):
+        scored = self.patients['scored']
+        self.assertEqual(rescore_range(scored.id, scored.id, self.version), (1, 0))
+        self.assertEqual(self.pending(), ['no_bp', 'scored_too'])
+        self.assertEqual(len(id_ranges(pending_patients(self.version), chunk_size=1)), 2)
+
+        self.assertEqual(self.rescore_all(), (1, 1))
+        self.assertEqual(self.rescore_all(), (0, 1))
+        self.assertEqual(HealthRiskPrediction.objects.filter(notes=RESCORE_NOTE).count(), 2)
+
+    def test_force_rescores_everyone(self):
+        self.rescore_all()
+        self.assertEqual(self.pending(force=True), ['no_bp', 'scored', 'scored_too'])
+        self.assertEqual(self.rescore_all(force=True), (2, 1))
+        self.assertEqual(HealthRiskPrediction.objects.filter(notes=RESCORE_NOTE).count(), 4)
+
+    def test_id_ranges(self):
+        ids = sorted(patient.id for name, patient in self.patients.items() if name != 'inactive')
+        ranges = id_ranges(Patient.objects.filter(is_active=True), chunk_size=3)
+        self.assertEqual(ranges, [(ids[0], ids[2]), (ids[3], ids[3])])
+
+
+class InitWorkerTests(SimpleTestCase):
+    def test_spawned_worker_starts(self):
+        # A spawned worker imports init_worker's module before Django is set up
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn'), initializer=init_worker) as pool:
+            self.assertEqual(pool.submit(abs, -1).result(timeout=60), 1)
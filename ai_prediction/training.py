@@ -0,0 +1,124 @@
+"""
+Background model training
+
+Training runs on a single in-process worker thread so the admin's request
+returns immediately; progress and log output are persisted on a
+ModelTrainingJob row so any gunicorn worker can render the job status page.
+
+While a job runs, a heartbeat thread stamps it every HEARTBEAT_INTERVAL
+seconds. If the worker process dies or is recycled mid-job the heartbeat
+stops, and the job is failed once it is older than AI_TRAINING_JOB_STALE_AFTER,
+so a lost job never blocks new training runs.
+"""
+
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .ml_model import predictor
+from .models import ModelTrainingJob
+
+
+# One worker: training jobs run one at a time, in submission order
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-training')
+
+ACTIVE_STATUSES = ['QUEUED', 'RUNNING']
+
+# Seconds between heartbeats of a running job
+HEARTBEAT_INTERVAL = 30
+
+
+def mark_job_failed(job, reason):
+    """
+    Fail a queued or running job, e.g. one whose worker is gone
+    """
+    job.status = 'FAILED'
+    job.log += f"[{timezone.now():%H:%M:%S}] {reason}\n"
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'log', 'finished_at'])
+
+
+def fail_stale_jobs():
+    """
+    Fail active jobs without a heartbeat for AI_TRAINING_JOB_STALE_AFTER seconds
+    
+    Returns:
+        Number of jobs failed
+    """
+    stale_after = getattr(settings, 'AI_TRAINING_JOB_STALE_AFTER', 300)
+    stale = ModelTrainingJob.objects.filter(status__in=ACTIVE_STATUSES).alias(
+        last_seen=Coalesce('heartbeat_at', 'started_at', 'created_at'),
+    ).filter(last_seen__lt=timezone.now() - timedelta(seconds=stale_after))
+    jobs = list(stale)
+    for job in jobs:
+        mark_job_failed(job, f"No heartbeat for {stale_after}s; the training worker stopped. Marked as failed.")
+    return len(jobs)
+
+
+def get_active_job():
+    """
+    Return the queued or running training job, if any (stale jobs are failed first)
+    """
+    fail_stale_jobs()
+    return ModelTrainingJob.objects.filter(status__in=ACTIVE_STATUSES).first()
+
+
+def submit_training_job(user, source='SYNTHETIC', incremental=False):
+    """
+    Create a training job and hand it to the background worker once committed
+    """
+    job = ModelTrainingJob.objects.create(requested_by=user, source=source, incremental=incremental)
+    transaction.on_commit(lambda: _executor.submit(run_training_job, job.id))
+    return job
+
+
+def run_training_job(job_id):
+    """
+    Execute a training job, recording progress and log output as it goes
+    """
+    job = ModelTrainingJob.objects.get(id=job_id)
+    if job.status != 'QUEUED':
+        # Failed as stale (or cancelled) before the worker got to it
+        connection.close()
+        return
+    job.status = 'RUNNING'
+    job.started_at = job.heartbeat_at = timezone.now()
+    job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job.id, stop_heartbeat), daemon=True)
+    heartbeat.start()
+    
+    def report(percent, message):
+        job.progress = percent
+        job.log += f"[{timezone.now():%H:%M:%S}] {message}\n"
+        job.save(update_fields=['progress', 'log'])
+    
+    try:
+        if job.source == 'RECORDS':
+            predictor.train_from_records(report=report, incremental=job.incremental)
+        else:
+            predictor.train_model(report=report)
+        job.status = 'SUCCEEDED'
+    except Exception:
+        job.log += traceback.format_exc()
+        job.status = 'FAILED'
+    finally:
+        stop_heartbeat.set()
+        heartbeat.join()
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'log', 'finished_at'])
+        connection.close()
+
+
+def _heartbeat(job_id, stop):
+    try:
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            ModelTrainingJob.objects.filter(id=job_id).update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
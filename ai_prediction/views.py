@@ -1,10 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import HealthRiskPrediction
+from .models import HealthRiskPrediction, ModelTrainingJob
 from patients.models import Patient
-from .forms import HealthRiskPredictionForm
+from .features import get_patient_features
+from .forms import HealthRiskPredictionForm, ModelTrainingJobForm
 from .ml_model import predictor
+from .training import fail_stale_jobs, get_active_job, submit_training_job
 
 
 @login_required
@@ -12,7 +14,7 @@ def predict_risk(request, patient_id):
     """
     Create a health risk prediction for a patient
     """
-    patient = get_object_or_404(Patient, id=patient_id, is_active=True)
+    patient = get_object_or_404(Patient.objects.select_related('risk_features'), id=patient_id, is_active=True)
     
     if request.method == 'POST':
         form = HealthRiskPredictionForm(request.POST)
@@ -22,7 +24,7 @@ def predict_risk(request, patient_id):
             prediction.predicted_by = request.user
             
             # Get AI prediction
-            risk_level, risk_score = predictor.predict(
+            risk_level, risk_score, model_version = predictor.predict_with_version(
                 age=prediction.age,
                 bmi=float(prediction.bmi),
                 bp_systolic=prediction.blood_pressure_systolic,
@@ -32,28 +34,24 @@ def predict_risk(request, patient_id):
             
             prediction.risk_level = risk_level
             prediction.risk_score = risk_score
+            prediction.model_version = model_version
             prediction.recommendations = prediction.get_recommendations()
             prediction.save()
             
             messages.success(request, f'Health risk prediction completed: {risk_level} Risk')
             return redirect('prediction_detail', prediction_id=prediction.id)
     else:
-        # Pre-fill form with patient data if available
+        # Pre-fill form from the patient's stored model inputs
+        # (BMI, latest visit blood pressure, diabetes in family history)
+        features = get_patient_features(patient)
         initial_data = {
             'age': patient.get_age(),
-            'bmi': patient.calculate_bmi(),
+            'bmi': features.bmi,
+            'blood_pressure_systolic': features.blood_pressure_systolic,
+            'blood_pressure_diastolic': features.blood_pressure_diastolic,
+            'has_family_history': features.has_family_history,
         }
         
-        # Get latest visit for blood pressure data
-        latest_visit = patient.visits.first()
-        if latest_visit:
-            initial_data['blood_pressure_systolic'] = latest_visit.blood_pressure_systolic
-            initial_data['blood_pressure_diastolic'] = latest_visit.blood_pressure_diastolic
-        
-        # Check family history
-        if patient.family_history and 'diabetes' in patient.family_history.lower():
-            initial_data['has_family_history'] = True
-        
         form = HealthRiskPredictionForm(initial=initial_data)
     
     return render(request, 'ai_prediction/prediction_form.html', {
@@ -91,18 +89,40 @@ def prediction_list(request):
 @login_required
 def train_model_view(request):
     """
-    Admin view to train/retrain the ML model
+    Admin view to train/retrain the ML model in the background
     """
     if not request.user.is_admin():
         messages.error(request, 'You do not have permission to train the model.')
         return redirect('dashboard')
     
-    if request.method == 'POST':
-        try:
-            predictor.train_model()
-            messages.success(request, 'Model has been trained successfully!')
-        except Exception as e:
-            messages.error(request, f'Error training model: {str(e)}')
+    form = ModelTrainingJobForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        job = get_active_job()
+        if job:
+            messages.info(request, 'A training job is already in progress.')
+        else:
+            job = submit_training_job(request.user, **form.cleaned_data)
+            messages.success(request, 'Model training has started in the background.')
+        return redirect('training_job_detail', job_id=job.id)
+    
+    return render(request, 'ai_prediction/train_model.html', {
+        'form': form,
+        'active_job': get_active_job(),
+        'jobs': ModelTrainingJob.objects.select_related('requested_by')[:10],
+        'model_version': predictor.model_version,
+        'cache_stats': predictor.prediction_cache.stats(),
+    })
+
+
+@login_required
+def training_job_detail(request, job_id):
+    """
+    Status page for a background training job
+    """
+    if not request.user.is_admin():
+        messages.error(request, 'You do not have permission to view training jobs.')
         return redirect('dashboard')
     
-    return render(request, 'ai_prediction/train_model.html')
+    fail_stale_jobs()
+    job = get_object_or_404(ModelTrainingJob, id=job_id)
+    return render(request, 'ai_prediction/training_job_detail.html', {'job': job})
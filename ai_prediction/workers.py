@@ -0,0 +1,15 @@
+"""
+Process pool worker setup
+
+Under the spawn start method a worker imports the initializer's module
+before Django is set up, so this module must not import models.
+"""
+
+import django
+from django.db import connections
+
+
+def init_worker():
+    # Workers must not share the parent's database connections
+    django.setup()
+    connections.close_all()
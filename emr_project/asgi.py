@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emr_project.settings')
 
 application = get_asgi_application()
+
+# Load the risk model before serving
+from ai_prediction.ml_model import warm_start  # noqa: E402
+warm_start()
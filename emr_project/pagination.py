@@ -0,0 +1,145 @@
+"""
+Keyset (cursor) pagination
+
+OFFSET pagination gets slower the deeper the page, since the database still
+walks every skipped row, and it needs a COUNT(*) of the whole result. Keyset
+pagination instead remembers the sort key of the last row shown and asks for
+the rows after it, which an index on the sort key answers in constant time
+whatever the page. The cursor is an opaque token carried in the query string.
+"""
+
+import base64
+import datetime
+import decimal
+import json
+import uuid
+from functools import reduce
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """
+    One page of results plus the cursors to move forward and back
+    """
+    
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+    
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    def has_previous(self):
+        return self.previous_cursor is not None
+    
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _json_value(value):
+    # Full isoformat: DjangoJSONEncoder truncates microseconds, which would
+    # make a cursor sort before the row it was taken from
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, list(values)], default=_json_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, keys):
+    """
+    Return (direction, key values) from a cursor, or None if it is missing or invalid
+    """
+    if not cursor:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(payload)
+        if direction not in ('next', 'prev') or len(values) != len(keys):
+            return None
+        return direction, [model._meta.get_field(key).to_python(value) for key, value in zip(keys, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _after(keys, values, descending):
+    """
+    Q for rows strictly after `values` in (keys) order: (a, b) > (x, y) expanded
+    as a > x OR (a = x AND b > y), which uses a composite index on the keys
+    """
+    lookup = 'lt' if descending else 'gt'
+    clauses = []
+    for position, key in enumerate(keys):
+        equal = {keys[i]: values[i] for i in range(position)}
+        clauses.append(Q(**equal, **{f'{key}__{lookup}': values[position]}))
+    return reduce(lambda left, right: left | right, clauses)
+
+
+def keyset_paginate(queryset, cursor=None, per_page=25, keys=('id',), descending=True):
+    """
+    Return one KeysetPage of queryset ordered by keys
+    
+    Args:
+        queryset: Filtered queryset to page through
+        cursor: Token from a previous page's next_cursor/previous_cursor
+        per_page: Rows per page
+        keys: Unique-together sort key, most significant first (end with 'id')
+        descending: Newest first if True
+    """
+    decoded = decode_cursor(cursor, queryset.model, keys)
+    backwards = decoded is not None and decoded[0] == 'prev'
+    reverse = descending != backwards
+    
+    if decoded is not None:
+        queryset = queryset.filter(_after(keys, decoded[1], reverse))
+    queryset = queryset.order_by(*(f'-{key}' if reverse else key for key in keys))
+    rows = list(queryset[:per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return KeysetPage(rows)
+    
+    def key_of(row):
+        return [getattr(row, key) for key in keys]
+    
+    has_next = more if not backwards else True
+    has_previous = decoded is not None if not backwards else more
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor('next', key_of(rows[-1])) if has_next else None,
+        previous_cursor=encode_cursor('prev', key_of(rows[0])) if has_previous else None,
+    )
+
+
+def cached_count(queryset, cache_key, timeout=None):
+    """
+    COUNT(*) of a queryset, cached so large lists do not count on every page
+    
+    Args:
+        queryset: Queryset to count
+        cache_key: Cache key; delete it to force a recount
+        timeout: Seconds to keep the count (default LIST_COUNT_CACHE_TIMEOUT)
+    """
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, timeout or getattr(settings, 'LIST_COUNT_CACHE_TIMEOUT', 60))
+    return count
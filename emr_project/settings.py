@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'patients',
     'medical',
     'ai_prediction',
+    'reporting',
 ]
 
 MIDDLEWARE = [
@@ -140,3 +141,70 @@ LOGOUT_REDIRECT_URL = 'login'
 
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
+
+# Cache (per-process; point at Redis/Memcached to share entries between workers)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Seconds a cached list total (e.g. number of active patients) may be reused
+LIST_COUNT_CACHE_TIMEOUT = 60
+
+# Cache shared by all workers, selected by EMR_SHARED_CACHE: a redis:// URL
+# uses Redis (needs the redis package), a directory path a file-based cache
+# on this host. Unset (development, tests) it is per-process; gunicorn.conf.py
+# defaults it to a directory next to the project
+shared_cache = os.environ.get('EMR_SHARED_CACHE', '')
+if shared_cache.startswith(('redis://', 'rediss://', 'unix://')):
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': shared_cache,
+    }
+elif shared_cache:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': shared_cache,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+else:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    }
+
+# Cache alias for patient chart summaries. Only a backend shared by all
+# workers is used (a per-process LocMemCache would serve stale charts), and
+# seconds an entry may be reused (entries are also dropped whenever the
+# patient or one of their records changes)
+CHART_SUMMARY_CACHE = 'shared'
+CHART_SUMMARY_CACHE_TIMEOUT = 300
+
+# AI Prediction
+# Load (or train) the risk model when the web server starts (wsgi/asgi) instead of
+# on the first request; management commands and tests never warm start
+AI_PREDICTION_WARM_START = True
+
+# Versioned model artifacts; workers poll the "current" pointer for new versions
+AI_MODEL_REGISTRY_DIR = BASE_DIR / 'ai_prediction' / 'model_registry'
+AI_MODEL_REGISTRY_KEEP = 5
+AI_MODEL_RELOAD_INTERVAL = 2.0  # seconds between staleness checks
+
+# Seconds without a heartbeat after which a queued/running training job is
+# considered lost (worker died or was recycled) and marked as failed
+AI_TRAINING_JOB_STALE_AFTER = 300
+
+# Memoized predictions per worker (0 disables); optionally shared through a CACHES alias
+AI_PREDICTION_CACHE_SIZE = 1024
+AI_PREDICTION_SHARED_CACHE = None
+
+# Medical
+# Seconds before a worker rebuilds its compiled drug interaction index from the database
+DRUG_INTERACTION_INDEX_TTL = 300
+
+# Exports
+# Seconds the watermark reported by an export trails its start, so rows whose
+# transaction was still open when the export read them are picked up by the
+# next incremental export; must exceed the longest write transaction
+EXPORT_WATERMARK_LAG = 120
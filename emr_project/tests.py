@@ -0,0 +1,104 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from medical.models import MedicalVisit
+from patients.models import Patient
+from .pagination import decode_cursor, encode_cursor, keyset_paginate
+
+KEYS = ('visit_date', 'id')
+
+
+class KeysetPaginateTests(TestCase):
+    """
+    Pages of (visit_date, id) cursors cover every row once, in both directions
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        patient = Patient.objects.create(
+            first_name='Test', last_name='Patient', date_of_birth='1970-01-01', gender='O',
+            national_id='PAGES-1', phone_number='000', address='-',
+        )
+        start = timezone.now() - timedelta(days=30)
+        # Eight visits over four days, two per day at the same instant
+        for day in (0, 0, 1, 1, 2, 2, 3, 3):
+            visit = MedicalVisit.objects.create(patient=patient, chief_complaint='-', symptoms='-', diagnosis='-')
+            MedicalVisit.objects.filter(pk=visit.pk).update(visit_date=start + timedelta(days=day))
+        cls.expected = list(MedicalVisit.objects.order_by('-visit_date', '-id').values_list('id', flat=True))
+
+    def paginate(self, cursor=None, **kwargs):
+        return keyset_paginate(MedicalVisit.objects.all(), cursor, per_page=3, keys=KEYS, **kwargs)
+
+    def ids(self, page):
+        return [visit.id for visit in page]
+
+    def test_first_page(self):
+        page = self.paginate()
+        self.assertEqual(self.ids(page), self.expected[:3])
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_forward_then_backward(self):
+        pages = [self.paginate()]
+        while pages[-1].has_next():
+            pages.append(self.paginate(pages[-1].next_cursor))
+        self.assertEqual(
+            [self.ids(page) for page in pages], [self.expected[0:3], self.expected[3:6], self.expected[6:]],
+        )
+        self.assertFalse(pages[-1].has_next())
+
+        backward = [pages[-1]]
+        while backward[-1].has_previous():
+            backward.append(self.paginate(backward[-1].previous_cursor))
+        self.assertEqual([self.ids(page) for page in reversed(backward)], [self.ids(page) for page in pages])
+
+    def test_previous_page_has_next_cursor(self):
+        second = self.paginate(self.paginate().next_cursor)
+        first = self.paginate(second.previous_cursor)
+        self.assertEqual(self.ids(first), self.expected[:3])
+        self.assertFalse(first.has_previous())
+        self.assertEqual(self.ids(self.paginate(first.next_cursor)), self.ids(second))
+
+    def test_equal_visit_dates_are_ordered_by_id(self):
+        # Every page boundary of two falls between the two visits of a day
+        page = keyset_paginate(MedicalVisit.objects.all(), per_page=1, keys=KEYS)
+        seen = self.ids(page)
+        while page.has_next():
+            page = keyset_paginate(MedicalVisit.objects.all(), page.next_cursor, per_page=1, keys=KEYS)
+            seen += self.ids(page)
+        self.assertEqual(seen, self.expected)
+
+    def test_ascending(self):
+        page = self.paginate(descending=False)
+        page = self.paginate(page.next_cursor, descending=False)
+        self.assertEqual(self.ids(page), list(reversed(self.expected))[3:6])
+
+    def test_cursor_round_trip_keeps_microseconds(self):
+        visit = MedicalVisit.objects.get(pk=self.expected[0])
+        visit_date = visit.visit_date.replace(microsecond=123456)
+        cursor = encode_cursor('next', [visit_date, visit.id])
+        self.assertEqual(decode_cursor(cursor, MedicalVisit, KEYS), ('next', [visit_date, visit.id]))
+
+    def test_malformed_cursors_restart_from_first_page(self):
+        def token(payload):
+            return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+        visit_date = MedicalVisit.objects.get(pk=self.expected[0]).visit_date.isoformat()
+        for cursor in [
+            'not a cursor',
+            '!!!',
+            token('not json'),
+            token(json.dumps({'next': 1})),
+            token(json.dumps(['sideways', [visit_date, 1]])),
+            token(json.dumps(['next', [visit_date]])),
+            token(json.dumps(['next', ['yesterday', 1]])),
+            token(json.dumps(['next', [visit_date, 'one']])),
+        ]:
+            self.assertIsNone(decode_cursor(cursor, MedicalVisit, KEYS), cursor)
+            page = self.paginate(cursor)
+            self.assertEqual(self.ids(page), self.expected[:3], cursor)
+            self.assertFalse(page.has_previous(), cursor)
@@ -21,6 +21,7 @@ from accounts import views as account_views
 from patients import views as patient_views
 from medical import views as medical_views
 from ai_prediction import views as ai_views
+from reporting import views as reporting_views
 
 urlpatterns = [
     # Admin
@@ -36,23 +37,31 @@ urlpatterns = [
     # Dashboard
     path('dashboard/', main_views.dashboard, name='dashboard'),
     
+    # Data exports
+    path('exports/<str:dataset>/', reporting_views.export_data, name='export_data'),
+    
     # Patients
     path('patients/', patient_views.patient_list, name='patient_list'),
     path('patients/create/', patient_views.patient_create, name='patient_create'),
+    path('patients/import/', patient_views.patient_import, name='patient_import'),
     path('patients/<int:patient_id>/', patient_views.patient_detail, name='patient_detail'),
     path('patients/<int:patient_id>/update/', patient_views.patient_update, name='patient_update'),
     path('patients/<int:patient_id>/delete/', patient_views.patient_delete, name='patient_delete'),
     
     # Medical Visits
     path('visits/', medical_views.visit_list, name='visit_list'),
+    path('visits/follow-ups/', medical_views.follow_up_list, name='follow_up_list'),
+    path('api/follow-ups/', medical_views.follow_up_list_api, name='follow_up_list_api'),
     path('visits/create/', medical_views.visit_create, name='visit_create'),
     path('visits/create/<int:patient_id>/', medical_views.visit_create, name='visit_create_for_patient'),
     path('visits/<int:visit_id>/', medical_views.visit_detail, name='visit_detail'),
     path('visits/<int:visit_id>/update/', medical_views.visit_update, name='visit_update'),
+    path('patients/<int:patient_id>/vitals/', medical_views.patient_vitals_series, name='patient_vitals_series'),
     
     # Prescriptions
     path('prescriptions/<int:prescription_id>/', medical_views.prescription_detail, name='prescription_detail'),
     path('visits/<int:visit_id>/prescriptions/create/', medical_views.prescription_create, name='prescription_create'),
+    path('visits/<int:visit_id>/prescriptions/bulk/', medical_views.prescription_bulk_create, name='prescription_bulk_create'),
     path('prescriptions/<int:prescription_id>/deactivate/', medical_views.prescription_deactivate, name='prescription_deactivate'),
     
     # AI Predictions
@@ -60,4 +69,5 @@ urlpatterns = [
     path('patients/<int:patient_id>/predict/', ai_views.predict_risk, name='predict_risk'),
     path('predictions/<int:prediction_id>/', ai_views.prediction_detail, name='prediction_detail'),
     path('ai/train-model/', ai_views.train_model_view, name='train_model'),
+    path('ai/train-model/jobs/<int:job_id>/', ai_views.training_job_detail, name='training_job_detail'),
 ]
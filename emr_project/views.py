@@ -3,7 +3,8 @@ from django.contrib.auth.decorators import login_required
 from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
-from patients.models import Patient
+from patients.models import ACTIVE_PATIENT_COUNT_KEY, Patient
+from .pagination import cached_count
 from medical.models import MedicalVisit, Prescription
 from ai_prediction.models import HealthRiskPrediction
 
@@ -14,7 +15,7 @@ def dashboard(request):
     Main dashboard view with statistics and recent activity
     """
     # Get statistics
-    total_patients = Patient.objects.filter(is_active=True).count()
+    total_patients = cached_count(Patient.objects.filter(is_active=True), ACTIVE_PATIENT_COUNT_KEY)
     total_visits = MedicalVisit.objects.count()
     total_prescriptions = Prescription.objects.filter(is_active=True).count()
     
@@ -55,3 +56,4 @@ def dashboard(request):
     }
     
     return render(request, 'dashboard.html', context)
+
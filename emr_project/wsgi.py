@@ -14,6 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emr_project.settings')
 
 application = get_wsgi_application()
+
+# Load the risk model before serving (in the gunicorn master when preloading)
+from ai_prediction.ml_model import warm_start  # noqa: E402
+warm_start()
+
 # كود لإنشاء حساب مدير تلقائياً عند التشغيل
 from django.contrib.auth import get_user_model
 User = get_user_model()
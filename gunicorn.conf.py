@@ -0,0 +1,20 @@
+"""
+Gunicorn configuration for the EMR system
+
+preload_app imports the Django application in the master process, so
+emr_project.wsgi loads the risk model (ml_model.warm_start) once before the
+workers are forked and every worker starts with it already in memory.
+
+Workers share cached chart summaries through EMR_SHARED_CACHE (see
+settings.py); unless the environment points it at Redis or another
+directory, a file-based cache under cache/shared is used.
+"""
+import os
+
+os.environ.setdefault(
+    'EMR_SHARED_CACHE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'shared'),
+)
+
+wsgi_app = 'emr_project.wsgi:application'
+preload_app = True
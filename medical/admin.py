@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import MedicalVisit, Prescription
+from .models import DrugInteraction, MedicalVisit, Prescription, alert_check_stats
 
 
 @admin.register(MedicalVisit)
@@ -16,3 +16,16 @@ class PrescriptionAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'has_allergy_alert', 'has_conflict_alert', 'prescribed_date']
     search_fields = ['medication_name', 'patient__first_name', 'patient__last_name']
     readonly_fields = ['prescribed_date', 'has_allergy_alert', 'allergy_alert_message', 'has_conflict_alert', 'conflict_alert_message']
+    
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {
+            **(extra_context or {}),
+            'alert_check_stats': {'run': alert_check_stats['run'], 'skipped': alert_check_stats['skipped']},
+        }
+        return super().changelist_view(request, extra_context)
+
+
+@admin.register(DrugInteraction)
+class DrugInteractionAdmin(admin.ModelAdmin):
+    list_display = ['drug', 'interacts_with', 'description']
+    search_fields = ['drug', 'interacts_with']
@@ -0,0 +1,71 @@
+"""
+Prescription alert rules
+
+Pure functions shared by Prescription.save(), batch prescribing and the
+alert re-evaluation pipeline, so every path produces identical flags, and
+the reverse allergy lookup built on the same rule.
+"""
+
+from patients.models import Patient
+from .allergen_index import get_allergen_index
+from .interactions import get_interaction_index
+from .matching import compiled_matcher
+
+
+def matched_allergens(medication_name, allergies):
+    """
+    Allergens contained in the medication name, or containing it
+    
+    Args:
+        medication_name: Prescribed medication
+        allergies: frozenset of normalized allergens (Patient.get_allergy_set())
+    """
+    if not allergies:
+        return set()
+    medication_lower = medication_name.strip().lower()
+    matched = compiled_matcher(allergies).find(medication_lower)
+    matched.update(a for a in allergies if medication_lower and medication_lower in a)
+    return matched
+
+
+def allergy_alert_message(medication_name, allergies):
+    """
+    Alert message if the medication matches one of the allergies, else None
+    
+    Args:
+        medication_name: Prescribed medication
+        allergies: Normalized allergy set (Patient.get_allergy_set())
+    """
+    matched = matched_allergens(medication_name, allergies)
+    if matched:
+        return f"WARNING: Patient is allergic to {min(matched)}!"
+    return None
+
+
+def patients_allergic_to(medication_name):
+    """
+    Patients for whom prescribing the medication would raise an allergy alert
+    
+    The alert rule is applied to the process-wide vocabulary of allergens
+    (see allergen_index.py); patients are then looked up by the matched
+    allergens on the PatientAllergy index.
+    """
+    matched = get_allergen_index().matched(medication_name)
+    return Patient.objects.filter(allergy_entries__allergen__in=matched).distinct()
+
+
+def conflict_alert_message(medication_name, other_names, index=None):
+    """
+    Alert message if the medication conflicts with any of other_names, else None
+    """
+    index = index or get_interaction_index()
+    return format_conflict_message(index.find_conflicts(medication_name, other_names))
+
+
+def format_conflict_message(conflicts):
+    """
+    Alert message for a list of conflicting medication names, or None if empty
+    """
+    if conflicts:
+        return f"WARNING: Potential conflict with: {', '.join(conflicts)}"
+    return None
@@ -0,0 +1,76 @@
+"""
+Allergen vocabulary for reverse allergy lookups
+
+"Which patients are allergic to X" applies the prescription allergy rule to
+every distinct allergen of every patient. That vocabulary is far smaller
+than the PatientAllergy table, so it is read once per process and compiled
+into a TermMatcher. It is reloaded after this process writes allergy
+entries, and extended with the allergens of rows other processes added
+(ids past the highest one seen), which costs one indexed MAX(id) per lookup.
+
+Allergens whose last entry was removed by another process linger until the
+next reload; they match no PatientAllergy row, so lookups stay exact.
+"""
+
+import threading
+
+from django.db.models import Max
+
+from patients.allergies import entries_generation
+from .matching import TermMatcher
+
+
+class AllergenIndex:
+    """
+    Distinct allergens with a compiled matcher, read up to a PatientAllergy id
+    """
+    
+    def __init__(self, allergens, last_id, generation):
+        self.allergens = frozenset(allergens)
+        self.matcher = TermMatcher(self.allergens)
+        self.last_id = last_id
+        self.generation = generation
+    
+    def extended(self, allergens, last_id):
+        """
+        Index also covering the given allergens (self if they are all known)
+        """
+        new = set(allergens) - self.allergens
+        if not new:
+            self.last_id = last_id
+            return self
+        return AllergenIndex(self.allergens | new, last_id, self.generation)
+    
+    def matched(self, medication_name):
+        """
+        Allergens contained in the medication name, or containing it (same rule as the alert)
+        """
+        medication_lower = medication_name.strip().lower()
+        matched = self.matcher.find(medication_lower)
+        if medication_lower:
+            matched.update(a for a in self.allergens if medication_lower in a)
+        return matched
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_allergen_index():
+    """
+    The process-wide AllergenIndex, brought up to date with the PatientAllergy table
+    """
+    global _index
+    from patients.models import PatientAllergy
+    
+    latest = PatientAllergy.objects.aggregate(latest=Max('id'))['latest'] or 0
+    with _index_lock:
+        index = _index
+        generation = entries_generation()
+        if index is None or index.generation != generation or latest < index.last_id:
+            allergens = PatientAllergy.objects.order_by().values_list('allergen', flat=True).distinct()
+            _index = AllergenIndex(allergens, latest, generation)
+        elif latest > index.last_id:
+            added = PatientAllergy.objects.filter(id__gt=index.last_id).values_list('allergen', flat=True).distinct()
+            _index = index.extended(added, latest)
+        return _index
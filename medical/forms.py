@@ -1,5 +1,8 @@
 from django import forms
+from django.contrib.auth import get_user_model
 from .models import MedicalVisit, Prescription
+from .timeseries import DOWNSAMPLING_METHODS, VITAL_FIELDS
+from .worklist import WORKLIST_SCOPES
 from patients.models import Patient
 
 
@@ -47,3 +50,58 @@ class PrescriptionForm(forms.ModelForm):
             'duration': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., 7 days'}),
             'instructions': forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
         }
+
+
+# Several prescriptions entered at once for a visit; blank rows are ignored
+PrescriptionFormSet = forms.modelformset_factory(
+    Prescription, form=PrescriptionForm, extra=5, max_num=20, validate_max=True
+)
+
+
+class VisitFilterForm(forms.Form):
+    """
+    Filters for the visit list (all optional)
+    """
+    doctor = forms.ModelChoiceField(
+        queryset=get_user_model().objects.filter(role='DOCTOR').order_by('last_name', 'first_name'),
+        required=False,
+        empty_label='All doctors',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    patient = forms.ModelChoiceField(queryset=Patient.objects.all(), required=False, widget=forms.HiddenInput)
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+
+
+class VitalsQueryForm(forms.Form):
+    """
+    Query parameters of the vitals series endpoint (all optional)
+    """
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    points = forms.IntegerField(required=False, min_value=3, max_value=5000)
+    method = forms.ChoiceField(required=False, choices=[(m, m) for m in DOWNSAMPLING_METHODS])
+    field = forms.MultipleChoiceField(required=False, choices=[(f, f) for f in VITAL_FIELDS])
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('start') and cleaned_data.get('end') and cleaned_data['start'] > cleaned_data['end']:
+            raise forms.ValidationError('start must not be after end.')
+        return cleaned_data
+
+
+class FollowUpFilterForm(forms.Form):
+    """
+    Filters for the follow-up worklist
+    """
+    doctor = forms.ModelChoiceField(
+        queryset=get_user_model().objects.filter(role='DOCTOR').order_by('last_name', 'first_name'),
+        required=False,
+        empty_label='All doctors',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    scope = forms.ChoiceField(
+        choices=list(WORKLIST_SCOPES.items()),
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
@@ -0,0 +1,97 @@
+"""
+Drug interaction engine
+
+The DrugInteraction table is compiled once per process into an
+InteractionIndex: a TermMatcher over every drug term plus a map of drug ->
+interacting terms. Checking a medication against a patient's N active
+medications is then one pass over each name, independent of the number of
+rules. The index is rebuilt when rules change in this process and at least
+every DRUG_INTERACTION_INDEX_TTL seconds to pick up edits from other workers.
+
+Once a rule change commits, the stored alerts of the patients it can affect
+are re-evaluated (see signals.py), so flags and dashboard counts follow the
+rules. Prescriptions saved by other workers before their index expires can
+still carry the old rules; reevaluate_prescription_alerts corrects them.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+from .matching import TermMatcher
+
+# Upper bound on memoized medication names per index
+TERMS_CACHE_SIZE = 100000
+
+
+class InteractionIndex:
+    """
+    Compiled, directional interaction rules: prescribing `drug` conflicts with
+    an active medication containing any of its `interacts_with` terms
+    """
+    
+    def __init__(self, rules):
+        self.rules = {}
+        for drug, interacts_with in rules:
+            self.rules.setdefault(drug.strip().lower(), set()).add(interacts_with.strip().lower())
+        self.matcher = TermMatcher(set(self.rules) | set().union(*self.rules.values()))
+        # medication name -> rule terms it contains; names repeat heavily
+        self._terms_cache = {}
+    
+    def terms_in(self, medication_name):
+        """
+        Rule terms contained in a medication name (memoized per name)
+        """
+        terms = self._terms_cache.get(medication_name)
+        if terms is None:
+            if len(self._terms_cache) >= TERMS_CACHE_SIZE:
+                self._terms_cache.clear()
+            terms = self._terms_cache[medication_name] = frozenset(self.matcher.find(medication_name))
+        return terms
+    
+    def conflicting_terms(self, medication_name):
+        """
+        Terms that conflict with the given medication (empty if it has no rules)
+        """
+        terms = set()
+        for drug in self.terms_in(medication_name):
+            terms |= self.rules.get(drug, set())
+        return terms
+    
+    def find_conflicts(self, medication_name, other_names):
+        """
+        Return the names in other_names that conflict with medication_name
+        """
+        conflicting = self.conflicting_terms(medication_name)
+        if not conflicting:
+            return []
+        return [name for name in other_names if self.terms_in(name) & conflicting]
+
+
+_index = None
+_index_built_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_interaction_index():
+    """
+    The process-wide InteractionIndex, built from the DrugInteraction table on first use
+    """
+    global _index, _index_built_at
+    ttl = getattr(settings, 'DRUG_INTERACTION_INDEX_TTL', 300)
+    index = _index
+    if index is not None and time.monotonic() - _index_built_at < ttl:
+        return index
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_built_at >= ttl:
+            from .models import DrugInteraction
+            _index = InteractionIndex(DrugInteraction.objects.values_list('drug', 'interacts_with'))
+            _index_built_at = time.monotonic()
+        return _index
+
+
+def invalidate_interaction_index():
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from medical.reevaluation import reevaluate_alerts
+
+
+class Command(BaseCommand):
+    help = ('Recompute allergy and drug conflict alerts of all active prescriptions, '
+            'e.g. after the interaction rules changed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', type=int, action='append', dest='patients',
+                            help='Only re-evaluate this patient (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Patients evaluated per round trip')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        
+        def progress(scanned, updated):
+            self.stdout.write(f'{scanned} prescriptions scanned, {updated} updated')
+        
+        scanned, updated = reevaluate_alerts(
+            patient_ids=options['patients'],
+            patients_per_chunk=options['chunk_size'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Re-evaluated {scanned} active prescriptions in {elapsed:.1f}s; {updated} had stale alerts.'
+        ))
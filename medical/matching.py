@@ -0,0 +1,69 @@
+"""
+Multi-pattern substring matching
+
+TermMatcher compiles a set of terms into an Aho-Corasick automaton, so the
+terms contained in a piece of text are found in a single pass over the text,
+however many terms there are.
+"""
+
+from collections import deque
+from functools import lru_cache
+
+
+class TermMatcher:
+    """
+    Aho-Corasick automaton over a fixed set of case-insensitive terms
+    """
+    
+    def __init__(self, terms):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [frozenset()]
+        
+        for term in {t.strip().lower() for t in terms if t and t.strip()}:
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(frozenset())
+                state = next_state
+            self._output[state] = self._output[state] | {term}
+        
+        # Breadth-first construction of failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] | self._output[self._fail[next_state]]
+    
+    def find(self, text):
+        """
+        Return the set of terms occurring in text
+        """
+        found = set()
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for char in (text or '').lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+@lru_cache(maxsize=4096)
+def compiled_matcher(terms):
+    """
+    Shared TermMatcher for a frozenset of terms, e.g. a patient's allergy set
+    """
+    return TermMatcher(terms)
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DrugInteraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('drug', models.CharField(help_text='Lowercase drug name or ingredient', max_length=100)),
+                ('interacts_with', models.CharField(help_text='Lowercase drug name or ingredient', max_length=100)),
+                ('description', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['drug', 'interacts_with'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='druginteraction',
+            constraint=models.UniqueConstraint(fields=('drug', 'interacts_with'), name='unique_drug_interaction'),
+        ),
+    ]
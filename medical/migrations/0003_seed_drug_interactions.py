@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 01:49
+
+from django.db import migrations
+
+
+# The rules previously hard-coded in Prescription.check_drug_conflicts
+INITIAL_INTERACTIONS = {
+    'warfarin': ['aspirin', 'ibuprofen', 'naproxen'],
+    'aspirin': ['warfarin', 'heparin'],
+    'metformin': ['alcohol'],
+    'insulin': ['alcohol'],
+}
+
+
+def seed_interactions(apps, schema_editor):
+    DrugInteraction = apps.get_model('medical', 'DrugInteraction')
+    DrugInteraction.objects.bulk_create([
+        DrugInteraction(drug=drug, interacts_with=interacts_with)
+        for drug, interacting in INITIAL_INTERACTIONS.items()
+        for interacts_with in interacting
+    ], ignore_conflicts=True)
+
+
+def remove_interactions(apps, schema_editor):
+    DrugInteraction = apps.get_model('medical', 'DrugInteraction')
+    for drug, interacting in INITIAL_INTERACTIONS.items():
+        DrugInteraction.objects.filter(drug=drug, interacts_with__in=interacting).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0002_druginteraction'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_interactions, remove_interactions),
+    ]
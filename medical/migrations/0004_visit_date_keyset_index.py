@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0003_seed_drug_interactions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalvisit',
+            index=models.Index(fields=['-visit_date', '-id'], name='medical_med_visit_d_59d1a6_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0004_visit_date_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalvisit',
+            index=models.Index(condition=models.Q(('follow_up_date__isnull', False)), fields=['doctor', 'follow_up_date'], name='visit_follow_up_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalvisit',
+            index=models.Index(condition=models.Q(('follow_up_date__isnull', False)), fields=['follow_up_date'], name='visit_follow_up_date_idx'),
+        ),
+    ]
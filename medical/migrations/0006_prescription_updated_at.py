@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 02:18
+
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Existing rows get their prescription time instead of the migration time
+    Prescription = apps.get_model('medical', 'Prescription')
+    Prescription.objects.update(updated_at=models.F('prescribed_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0005_visit_follow_up_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescription',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='medicalvisit',
+            index=models.Index(fields=['updated_at'], name='medical_med_updated_71e8ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['updated_at'], name='medical_pre_updated_0abb5f_idx'),
+        ),
+    ]
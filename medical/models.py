@@ -1,6 +1,10 @@
+from collections import Counter
+
 from django.db import models
 from django.conf import settings
 from patients.models import Patient
+from .interactions import get_interaction_index
+from .alerts import allergy_alert_message, conflict_alert_message
 
 
 class MedicalVisit(models.Model):
@@ -37,6 +41,18 @@ class MedicalVisit(models.Model):
         indexes = [
             models.Index(fields=['patient', '-visit_date']),
             models.Index(fields=['doctor', '-visit_date']),
+            models.Index(fields=['-visit_date', '-id']),
+            models.Index(fields=['updated_at']),
+            models.Index(
+                fields=['doctor', 'follow_up_date'],
+                condition=models.Q(follow_up_date__isnull=False),
+                name='visit_follow_up_due_idx',
+            ),
+            models.Index(
+                fields=['follow_up_date'],
+                condition=models.Q(follow_up_date__isnull=False),
+                name='visit_follow_up_date_idx',
+            ),
         ]
     
     def __str__(self):
@@ -48,6 +64,17 @@ class MedicalVisit(models.Model):
         return "N/A"
 
 
+# Fields whose changes can alter a prescription's alerts
+ALERT_TRIGGER_FIELDS = ('medication_name', 'patient_id', 'is_active')
+
+# How many Prescription saves ran vs skipped alert evaluation ('run' / 'skipped')
+alert_check_stats = Counter()
+
+
+def _saved_attnames(update_fields):
+    return {name.removesuffix('_id') + suffix for name in update_fields for suffix in ('', '_id')}
+
+
 class Prescription(models.Model):
     """
     Prescription model to manage medications prescribed during visits
@@ -71,6 +98,7 @@ class Prescription(models.Model):
     
     # System Fields
     prescribed_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
     class Meta:
@@ -78,74 +106,132 @@ class Prescription(models.Model):
         indexes = [
             models.Index(fields=['patient', '-prescribed_date']),
             models.Index(fields=['medication_name']),
+            models.Index(fields=['updated_at']),
         ]
     
     def __str__(self):
         return f"{self.medication_name} - {self.patient.get_full_name()}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_alert_state()
+        return instance
+    
+    def _remember_alert_state(self, names=ALERT_TRIGGER_FIELDS):
+        deferred = self.get_deferred_fields()
+        state = getattr(self, '_loaded_alert_state', None) or {}
+        state.update((name, getattr(self, name)) for name in names if name not in deferred)
+        self._loaded_alert_state = state
+    
+    def alert_fields_changed(self):
+        """
+        Return the alert-relevant fields changed since the row was loaded
+        """
+        loaded = getattr(self, '_loaded_alert_state', None)
+        if self._state.adding or loaded is None:
+            return set(ALERT_TRIGGER_FIELDS)
+        return {
+            name for name in ALERT_TRIGGER_FIELDS
+            if name not in loaded or getattr(self, name) != loaded[name]
+        }
+    
+    def needs_alert_check(self, update_fields=None):
+        """
+        Whether saving this prescription could change its alerts
+        
+        New prescriptions, a changed medication or patient, and reactivation
+        need evaluation; deactivation and edits to other fields keep the flags.
+        """
+        changed = self.alert_fields_changed()
+        if update_fields is not None:
+            changed &= _saved_attnames(update_fields)
+        if changed == {'is_active'}:
+            return self.is_active
+        return bool(changed)
+    
     def check_allergy_alert(self):
         """
         Check if patient has allergies to the prescribed medication
         """
-        if self.patient.allergies:
-            allergies_list = [a.strip().lower() for a in self.patient.allergies.split(',')]
-            medication_lower = self.medication_name.lower()
-            
-            for allergy in allergies_list:
-                if allergy in medication_lower or medication_lower in allergy:
-                    self.has_allergy_alert = True
-                    self.allergy_alert_message = f"WARNING: Patient is allergic to {allergy}!"
-                    return True
-        
-        self.has_allergy_alert = False
-        self.allergy_alert_message = None
-        return False
+        message = allergy_alert_message(self.medication_name, self.patient.get_allergy_set())
+        self.has_allergy_alert = message is not None
+        self.allergy_alert_message = message
+        return self.has_allergy_alert
     
-    def check_drug_conflicts(self):
+    def check_drug_conflicts(self, active_medications=None):
         """
         Check for potential drug conflicts with current medications
-        Simple rule-based checking
-        """
-        # Get active prescriptions for this patient (excluding current one)
-        active_prescriptions = Prescription.objects.filter(
-            patient=self.patient,
-            is_active=True
-        ).exclude(id=self.id)
-        
-        # Simple conflict rules (can be expanded)
-        conflict_rules = {
-            'warfarin': ['aspirin', 'ibuprofen', 'naproxen'],
-            'aspirin': ['warfarin', 'heparin'],
-            'metformin': ['alcohol'],
-            'insulin': ['alcohol'],
-        }
+        Rule-based checking against the compiled DrugInteraction index
         
-        medication_lower = self.medication_name.lower()
-        conflicts = []
-        
-        for prescription in active_prescriptions:
-            other_med = prescription.medication_name.lower()
-            
-            # Check if current medication has conflicts
-            for drug, conflicting_drugs in conflict_rules.items():
-                if drug in medication_lower:
-                    for conflicting in conflicting_drugs:
-                        if conflicting in other_med:
-                            conflicts.append(f"{prescription.medication_name}")
+        Args:
+            active_medications: Medication names to check against, if already
+                known (e.g. for a batch); otherwise the patient's other active
+                prescriptions are queried
+        """
+        index = get_interaction_index()
+        message = None
         
-        if conflicts:
-            self.has_conflict_alert = True
-            self.conflict_alert_message = f"WARNING: Potential conflict with: {', '.join(conflicts)}"
-            return True
+        # Only fetch the patient's active medications if this drug has any rules
+        if index.conflicting_terms(self.medication_name):
+            if active_medications is None:
+                # Get active prescriptions for this patient (excluding current one)
+                active_medications = Prescription.objects.filter(
+                    patient=self.patient,
+                    is_active=True
+                ).exclude(id=self.id).order_by('-prescribed_date', '-id').values_list('medication_name', flat=True)
+            message = conflict_alert_message(self.medication_name, active_medications, index)
         
-        self.has_conflict_alert = False
-        self.conflict_alert_message = None
-        return False
+        self.has_conflict_alert = message is not None
+        self.conflict_alert_message = message
+        return self.has_conflict_alert
     
     def save(self, *args, **kwargs):
         """
-        Override save to check for alerts before saving
+        Override save to check for alerts before saving, when relevant fields changed
         """
-        self.check_allergy_alert()
-        self.check_drug_conflicts()
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            # updated_at is the incremental export watermark, so it moves on every
+            # save; an empty update_fields stays a no-op, as in Model.save()
+            kwargs['update_fields'] = set(update_fields) | {'updated_at'}
+        if self.needs_alert_check(update_fields):
+            self.check_allergy_alert()
+            self.check_drug_conflicts()
+            if update_fields:
+                kwargs['update_fields'] |= {
+                    'has_allergy_alert', 'allergy_alert_message',
+                    'has_conflict_alert', 'conflict_alert_message',
+                }
+            alert_check_stats['run'] += 1
+        else:
+            alert_check_stats['skipped'] += 1
+        super().save(*args, **kwargs)
+        if update_fields is None:
+            self._remember_alert_state()
+        else:
+            self._remember_alert_state(set(ALERT_TRIGGER_FIELDS) & _saved_attnames(update_fields))
+
+
+class DrugInteraction(models.Model):
+    """
+    Directional drug interaction rule: prescribing a medication containing
+    `drug` conflicts with an active medication containing `interacts_with`
+    """
+    drug = models.CharField(max_length=100, help_text="Lowercase drug name or ingredient")
+    interacts_with = models.CharField(max_length=100, help_text="Lowercase drug name or ingredient")
+    description = models.TextField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['drug', 'interacts_with']
+        constraints = [
+            models.UniqueConstraint(fields=['drug', 'interacts_with'], name='unique_drug_interaction'),
+        ]
+    
+    def __str__(self):
+        return f"{self.drug} -> {self.interacts_with}"
+    
+    def save(self, *args, **kwargs):
+        self.drug = self.drug.strip().lower()
+        self.interacts_with = self.interacts_with.strip().lower()
         super().save(*args, **kwargs)
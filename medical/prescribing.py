@@ -0,0 +1,60 @@
+"""
+Batch prescribing
+
+A discharge order or medication reconciliation enters several drugs at once.
+Saving them one by one re-queries the patient's active medications for every
+row and misses conflicts between drugs of the same order. create_prescriptions
+evaluates the whole batch in memory against a single read of the active
+medications, then writes every row with one bulk insert.
+"""
+
+from django.db import transaction
+
+from patients.chart import invalidate_chart_summaries
+
+from .interactions import get_interaction_index
+from .models import Prescription, alert_check_stats
+
+
+def create_prescriptions(visit, doctor, prescriptions):
+    """
+    Evaluate alerts for and save a batch of new prescriptions for a visit
+    
+    Each prescription is checked for allergies and for conflicts with the
+    patient's active medications and with the rest of the batch.
+    
+    Args:
+        visit: MedicalVisit the prescriptions belong to (patient preloaded)
+        doctor: Prescribing user
+        prescriptions: Unsaved Prescription instances
+    
+    Returns:
+        The saved prescriptions
+    """
+    patient = visit.patient
+    names = [prescription.medication_name for prescription in prescriptions]
+    index = get_interaction_index()
+    
+    with transaction.atomic():
+        active_medications = []
+        if any(index.conflicting_terms(name) for name in names):
+            active_medications = list(
+                Prescription.objects.filter(patient=patient, is_active=True).order_by('-prescribed_date', '-id')
+                .values_list('medication_name', flat=True)
+            )
+        
+        for position, prescription in enumerate(prescriptions):
+            prescription.visit = visit
+            prescription.patient = patient
+            prescription.doctor = doctor
+            prescription.check_allergy_alert()
+            prescription.check_drug_conflicts(
+                active_medications + names[:position] + names[position + 1:]
+            )
+        
+        created = Prescription.objects.bulk_create(prescriptions)
+        # bulk_create sends no post_save
+        invalidate_chart_summaries([patient.pk])
+    
+    alert_check_stats['run'] += len(created)
+    return created
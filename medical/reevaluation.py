@@ -0,0 +1,155 @@
+"""
+Set-based re-evaluation of prescription alerts
+
+Alert flags are computed when a prescription is saved, so they go stale
+when interaction rules or a patient's allergies change afterwards.
+reevaluate_alerts walks the active prescriptions patient by patient (keyset
+pagination on patient_id), evaluates every one in memory against the
+compiled interaction index and the patient's parsed allergies, and writes
+back only the rows whose flags actually changed, in batched UPDATEs.
+"""
+
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from patients.allergies import parse_allergies
+from patients.chart import invalidate_chart_summaries
+from .alerts import allergy_alert_message, format_conflict_message
+from .interactions import get_interaction_index
+from .models import Prescription
+
+ALERT_FIELDS = ['has_allergy_alert', 'allergy_alert_message', 'has_conflict_alert', 'conflict_alert_message']
+
+
+def evaluate_patient(rows, allergies, index):
+    """
+    Recompute the alerts of one patient's active prescriptions
+    
+    Args:
+        rows: (id, medication_name, has_allergy_alert, allergy_alert_message,
+            has_conflict_alert, conflict_alert_message) tuples
+        allergies: The patient's normalized allergy set
+        index: InteractionIndex
+    
+    Returns:
+        (id, new alert field values) pairs for the prescriptions whose flags changed
+    """
+    names = [row[1] for row in rows]
+    # Positions of the conflicting medications, computed once per distinct drug
+    conflict_positions = {}
+    allergy_messages = {}
+    changed = []
+    for position, (prescription_id, name, *current) in enumerate(rows):
+        if name not in conflict_positions:
+            conflicting = index.conflicting_terms(name)
+            conflict_positions[name] = [
+                other_position for other_position, other in enumerate(names)
+                if conflicting and index.terms_in(other) & conflicting
+            ]
+        if name not in allergy_messages:
+            allergy_messages[name] = allergy_alert_message(name, allergies)
+        allergy_message = allergy_messages[name]
+        conflict_message = format_conflict_message(
+            [names[other_position] for other_position in conflict_positions[name] if other_position != position]
+        )
+        flags = [allergy_message is not None, allergy_message, conflict_message is not None, conflict_message]
+        if flags != current:
+            changed.append((prescription_id, tuple(flags)))
+    return changed
+
+
+def write_alerts(changed, batch_size=500):
+    """
+    Persist recomputed alert flags
+    
+    Only a handful of distinct flag/message combinations exist (a message
+    names the allergy or conflicting drugs), so rows are grouped by their new
+    values and written with one UPDATE ... WHERE id IN (...) per group and
+    batch, which is far cheaper than a per-row CASE expression.
+    """
+    by_flags = {}
+    for prescription_id, flags in changed:
+        by_flags.setdefault(flags, []).append(prescription_id)
+    with transaction.atomic():
+        for flags, ids in by_flags.items():
+            # QuerySet.update does not touch auto_now fields
+            values = dict(zip(ALERT_FIELDS, flags), updated_at=timezone.now())
+            for start in range(0, len(ids), batch_size):
+                Prescription.objects.filter(id__in=ids[start:start + batch_size]).update(**values)
+
+
+def reevaluate_alerts(patient_ids=None, patients_per_chunk=1000, progress=None):
+    """
+    Re-evaluate the alert flags of active prescriptions
+    
+    Args:
+        patient_ids: Restrict to these patients (default: everyone)
+        patients_per_chunk: Patients read and written per round trip
+        progress: Optional callable(scanned, updated) called after each chunk
+    
+    Returns:
+        (scanned, updated) prescription counts
+    """
+    index = get_interaction_index()
+    active = Prescription.objects.filter(is_active=True)
+    if patient_ids is not None:
+        active = active.filter(patient_id__in=list(patient_ids))
+    
+    scanned = updated = 0
+    last_patient_id = 0
+    while True:
+        chunk_patients = list(
+            active.filter(patient_id__gt=last_patient_id)
+            .order_by('patient_id').values_list('patient_id', flat=True).distinct()[:patients_per_chunk]
+        )
+        if not chunk_patients:
+            break
+        last_patient_id = chunk_patients[-1]
+        
+        rows = (
+            active.filter(patient_id__gte=chunk_patients[0], patient_id__lte=last_patient_id)
+            .order_by('patient_id', '-prescribed_date', '-id')
+            .values_list('patient_id', 'patient__allergies', 'id', 'medication_name', *ALERT_FIELDS)
+        )
+        changed = []
+        changed_patients = []
+        for (patient_id, allergies), group in groupby(rows, key=lambda row: row[:2]):
+            group = [row[2:] for row in group]
+            scanned += len(group)
+            patient_changes = evaluate_patient(group, parse_allergies(allergies), index)
+            if patient_changes:
+                changed.extend(patient_changes)
+                changed_patients.append(patient_id)
+        
+        if changed:
+            write_alerts(changed)
+            # QuerySet.update sends no post_save
+            invalidate_chart_summaries(changed_patients)
+            updated += len(changed)
+        if progress:
+            progress(scanned, updated)
+    
+    return scanned, updated
+
+
+def reevaluate_alerts_for_drugs(drug_terms):
+    """
+    Re-evaluate the patients with an active prescription containing any of the drug terms
+    
+    Conflict flags sit on the prescriptions of a rule's `drug`, so these are
+    the only patients whose alerts a change to the rules for drug_terms can
+    alter.
+    
+    Returns:
+        (scanned, updated) prescription counts
+    """
+    matches = Q()
+    for term in {term for term in drug_terms if term}:
+        matches |= Q(medication_name__icontains=term)
+    if not matches:
+        return 0, 0
+    patient_ids = Prescription.objects.filter(matches, is_active=True).values_list('patient_id', flat=True).distinct()
+    return reevaluate_alerts(list(patient_ids))
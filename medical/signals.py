@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from patients.signals import allergies_changed, patients_imported
+from .interactions import invalidate_interaction_index
+from .models import DrugInteraction
+from .reevaluation import reevaluate_alerts, reevaluate_alerts_for_drugs
+
+
+@receiver(pre_save, sender=DrugInteraction)
+def remember_interaction_drug(sender, instance, **kwargs):
+    # An edited rule can stop applying to its previous drug
+    instance._previous_drug = (
+        sender.objects.filter(pk=instance.pk).values_list('drug', flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=DrugInteraction)
+@receiver(post_delete, sender=DrugInteraction)
+def rebuild_interaction_index(sender, instance, **kwargs):
+    invalidate_interaction_index()
+    drug_terms = {instance.drug, getattr(instance, '_previous_drug', None)}
+    
+    def reevaluate():
+        # Rebuilt from the committed rules, whatever was read during the transaction
+        invalidate_interaction_index()
+        reevaluate_alerts_for_drugs(drug_terms)
+    
+    transaction.on_commit(reevaluate)
+
+
+@receiver(allergies_changed)
+def reevaluate_alerts_for_patient(sender, patient, **kwargs):
+    patient_id = patient.pk
+    transaction.on_commit(lambda: reevaluate_alerts([patient_id]))
+
+
+@receiver(patients_imported)
+def reevaluate_alerts_for_import(sender, allergies_changed_ids, **kwargs):
+    if allergies_changed_ids:
+        transaction.on_commit(lambda: reevaluate_alerts(allergies_changed_ids))
@@ -1,3 +1,485 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from django.db import connection
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from patients.models import Patient, PatientAllergy
+from .allergen_index import get_allergen_index
+from .alerts import allergy_alert_message, patients_allergic_to
+from .forms import PrescriptionFormSet
+from .interactions import InteractionIndex, invalidate_interaction_index
+from .matching import TermMatcher
+from .models import DrugInteraction, MedicalVisit, Prescription, alert_check_stats
+from .prescribing import create_prescriptions
+from .timeseries import lttb, minmax, patient_vitals
+from .worklist import follow_up_worklist
+
+
+class TermMatcherTests(SimpleTestCase):
+    def test_overlapping_terms(self):
+        matcher = TermMatcher(['he', 'she', 'his', 'hers'])
+        self.assertEqual(matcher.find('ushers'), {'she', 'he', 'hers'})
+
+    def test_match_reached_through_failure_link(self):
+        # 'abc' fails on 'd' and resumes from 'bc', the longest suffix in the trie
+        matcher = TermMatcher(['abcx', 'bcd'])
+        self.assertEqual(matcher.find('abcd'), {'bcd'})
+        # The 'bc' state inherits the output of 'c' through its failure link
+        self.assertEqual(TermMatcher(['bca', 'c']).find('bcx'), {'c'})
+
+    def test_case_insensitive(self):
+        matcher = TermMatcher([' Warfarin ', 'ASPIRIN'])
+        self.assertEqual(matcher.find('WARFARIN Sodium with aspirin'), {'warfarin', 'aspirin'})
+
+    def test_word_boundaries_are_not_required(self):
+        matcher = TermMatcher(['aspirin', 'cillin'])
+        self.assertEqual(matcher.find('Aspirin-EC 81mg'), {'aspirin'})
+        self.assertEqual(matcher.find('(aspirin)'), {'aspirin'})
+        self.assertEqual(matcher.find('Amoxicillin 500mg'), {'cillin'})
+        self.assertEqual(matcher.find('aspiri n'), set())
+
+    def test_empty_terms_and_text(self):
+        self.assertEqual(TermMatcher(['', '  ']).find('anything'), set())
+        self.assertEqual(TermMatcher(['aspirin']).find(None), set())
+        self.assertEqual(TermMatcher(['aspirin']).find(''), set())
+
+
+class InteractionIndexTests(SimpleTestCase):
+    def test_finds_conflicting_active_medications(self):
+        index = InteractionIndex([('Warfarin', 'aspirin')])
+        self.assertEqual(
+            index.find_conflicts('Warfarin 5mg', ['Aspirin 81mg', 'Metformin 500mg', 'Baby ASPIRIN']),
+            ['Aspirin 81mg', 'Baby ASPIRIN'],
+        )
+
+    def test_rules_are_directional(self):
+        index = InteractionIndex([('warfarin', 'aspirin')])
+        self.assertEqual(index.find_conflicts('Aspirin 81mg', ['Warfarin 5mg']), [])
+
+    def test_pair_found_in_both_directions_with_both_rules(self):
+        index = InteractionIndex([('warfarin', 'aspirin'), ('aspirin', 'warfarin')])
+        self.assertEqual(index.find_conflicts('Warfarin 5mg', ['Aspirin 81mg']), ['Aspirin 81mg'])
+        self.assertEqual(index.find_conflicts('Aspirin 81mg', ['Warfarin 5mg']), ['Warfarin 5mg'])
+
+    def test_medication_without_rules(self):
+        index = InteractionIndex([('warfarin', 'aspirin')])
+        self.assertEqual(index.conflicting_terms('Metformin'), set())
+        self.assertEqual(index.find_conflicts('Metformin', ['Aspirin 81mg']), [])
+
+    def test_combination_product_collects_rules_of_each_ingredient(self):
+        index = InteractionIndex([('warfarin', 'aspirin'), ('sildenafil', 'nitroglycerin')])
+        self.assertEqual(index.conflicting_terms('Sildenafil / Warfarin'), {'aspirin', 'nitroglycerin'})
+        self.assertEqual(index.terms_in('Sildenafil / Warfarin'), {'sildenafil', 'warfarin'})
+
+
+class DownsamplingTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.x = np.arange(1000, dtype=float)
+        self.y = 120 + rng.normal(0, 5, 1000)
+        self.y[[137, 612]] = [210, 60]
+
+    def test_lttb_keeps_requested_points_in_order(self):
+        kept = lttb(self.x, self.y, 50)
+        self.assertEqual(len(kept), 50)
+        self.assertTrue((np.diff(kept) > 0).all())
+        self.assertEqual((kept[0], kept[-1]), (0, 999))
+
+    def test_lttb_keeps_outliers(self):
+        kept = lttb(self.x, self.y, 50)
+        self.assertIn(137, kept)
+        self.assertIn(612, kept)
+
+    def test_minmax_keeps_extremes_and_endpoints_of_each_bucket(self):
+        kept = minmax(self.x, self.y, 50)
+        self.assertLessEqual(len(kept), 50)
+        self.assertTrue((np.diff(kept) > 0).all())
+        for bucket in np.array_split(np.arange(1000), 25):
+            self.assertIn(bucket[self.y[bucket].argmin()], kept)
+            self.assertIn(bucket[self.y[bucket].argmax()], kept)
+        self.assertIn(137, kept)
+        self.assertIn(612, kept)
+
+    def test_short_series_passes_through(self):
+        for downsample in (lttb, minmax):
+            np.testing.assert_array_equal(downsample(self.x[:10], self.y[:10], 10), np.arange(10))
+            np.testing.assert_array_equal(downsample(self.x[:10], self.y[:10], 500), np.arange(10))
+            np.testing.assert_array_equal(downsample(self.x[:0], self.y[:0], 500), np.arange(0))
+
+
+class PatientVitalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(
+            first_name='Test', last_name='Patient', date_of_birth='1970-01-01', gender='O',
+            national_id='VITALS-1', phone_number='000', address='-',
+        )
+        start = timezone.now() - timedelta(days=100)
+        for day in range(100):
+            visit = MedicalVisit.objects.create(
+                patient=cls.patient, chief_complaint='-', symptoms='-', diagnosis='-',
+                blood_pressure_systolic=None if day % 3 else 120 + day,
+                heart_rate=70,
+            )
+            MedicalVisit.objects.filter(pk=visit.pk).update(visit_date=start + timedelta(days=day))
+
+    def test_missing_readings_are_skipped(self):
+        series = patient_vitals(self.patient.pk, points=500)
+        self.assertEqual(series['blood_pressure_systolic']['count'], 34)
+        self.assertEqual(series['blood_pressure_systolic']['v'], [120.0 + day for day in range(0, 100, 3)])
+        self.assertEqual(series['temperature'], {'t': [], 'v': [], 'count': 0})
+
+    def test_series_is_downsampled_to_points(self):
+        for method in ('lttb', 'minmax'):
+            series = patient_vitals(
+                self.patient.pk, fields=('blood_pressure_systolic', 'heart_rate'), points=10, method=method,
+            )
+            systolic = series['blood_pressure_systolic']
+            self.assertEqual(systolic['count'], 34)
+            self.assertLessEqual(len(systolic['v']), 10)
+            self.assertEqual(systolic['v'][0], 120.0)
+            self.assertEqual(systolic['v'][-1], 219.0)
+            self.assertEqual(series['heart_rate']['count'], 100)
+            self.assertEqual(systolic['t'], sorted(systolic['t']))
+
+
+class PatientsAllergicToTests(TestCase):
+    """
+    The reverse allergy lookup must agree with the prescription allergy alert
+    """
+
+    def setUp(self):
+        self.patients = {}
+        for number, allergies in enumerate(['Penicillin', 'pen, latex', 'Amoxicillin clavulanate', 'Aspirin', '']):
+            self.patients[allergies] = Patient.objects.create(
+                first_name='Test', last_name=f'Patient {number}', date_of_birth='1970-01-01', gender='O',
+                national_id=f'ALLERGY-{number}', phone_number='000', address='-', allergies=allergies,
+            )
+
+    def assertMatchesAlerts(self, medication_name):
+        alerted = {
+            patient for patient in self.patients.values()
+            if allergy_alert_message(medication_name, patient.get_allergy_set())
+        }
+        self.assertEqual(set(patients_allergic_to(medication_name)), alerted)
+        return alerted
+
+    def test_allergen_contained_in_medication(self):
+        alerted = self.assertMatchesAlerts('Penicillin V 500mg')
+        self.assertEqual(alerted, {self.patients['Penicillin'], self.patients['pen, latex']})
+
+    def test_medication_contained_in_allergen(self):
+        alerted = self.assertMatchesAlerts('amoxicillin')
+        self.assertEqual(alerted, {self.patients['Amoxicillin clavulanate']})
+
+    def test_no_match(self):
+        self.assertEqual(self.assertMatchesAlerts('Metformin'), set())
+
+    def test_vocabulary_is_reused_until_entries_change(self):
+        index = get_allergen_index()
+        self.assertIs(get_allergen_index(), index)
+        patient = self.patients['Aspirin']
+        patient.allergies = 'Aspirin, sulfa'
+        patient.save()
+        self.assertIn('sulfa', get_allergen_index().allergens)
+        self.assertIn(patient, patients_allergic_to('Sulfamethoxazole'))
+
+    def test_entries_added_by_another_process_are_picked_up(self):
+        get_allergen_index()
+        # Written without going through this process's sync functions
+        PatientAllergy.objects.create(patient=self.patients[''], allergen='codeine')
+        self.assertEqual(list(patients_allergic_to('Codeine phosphate')), [self.patients['']])
+
+
+class NeedsAlertCheckTests(TestCase):
+    """
+    Saves that cannot change a prescription's alerts skip the evaluation
+    """
+
+    def setUp(self):
+        patient = Patient.objects.create(
+            first_name='Test', last_name='Patient', date_of_birth='1970-01-01', gender='O',
+            national_id='ALERT-1', phone_number='000', address='-', allergies='penicillin',
+        )
+        visit = MedicalVisit.objects.create(patient=patient, chief_complaint='-', symptoms='-', diagnosis='-')
+        created = Prescription.objects.create(
+            visit=visit, patient=patient, medication_name='Ibuprofen', dosage='200mg', frequency='daily', duration='7 days',
+        )
+        self.prescription = Prescription.objects.get(pk=created.pk)
+
+    def assertSaveChecks(self, expected, **update_kwargs):
+        before = alert_check_stats.copy()
+        self.assertEqual(self.prescription.needs_alert_check(), expected)
+        self.prescription.save(**update_kwargs)
+        self.assertEqual(alert_check_stats['run'] - before['run'], int(expected))
+        self.assertEqual(alert_check_stats['skipped'] - before['skipped'], int(not expected))
+
+    def test_deactivation_skips(self):
+        self.prescription.is_active = False
+        self.assertSaveChecks(False, update_fields=['is_active'])
+
+    def test_reactivation_runs(self):
+        self.prescription.is_active = False
+        self.prescription.save(update_fields=['is_active'])
+        self.prescription = Prescription.objects.get(pk=self.prescription.pk)
+        self.prescription.is_active = True
+        self.assertSaveChecks(True)
+
+    def test_medication_change_runs(self):
+        self.prescription.medication_name = 'Penicillin V'
+        self.assertSaveChecks(True)
+        self.assertTrue(Prescription.objects.get(pk=self.prescription.pk).has_allergy_alert)
+
+    def test_unrelated_edit_skips(self):
+        self.prescription.dosage = '400mg'
+        self.assertSaveChecks(False)
+
+    def test_empty_update_fields_writes_nothing(self):
+        updated_at = self.prescription.updated_at
+        self.prescription.medication_name = 'Penicillin V'
+        with self.assertNumQueries(0):
+            self.prescription.save(update_fields=[])
+        stored = Prescription.objects.get(pk=self.prescription.pk)
+        self.assertEqual((stored.medication_name, stored.updated_at), ('Ibuprofen', updated_at))
+
+    def test_update_fields_moves_updated_at(self):
+        updated_at = self.prescription.updated_at
+        self.prescription.dosage = '400mg'
+        self.prescription.save(update_fields=['dosage'])
+        self.assertGreater(Prescription.objects.get(pk=self.prescription.pk).updated_at, updated_at)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_counts_shown_on_admin(self):
+        admin = User.objects.create_superuser(username='admin', password='admin', email='admin@example.com')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:medical_prescription_changelist'))
+        self.assertContains(response, f"{alert_check_stats['run']} run, {alert_check_stats['skipped']} skipped")
+
+
+class InteractionRuleChangeTests(TestCase):
+    """
+    Adding, editing or deleting a rule re-evaluates the stored conflict flags
+    """
+
+    def setUp(self):
+        patient = Patient.objects.create(
+            first_name='Test', last_name='Patient', date_of_birth='1970-01-01', gender='O',
+            national_id='RULE-1', phone_number='000', address='-',
+        )
+        visit = MedicalVisit.objects.create(patient=patient, chief_complaint='-', symptoms='-', diagnosis='-')
+        self.prescriptions = {
+            name: Prescription.objects.create(
+                visit=visit, patient=patient, medication_name=name, dosage='1', frequency='daily', duration='7 days',
+            )
+            for name in ('Zorbitol 10mg', 'Quellatine 5mg')
+        }
+
+    def has_conflict(self, name):
+        return Prescription.objects.get(pk=self.prescriptions[name].pk).has_conflict_alert
+
+    def test_rule_add_edit_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            rule = DrugInteraction.objects.create(drug='zorbitol', interacts_with='quellatine')
+        self.assertTrue(self.has_conflict('Zorbitol 10mg'))
+        self.assertFalse(self.has_conflict('Quellatine 5mg'))
+
+        rule.drug = 'quellatine'
+        rule.interacts_with = 'zorbitol'
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.save()
+        self.assertFalse(self.has_conflict('Zorbitol 10mg'))
+        self.assertTrue(self.has_conflict('Quellatine 5mg'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.delete()
+        self.assertFalse(self.has_conflict('Quellatine 5mg'))
+
+
+class PrescriptionBatchTests(TestCase):
+    """
+    A batch is checked against the active medications and against itself, in a fixed number of queries
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user(username='doctor', password='doctor', role='DOCTOR')
+        cls.patient = Patient.objects.create(
+            first_name='Test', last_name='Patient', date_of_birth='1970-01-01', gender='O',
+            national_id='BATCH-1', phone_number='000', address='-', allergies='penicillin',
+        )
+        DrugInteraction.objects.create(drug='zorbitol', interacts_with='quellatine')
+        DrugInteraction.objects.create(drug='vexamide', interacts_with='zorbitol')
+        # The rules are rolled back after the class; so must be the process-wide index
+        cls.addClassCleanup(invalidate_interaction_index)
+
+    def setUp(self):
+        self.visit = MedicalVisit.objects.create(
+            patient=self.patient, doctor=self.doctor, chief_complaint='-', symptoms='-', diagnosis='-',
+        )
+
+    def batch(self, *names):
+        return [Prescription(medication_name=name, dosage='1', frequency='daily', duration='7 days') for name in names]
+
+    def create(self, *names):
+        created = create_prescriptions(self.visit, self.doctor, self.batch(*names))
+        return {prescription.medication_name: prescription for prescription in created}
+
+    def test_conflict_with_active_prescription(self):
+        self.create('Quellatine 5mg')
+        created = self.create('Zorbitol 10mg')
+        self.assertEqual(created['Zorbitol 10mg'].conflict_alert_message, 'WARNING: Potential conflict with: Quellatine 5mg')
+
+    def test_conflict_within_batch(self):
+        created = self.create('Zorbitol 10mg', 'Quellatine 5mg', 'Vexamide')
+        self.assertIn('Quellatine 5mg', created['Zorbitol 10mg'].conflict_alert_message)
+        self.assertIn('Zorbitol 10mg', created['Vexamide'].conflict_alert_message)
+        self.assertFalse(created['Quellatine 5mg'].has_conflict_alert)
+        stored = Prescription.objects.get(pk=created['Zorbitol 10mg'].pk)
+        self.assertTrue(stored.has_conflict_alert)
+
+    def test_allergy_flags(self):
+        created = self.create('Penicillin V', 'Ibuprofen')
+        self.assertEqual(created['Penicillin V'].allergy_alert_message, 'WARNING: Patient is allergic to penicillin!')
+        self.assertFalse(created['Ibuprofen'].has_allergy_alert)
+        self.assertTrue(Prescription.objects.get(pk=created['Penicillin V'].pk).has_allergy_alert)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        self.visit.patient.get_allergy_set()
+        counts = []
+        for size in (2, 12):
+            with CaptureQueriesContext(connection) as queries:
+                create_prescriptions(self.visit, self.doctor, self.batch(*['Zorbitol 10mg'] * size))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class PrescriptionBatchViewTests(TestCase):
+    """
+    JSON requests to the batch prescribing endpoint
+    """
+
+    def setUp(self):
+        doctor = User.objects.create_user(username='doctor', password='doctor', role='DOCTOR')
+        patient = Patient.objects.create(
+            first_name='Test', last_name='Patient', date_of_birth='1970-01-01', gender='O',
+            national_id='BATCH-2', phone_number='000', address='-', allergies='penicillin',
+        )
+        visit = MedicalVisit.objects.create(patient=patient, chief_complaint='-', symptoms='-', diagnosis='-')
+        self.url = reverse('prescription_bulk_create', args=[visit.id])
+        self.client.force_login(doctor)
+
+    def post(self, body):
+        return self.client.post(self.url, data=json.dumps(body), content_type='application/json')
+
+    def item(self, name='Ibuprofen', **fields):
+        return {'medication_name': name, 'dosage': '200mg', 'frequency': 'daily', 'duration': '7 days', **fields}
+
+    def test_creates_prescriptions_with_alerts(self):
+        response = self.post([self.item('Penicillin V'), self.item()])
+        self.assertEqual(response.status_code, 201)
+        alerts = [prescription['allergy_alert'] for prescription in response.json()['prescriptions']]
+        self.assertEqual(alerts, ['WARNING: Patient is allergic to penicillin!', None])
+        self.assertEqual(Prescription.objects.count(), 2)
+
+    def test_body_must_be_a_list(self):
+        for body in ({'medication_name': 'Ibuprofen'}, [], ['Ibuprofen']):
+            response = self.post(body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('non-empty list', response.json()['error'])
+
+    def test_invalid_json(self):
+        response = self.client.post(self.url, data='[{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_too_many_items(self):
+        response = self.post([self.item()] * (PrescriptionFormSet.max_num + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'At most {PrescriptionFormSet.max_num}', response.json()['error'])
+
+    def test_invalid_row_is_reported_and_nothing_saved(self):
+        response = self.post([self.item(), self.item(dosage='')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), ['1'])
+        self.assertIn('dosage', response.json()['errors']['1'])
+        self.assertFalse(Prescription.objects.exists())
+
+
+class FollowUpWorklistTests(TestCase):
+    """
+    Due and overdue follow-ups of patients not seen since
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.localdate()
+        cls.doctor = User.objects.create_user(username='doctor', password='doctor', role='DOCTOR')
+        cls.other_doctor = User.objects.create_user(username='other', password='other', role='DOCTOR')
+        cls.visits = {}
+        for number, (name, doctor, due_in, active) in enumerate([
+            ('overdue', cls.doctor, -5, True),
+            ('due', cls.other_doctor, 3, True),
+            ('later', cls.doctor, 20, True),
+            ('seen', cls.doctor, -10, True),
+            ('inactive', cls.doctor, -2, False),
+        ]):
+            patient = Patient.objects.create(
+                first_name='Test', last_name=name.title(), date_of_birth='1970-01-01', gender='O',
+                national_id=f'FOLLOW-{number}', phone_number='000', address='-', is_active=active,
+            )
+            cls.visits[name] = cls.visit(patient, doctor, days_ago=30, follow_up_date=cls.today + timedelta(days=due_in))
+        # Seen again after the follow-up was set, so it is no longer open
+        cls.visit(cls.visits['seen'].patient, cls.other_doctor, days_ago=1)
+
+    @classmethod
+    def visit(cls, patient, doctor, days_ago, follow_up_date=None):
+        visit = MedicalVisit.objects.create(
+            patient=patient, doctor=doctor, chief_complaint='-', symptoms='-', diagnosis='-',
+            follow_up_date=follow_up_date,
+        )
+        MedicalVisit.objects.filter(pk=visit.pk).update(visit_date=timezone.now() - timedelta(days=days_ago))
+        return visit
+
+    def names(self, visits):
+        by_id = {visit.id: name for name, visit in self.visits.items()}
+        return sorted(by_id[visit.id] for visit in visits)
+
+    def test_scopes(self):
+        self.assertEqual(self.names(follow_up_worklist(scope='overdue')), ['overdue'])
+        self.assertEqual(self.names(follow_up_worklist(scope='week')), ['due'])
+        self.assertEqual(self.names(follow_up_worklist(scope='all')), ['due', 'overdue'])
+
+    def test_doctor_filter(self):
+        self.assertEqual(self.names(follow_up_worklist(doctor=self.doctor)), ['overdue'])
+        self.assertEqual(self.names(follow_up_worklist(doctor=self.other_doctor)), ['due'])
+
+    def test_later_visit_is_excluded_in_sql(self):
+        self.assertIn('NOT EXISTS', str(follow_up_worklist().query))
+        # A later follow-up date counts from the reference day
+        self.assertEqual(
+            self.names(follow_up_worklist(today=self.today + timedelta(days=14))), ['due', 'later', 'overdue'],
+        )
+
+    def test_api_defaults_to_own_follow_ups(self):
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse('follow_up_list_api'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['visit_id'] for row in response.json()['results']], [self.visits['overdue'].id])
+
+        response = self.client.get(reverse('follow_up_list_api'), {'doctor': '', 'scope': 'all'})
+        results = response.json()['results']
+        self.assertEqual(
+            [row['visit_id'] for row in results], [self.visits['overdue'].id, self.visits['due'].id],
+        )
+        self.assertEqual(results[0]['follow_up_date'], (self.today - timedelta(days=5)).isoformat())
+
+    def test_api_rejects_unknown_scope(self):
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse('follow_up_list_api'), {'scope': 'someday'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('scope', response.json()['errors'])
@@ -0,0 +1,124 @@
+"""
+Vital-sign time series
+
+Vitals are recorded as columns on each MedicalVisit. patient_vitals reads
+a patient's visits in one indexed range scan on (patient, visit_date),
+turns every vital into a NumPy column and downsamples each one on the server,
+so a chart of a long-term patient gets a few hundred points, not every visit.
+
+Two downsampling methods are available:
+    lttb    Largest-Triangle-Three-Buckets: keeps the points that preserve
+            the visual shape of the line (good default for trend charts)
+    minmax  Keeps the lowest and highest reading of every bucket, so no
+            extreme value (e.g. a hypertensive spike) is ever dropped
+"""
+
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .models import MedicalVisit
+
+VITAL_FIELDS = (
+    'blood_pressure_systolic',
+    'blood_pressure_diastolic',
+    'heart_rate',
+    'temperature',
+    'respiratory_rate',
+)
+
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets
+    
+    Args:
+        x: Increasing timestamps
+        y: Values (no NaN)
+        threshold: Number of points to keep (>= 3)
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    # First and last points are always kept; the rest is split into buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        # Average of the next bucket is the third vertex of the triangle
+        next_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        next_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept[bucket + 1] = previous
+    return kept
+
+
+def minmax(x, y, threshold):
+    """
+    Indices of the minimum and maximum point of threshold // 2 equal-count buckets
+    """
+    n = len(x)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    kept = set()
+    for bucket in np.array_split(np.arange(n), threshold // 2):
+        values = y[bucket]
+        kept.update((bucket[values.argmin()], bucket[values.argmax()]))
+    return np.array(sorted(kept), dtype=int)
+
+
+def start_of_day(day):
+    """
+    Aware datetime at midnight of a date, so range filters compare the raw indexed column
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def patient_vitals(patient_id, start=None, end=None, fields=VITAL_FIELDS, points=500, method='lttb'):
+    """
+    Downsampled vital-sign series of a patient as columnar arrays
+    
+    Args:
+        patient_id: Patient primary key
+        start, end: Optional inclusive date range of visits
+        fields: Vital columns to return
+        points: Maximum points per series
+        method: 'lttb' or 'minmax'
+    
+    Returns:
+        {field: {'t': [unix seconds], 'v': [values], 'count': readings before downsampling}}
+    """
+    visits = MedicalVisit.objects.filter(patient_id=patient_id)
+    if start:
+        visits = visits.filter(visit_date__gte=start_of_day(start))
+    if end:
+        visits = visits.filter(visit_date__lt=start_of_day(end + timedelta(days=1)))
+    rows = list(visits.order_by('visit_date').values_list('visit_date', *fields))
+    
+    timestamps = np.fromiter((row[0].timestamp() for row in rows), dtype=float, count=len(rows))
+    downsample = lttb if method == 'lttb' else minmax
+    series = {}
+    for column, field in enumerate(fields, start=1):
+        values = np.fromiter(
+            (np.nan if row[column] is None else row[column] for row in rows), dtype=float, count=len(rows)
+        )
+        recorded = ~np.isnan(values)
+        x, y = timestamps[recorded], values[recorded]
+        kept = downsample(x, y, points)
+        series[field] = {
+            't': x[kept].astype(np.int64).tolist(),
+            'v': y[kept].round(1).tolist(),
+            'count': int(recorded.sum()),
+        }
+    return series
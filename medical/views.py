@@ -1,9 +1,23 @@
+import json
+from datetime import timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
+from django.utils import timezone
+from emr_project.pagination import keyset_paginate
 from .models import MedicalVisit, Prescription
 from patients.models import Patient
-from .forms import MedicalVisitForm, PrescriptionForm
+from .forms import (
+    FollowUpFilterForm, MedicalVisitForm, PrescriptionForm, PrescriptionFormSet, VisitFilterForm, VitalsQueryForm,
+)
+from .prescribing import create_prescriptions
+from .timeseries import VITAL_FIELDS, patient_vitals, start_of_day
+from .worklist import follow_up_worklist
+
+VISITS_PER_PAGE = 25
+FOLLOW_UPS_PER_PAGE = 50
 
 
 @login_required
@@ -77,10 +91,133 @@ def visit_update(request, visit_id):
 @login_required
 def visit_list(request):
     """
-    List all medical visits
+    List medical visits, newest first, a keyset page at a time
+    
+    Optional filters: doctor, patient and a visit date range; each is served
+    by an index on (doctor|patient|-, -visit_date).
+    """
+    visits = MedicalVisit.objects.select_related('patient', 'doctor').only(
+        'visit_date', 'chief_complaint', 'diagnosis',
+        'patient__first_name', 'patient__last_name',
+        'doctor__first_name', 'doctor__last_name',
+    )
+    
+    filter_form = VisitFilterForm(request.GET or None)
+    if filter_form.is_valid():
+        filters = filter_form.cleaned_data
+        if filters['doctor']:
+            visits = visits.filter(doctor=filters['doctor'])
+        if filters['patient']:
+            visits = visits.filter(patient=filters['patient'])
+        if filters['date_from']:
+            visits = visits.filter(visit_date__gte=start_of_day(filters['date_from']))
+        if filters['date_to']:
+            visits = visits.filter(visit_date__lt=start_of_day(filters['date_to'] + timedelta(days=1)))
+    
+    page = keyset_paginate(visits, request.GET.get('cursor'), per_page=VISITS_PER_PAGE, keys=('visit_date', 'id'))
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    
+    return render(request, 'medical/visit_list.html', {
+        'visits': page,
+        'page': page,
+        'filter_form': filter_form,
+        'query': query.urlencode(),
+    })
+
+
+def _follow_up_page(request):
+    """
+    Filter form and current page of the follow-up worklist for a request
+    
+    Doctors see their own follow-ups unless another doctor (or all) is chosen.
+    """
+    form = FollowUpFilterForm(request.GET or None)
+    doctor = request.user if request.user.is_doctor() else None
+    scope = 'all'
+    if form.is_valid():
+        if 'doctor' in request.GET:
+            doctor = form.cleaned_data['doctor']
+        scope = form.cleaned_data['scope'] or 'all'
+    elif doctor is not None and not form.is_bound:
+        form = FollowUpFilterForm(initial={'doctor': doctor})
+    
+    visits = follow_up_worklist(doctor=doctor, scope=scope)
+    page = keyset_paginate(
+        visits, request.GET.get('cursor'), per_page=FOLLOW_UPS_PER_PAGE,
+        keys=('follow_up_date', 'id'), descending=False,
+    )
+    return form, page
+
+
+@login_required
+def follow_up_list(request):
+    """
+    Worklist of due and overdue follow-ups whose patient has not been seen since
     """
-    visits = MedicalVisit.objects.all()
-    return render(request, 'medical/visit_list.html', {'visits': visits})
+    form, page = _follow_up_page(request)
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    
+    return render(request, 'medical/follow_up_list.html', {
+        'visits': page,
+        'page': page,
+        'filter_form': form,
+        'query': query.urlencode(),
+        'today': timezone.localdate(),
+    })
+
+
+@login_required
+def follow_up_list_api(request):
+    """
+    JSON follow-up worklist; pass next_cursor back as ?cursor= for the next page
+    """
+    form, page = _follow_up_page(request)
+    if request.GET and not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    
+    return JsonResponse({
+        'results': [
+            {
+                'visit_id': visit.id,
+                'visit_date': visit.visit_date,
+                'follow_up_date': visit.follow_up_date,
+                'patient_id': visit.patient_id,
+                'patient_name': visit.patient.get_full_name(),
+                'patient_phone': visit.patient.phone_number,
+                'doctor_id': visit.doctor_id,
+            }
+            for visit in page
+        ],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+@login_required
+def patient_vitals_series(request, patient_id):
+    """
+    JSON vital-sign series of a patient, downsampled for charting
+    
+    Query parameters: start, end (YYYY-MM-DD), points (default 500),
+    method (lttb or minmax) and field (repeatable; default all vitals).
+    """
+    patient = get_object_or_404(Patient, id=patient_id, is_active=True)
+    form = VitalsQueryForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    
+    query = form.cleaned_data
+    series = patient_vitals(
+        patient.id,
+        start=query['start'],
+        end=query['end'],
+        fields=query['field'] or VITAL_FIELDS,
+        points=query['points'] or 500,
+        method=query['method'] or 'lttb',
+    )
+    return JsonResponse({'patient': patient.id, 'method': query['method'] or 'lttb', 'series': series})
 
 
 @login_required
@@ -117,6 +254,69 @@ def prescription_create(request, visit_id):
     })
 
 
+@login_required
+def prescription_bulk_create(request, visit_id):
+    """
+    Create several prescriptions for a visit in one transaction
+    
+    Accepts the HTML formset, or a JSON list of prescription objects
+    (medication_name, dosage, frequency, duration, instructions) to which
+    it answers with the created prescriptions and their alerts.
+    """
+    visit = get_object_or_404(MedicalVisit.objects.select_related('patient'), id=visit_id)
+    
+    if request.method == 'POST' and request.content_type == 'application/json':
+        try:
+            items = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON body.'}, status=400)
+        if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+            return JsonResponse({'error': 'Expected a non-empty list of prescriptions.'}, status=400)
+        if len(items) > PrescriptionFormSet.max_num:
+            return JsonResponse({'error': f'At most {PrescriptionFormSet.max_num} prescriptions per request.'}, status=400)
+        
+        forms = [PrescriptionForm(item) for item in items]
+        errors = {position: form.errors for position, form in enumerate(forms) if not form.is_valid()}
+        if errors:
+            return JsonResponse({'errors': errors}, status=400)
+        
+        created = create_prescriptions(visit, request.user, [form.save(commit=False) for form in forms])
+        return JsonResponse({'prescriptions': [
+            {
+                'id': prescription.id,
+                'medication_name': prescription.medication_name,
+                'allergy_alert': prescription.allergy_alert_message if prescription.has_allergy_alert else None,
+                'conflict_alert': prescription.conflict_alert_message if prescription.has_conflict_alert else None,
+            }
+            for prescription in created
+        ]}, status=201)
+    
+    if request.method == 'POST':
+        formset = PrescriptionFormSet(request.POST, queryset=Prescription.objects.none())
+        if formset.is_valid():
+            prescriptions = [form.save(commit=False) for form in formset.forms if form.has_changed()]
+            if prescriptions:
+                created = create_prescriptions(visit, request.user, prescriptions)
+                
+                # Display alerts if any
+                for prescription in created:
+                    if prescription.has_allergy_alert:
+                        messages.warning(request, f"{prescription.medication_name}: {prescription.allergy_alert_message}")
+                    if prescription.has_conflict_alert:
+                        messages.warning(request, f"{prescription.medication_name}: {prescription.conflict_alert_message}")
+                
+                messages.success(request, f'{len(created)} prescriptions have been created successfully!')
+                return redirect('visit_detail', visit_id=visit.id)
+            messages.error(request, 'Enter at least one prescription.')
+    else:
+        formset = PrescriptionFormSet(queryset=Prescription.objects.none())
+    
+    return render(request, 'medical/prescription_bulk_form.html', {
+        'formset': formset,
+        'visit': visit,
+    })
+
+
 @login_required
 def prescription_detail(request, prescription_id):
     """
@@ -139,7 +339,7 @@ def prescription_deactivate(request, prescription_id):
     
     if request.method == 'POST':
         prescription.is_active = False
-        prescription.save()
+        prescription.save(update_fields=['is_active'])
         messages.success(request, 'Prescription has been deactivated successfully!')
         return redirect('visit_detail', visit_id=prescription.visit.id)
     
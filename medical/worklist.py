@@ -0,0 +1,50 @@
+"""
+Follow-up worklist
+
+A visit is on the worklist when it set a follow_up_date that is due (or
+already past) and the patient has not been seen again since. Both parts are
+evaluated in SQL: the due-date range on the partial (doctor, follow_up_date)
+index and "seen again" as a NOT EXISTS on the (patient, -visit_date) index,
+so the cost follows the number of open follow-ups, not the visit history.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import MedicalVisit
+
+WORKLIST_SCOPES = {
+    'overdue': 'Overdue',
+    'week': 'Due this week',
+    'all': 'Overdue and due this week',
+}
+
+
+def follow_up_worklist(doctor=None, scope='all', today=None):
+    """
+    Open follow-ups, oldest due date first
+    
+    Args:
+        doctor: Restrict to visits of this doctor (default: all doctors)
+        scope: 'overdue' (before today), 'week' (today to 7 days ahead) or 'all'
+        today: Reference date (default: today in the current time zone)
+    """
+    today = today or timezone.localdate()
+    visits = MedicalVisit.objects.filter(follow_up_date__isnull=False, patient__is_active=True)
+    if doctor is not None:
+        visits = visits.filter(doctor=doctor)
+    if scope == 'overdue':
+        visits = visits.filter(follow_up_date__lt=today)
+    elif scope == 'week':
+        visits = visits.filter(follow_up_date__gte=today, follow_up_date__lte=today + timedelta(days=7))
+    else:
+        visits = visits.filter(follow_up_date__lte=today + timedelta(days=7))
+    
+    seen_since = MedicalVisit.objects.filter(patient=OuterRef('patient'), visit_date__gt=OuterRef('visit_date'))
+    return visits.filter(~Exists(seen_since)).select_related('patient', 'doctor').only(
+        'visit_date', 'follow_up_date', 'diagnosis',
+        'patient__first_name', 'patient__last_name', 'patient__phone_number', 'patient__is_active',
+        'doctor__first_name', 'doctor__last_name',
+    )
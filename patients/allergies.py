@@ -0,0 +1,89 @@
+"""
+Normalized patient allergies
+
+The free-text Patient.allergies field is parsed once per distinct value into a
+frozenset of lowercase terms (memoized, so an edit naturally yields a new
+entry). The same terms are mirrored into the indexed PatientAllergy table,
+kept in sync on save, for "which patients are allergic to X" queries
+(medical.alerts.patients_allergic_to, through medical.allergen_index).
+"""
+
+from functools import lru_cache
+
+# Bumped whenever this process writes PatientAllergy rows, so structures
+# derived from them (medical.allergen_index) know to reload
+_entries_generation = 0
+
+
+def entries_generation():
+    return _entries_generation
+
+
+def _entries_written():
+    global _entries_generation
+    _entries_generation += 1
+
+
+@lru_cache(maxsize=4096)
+def parse_allergies(text):
+    """
+    Normalized allergen terms from a comma-separated allergy list
+    """
+    return frozenset(term.strip().lower() for term in (text or '').split(',') if term.strip())
+
+
+def sync_allergy_entries(patient):
+    """
+    Bring the patient's PatientAllergy rows in line with Patient.allergies
+    
+    Returns:
+        True if the patient's allergies changed
+    """
+    from .models import PatientAllergy
+    
+    wanted = patient.get_allergy_set()
+    existing = set(patient.allergy_entries.values_list('allergen', flat=True))
+    if wanted == existing:
+        return False
+    patient.allergy_entries.exclude(allergen__in=wanted).delete()
+    PatientAllergy.objects.bulk_create(
+        [PatientAllergy(patient=patient, allergen=allergen) for allergen in wanted - existing],
+        ignore_conflicts=True,
+    )
+    _entries_written()
+    return True
+
+
+def sync_allergy_entries_many(patients):
+    """
+    sync_allergy_entries for many saved patients with one read, one delete and one insert
+    
+    Returns:
+        set of ids of the patients whose allergies changed
+    """
+    from .models import PatientAllergy
+    
+    wanted = {patient.pk: patient.get_allergy_set() for patient in patients}
+    existing = {}
+    stale = []
+    for entry_id, patient_id, allergen in PatientAllergy.objects.filter(
+        patient_id__in=list(wanted)
+    ).values_list('id', 'patient_id', 'allergen'):
+        existing.setdefault(patient_id, set()).add(allergen)
+        if allergen not in wanted[patient_id]:
+            stale.append(entry_id)
+    
+    changed = {pk for pk, allergens in wanted.items() if allergens != existing.get(pk, set())}
+    if stale:
+        PatientAllergy.objects.filter(id__in=stale).delete()
+    PatientAllergy.objects.bulk_create(
+        [
+            PatientAllergy(patient_id=pk, allergen=allergen)
+            for pk in changed for allergen in wanted[pk] - existing.get(pk, set())
+        ],
+        ignore_conflicts=True,
+    )
+    if changed:
+        _entries_written()
+    return changed
+
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PatientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'patients'
+
+    def ready(self):
+        from . import checks  # noqa: F401  (registers the chart cache deploy check)
+        from . import signals  # noqa: F401  (connects the allergy sync, search index and chart cache receivers)
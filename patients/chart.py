@@ -0,0 +1,96 @@
+"""
+Cached patient chart summary
+
+The patient detail page reads the patient, their recent visits, active
+prescriptions and latest risk predictions, each with the user who recorded
+it. The whole summary is built with eager-loaded relations and stored in
+Django's cache under a per-patient key, so a repeat view costs one cache
+hit instead of several queries.
+
+Entries are dropped by the post_save/post_delete receivers of every model
+the summary shows (see signals.py), and by invalidate_chart_summaries from
+code paths that write with bulk_create or QuerySet.update, which send no
+signals. The timeout bounds staleness of what no signal covers, such as a
+doctor's renamed account.
+
+An invalidation only reaches the cache of the process that runs it, so
+summaries are cached only in a backend shared by all workers (the
+CHART_SUMMARY_CACHE alias, 'shared' by default: Redis or a file-based cache
+chosen by EMR_SHARED_CACHE). With a per-process LocMemCache they are read
+from the database every time; `check --deploy` warns about it.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+CHART_CACHE_KEY = 'patients:chart:{}'
+
+RECENT_VISITS = 10
+ACTIVE_PRESCRIPTIONS = 10
+RECENT_PREDICTIONS = 5
+
+
+def chart_cache_key(patient_id):
+    return CHART_CACHE_KEY.format(patient_id)
+
+
+def chart_cache():
+    """
+    The cache holding chart summaries, or None if it is not shared between workers
+    """
+    cache = caches[getattr(settings, 'CHART_SUMMARY_CACHE', 'default')]
+    return None if isinstance(cache, LocMemCache) else cache
+
+
+def build_chart_summary(patient_id):
+    """
+    Chart summary of an active patient read from the database, or None
+    """
+    from .models import Patient
+    
+    patient = Patient.objects.filter(id=patient_id, is_active=True).first()
+    if patient is None:
+        return None
+    return {
+        'patient': patient,
+        'visits': list(patient.visits.select_related('doctor')[:RECENT_VISITS]),
+        'prescriptions': list(
+            patient.prescriptions.filter(is_active=True).select_related('doctor')[:ACTIVE_PRESCRIPTIONS]
+        ),
+        'risk_predictions': list(patient.risk_predictions.select_related('predicted_by')[:RECENT_PREDICTIONS]),
+    }
+
+
+def get_chart_summary(patient_id):
+    """
+    Chart summary of an active patient, from the cache when possible
+    
+    Returns:
+        dict with patient, visits, prescriptions and risk_predictions, or
+        None if there is no such active patient (not cached)
+    """
+    cache = chart_cache()
+    if cache is None:
+        return build_chart_summary(patient_id)
+    key = chart_cache_key(patient_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_chart_summary(patient_id)
+        if summary is not None:
+            cache.set(key, summary, getattr(settings, 'CHART_SUMMARY_CACHE_TIMEOUT', 300))
+    return summary
+
+
+def invalidate_chart_summaries(patient_ids):
+    """
+    Drop the cached summaries of patients once the current transaction commits
+    
+    Deleting only after commit keeps a concurrent request from caching the
+    pre-commit state again.
+    """
+    cache = chart_cache()
+    keys = [chart_cache_key(patient_id) for patient_id in set(patient_ids) if patient_id is not None]
+    if cache is not None and keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,16 @@
+from django.core.checks import Tags, Warning, register
+
+from .chart import chart_cache
+
+
+@register(Tags.caches, deploy=True)
+def check_chart_cache(app_configs, **kwargs):
+    if chart_cache() is None:
+        return [Warning(
+            'Patient chart summaries are not cached.',
+            hint='CHART_SUMMARY_CACHE names a per-process LocMemCache; set EMR_SHARED_CACHE to a redis:// '
+                 'URL or a cache directory (gunicorn.conf.py does this by default), or point '
+                 'CHART_SUMMARY_CACHE at another cache shared by all workers.',
+            id='patients.W001',
+        )]
+    return []
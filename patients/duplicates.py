@@ -0,0 +1,208 @@
+"""
+Duplicate patient detection
+
+Comparing a new registration with every existing chart is quadratic over
+the table. Instead each patient carries blocking keys, stored in indexed
+columns and computed on save:
+
+    dedup_name_key   Soundex of last name + Soundex of first name, so
+                     "Jon Smyth" and "John Smith" share the block S530J500
+    dedup_phone_key  Phone number reduced to its last 9 digits
+    date_of_birth    (already stored; indexed)
+
+Only patients sharing at least one block with the new record are fetched
+and scored with string similarity on name, national ID, phone and birth
+date. The batch job sorts the table by each key once and compares within
+blocks, which keeps it close to linear in the number of patients.
+"""
+
+import re
+from difflib import SequenceMatcher
+from itertools import combinations, groupby
+from types import SimpleNamespace
+
+from django.db.models import Q
+
+# Score from which a pair is reported as a likely duplicate
+DUPLICATE_THRESHOLD = 0.8
+
+# Blocks larger than this (e.g. a shared clinic phone number) are too
+# unspecific to be useful and are skipped by the batch job
+MAX_BLOCK_SIZE = 200
+
+PHONE_KEY_DIGITS = 9
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+
+def soundex(name):
+    """
+    American Soundex code of a name ('' if it has no letters)
+    """
+    letters = [char for char in (name or '').lower() if 'a' <= char <= 'z']
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], '')
+    for char in letters[1:]:
+        digit = _SOUNDEX_CODES.get(char, '')
+        if digit and digit != previous:
+            code += digit
+        # h and w do not separate letters with the same code; vowels do
+        if char not in 'hw':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def normalize_phone(phone):
+    """
+    Last PHONE_KEY_DIGITS digits of a phone number, so country prefixes and
+    separators do not matter
+    """
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-PHONE_KEY_DIGITS:]
+
+
+def name_key(first_name, last_name):
+    return soundex(last_name) + soundex(first_name)
+
+
+def _similarity(a, b):
+    a, b = (a or '').strip().lower(), (b or '').strip().lower()
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _date_similarity(a, b):
+    if a is None or b is None:
+        return 0.0
+    if a == b:
+        return 1.0
+    # Day and month swapped, or a single mistyped component
+    if (a.year, a.month, a.day) == (b.year, b.day, b.month):
+        return 0.8
+    return sum(x == y for x, y in ((a.year, b.year), (a.month, b.month), (a.day, b.day))) / 4
+
+
+def match_score(a, b, threshold=0.0):
+    """
+    Similarity of two patient records in [0, 1]
+    
+    Accepts Patient instances or any objects with first_name, last_name,
+    date_of_birth, national_id and phone_number. Cheap components are scored
+    first; if the pair can no longer reach threshold, 0.0 is returned without
+    running the remaining string comparisons.
+    """
+    phone_a, phone_b = normalize_phone(a.phone_number), normalize_phone(b.phone_number)
+    phone_exact = bool(phone_a) and phone_a == phone_b
+    score = 0.25 * _date_similarity(a.date_of_birth, b.date_of_birth) + (0.15 if phone_exact else 0.0)
+    # Remaining weight: name 0.4, national ID 0.2, and a partial phone match 0.075
+    if score + 0.6 + (0.0 if phone_exact else 0.075) < threshold:
+        return 0.0
+    
+    score += 0.2 * _similarity(a.national_id, b.national_id)
+    if score + 0.4 + (0.0 if phone_exact else 0.075) < threshold:
+        return 0.0
+    
+    name_a = f'{a.first_name} {a.last_name}'
+    score += 0.4 * max(
+        _similarity(name_a, f'{b.first_name} {b.last_name}'),
+        _similarity(name_a, f'{b.last_name} {b.first_name}'),
+    )
+    if not phone_exact:
+        score += 0.075 * _similarity(phone_a, phone_b)
+    return round(score, 3)
+
+
+def find_duplicate_candidates(patient, threshold=DUPLICATE_THRESHOLD, limit=5):
+    """
+    Existing active patients that likely are the same person as patient
+    
+    Args:
+        patient: Patient instance, saved or not
+        threshold: Minimum match_score
+        limit: Maximum candidates returned
+    
+    Returns:
+        [(score, Patient)], best match first
+    """
+    from .models import Patient
+    
+    blocks = Q(dedup_name_key=name_key(patient.first_name, patient.last_name))
+    if patient.date_of_birth:
+        blocks |= Q(date_of_birth=patient.date_of_birth)
+    phone_key = normalize_phone(patient.phone_number)
+    if phone_key:
+        blocks |= Q(dedup_phone_key=phone_key)
+    
+    candidates = Patient.objects.filter(blocks, is_active=True)
+    if patient.pk:
+        candidates = candidates.exclude(pk=patient.pk)
+    scored = [(match_score(patient, candidate, threshold), candidate) for candidate in candidates]
+    scored = [(score, candidate) for score, candidate in scored if score >= threshold]
+    scored.sort(key=lambda pair: (-pair[0], pair[1].pk))
+    return scored[:limit]
+
+
+def find_duplicate_pairs(threshold=DUPLICATE_THRESHOLD, max_block_size=MAX_BLOCK_SIZE):
+    """
+    Likely duplicate pairs among all active patients
+    
+    The table is read once per blocking scheme, sorted by its key, and pairs
+    are only compared within a block: same name key, same phone key, or same
+    birth date and last-name Soundex (birth date alone is too coarse for a
+    whole-table pass). A pair found through several schemes is scored once:
+    a scheme skips pairs that share the key of a usable block of an earlier
+    scheme, so no set of visited pairs has to be kept.
+    
+    Returns:
+        [(score, patient_id, other_patient_id)], best match first
+    """
+    from .models import Patient
+    
+    fields = ('id', 'first_name', 'last_name', 'date_of_birth', 'national_id', 'phone_number', 'dedup_name_key')
+    active = Patient.objects.filter(is_active=True)
+    # Block key of a row under each scheme, None for rows the scheme leaves out
+    schemes = (
+        (active.exclude(dedup_name_key='').order_by('dedup_name_key', 'id'), lambda row: row.dedup_name_key or None),
+        (active.exclude(dedup_phone_key='').order_by('dedup_phone_key', 'id'), lambda row: row.phone_key or None),
+        (active.exclude(dedup_name_key='').order_by('date_of_birth', 'dedup_name_key', 'id'),
+         lambda row: (row.date_of_birth, row.dedup_name_key[:4]) if row.dedup_name_key else None),
+    )
+    # Keys of the oversized blocks of each scheme, whose pairs were not compared
+    oversized = [set() for _ in schemes]
+    
+    def compared_before(scheme, first, second):
+        for earlier in range(scheme):
+            key = schemes[earlier][1](first)
+            if key is not None and key == schemes[earlier][1](second) and key not in oversized[earlier]:
+                return True
+        return False
+    
+    pairs = []
+    for scheme, (rows, block_key) in enumerate(schemes):
+        rows = (
+            SimpleNamespace(**dict(zip(fields, row)), phone_key=row[-1])
+            for row in rows.values_list(*fields, 'dedup_phone_key').iterator(chunk_size=5000)
+        )
+        for key, block in groupby(rows, key=block_key):
+            block = list(block)
+            if len(block) > max_block_size:
+                oversized[scheme].add(key)
+                continue
+            for first, second in combinations(sorted(block, key=lambda row: row.id), 2):
+                if compared_before(scheme, first, second):
+                    continue
+                score = match_score(first, second, threshold)
+                if score >= threshold:
+                    pairs.append((score, first.id, second.id))
+    pairs.sort(key=lambda pair: (-pair[0], pair[1], pair[2]))
+    return pairs
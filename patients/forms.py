@@ -43,3 +43,16 @@ class PatientSearchForm(forms.Form):
             'placeholder': 'Search by name, national ID, or phone number'
         })
     )
+
+
+class PatientImportForm(forms.Form):
+    """
+    Form for uploading a CSV file of patients
+    """
+    csv_file = forms.FileField(
+        label='CSV file',
+        help_text='Header row with first_name, last_name, date_of_birth, gender, national_id, phone_number, '
+                  'address and optionally email, blood_type, allergies, chronic_conditions, family_history, '
+                  'height, weight. Rows with an existing national ID update that patient.',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+    )
@@ -0,0 +1,287 @@
+"""
+Bulk patient import from CSV
+
+Entering a whole clinic through PatientForm takes one request per patient.
+import_patients instead streams a CSV file in fixed-size chunks with pandas,
+so memory use does not grow with the file:
+
+    1. Every chunk is validated column-wise (required values, lengths,
+       dates, choices, email, height/weight), not row by row.
+    2. Rejected rows go to a reject file with their row number and errors.
+    3. Valid rows are written with bulk_create, one transaction per chunk.
+       A national_id that already exists updates that patient (upsert):
+       only the columns in the file are written, and a blank optional cell
+       keeps the stored value instead of clearing it.
+
+bulk_create sends no post_save, so each chunk then does in bulk what the
+Patient receivers do on save: blocking keys, allergy entries, search index,
+chart and count caches. Other apps are told through patients_imported.
+"""
+
+import csv
+import time
+from decimal import Decimal
+
+import pandas as pd
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .allergies import sync_allergy_entries_many
+from .chart import invalidate_chart_summaries
+from .models import ACTIVE_PATIENT_COUNT_KEY, Patient
+from .search import index_patients
+from .signals import patients_imported
+
+REQUIRED_COLUMNS = (
+    'first_name', 'last_name', 'date_of_birth', 'gender', 'national_id', 'phone_number', 'address',
+)
+OPTIONAL_COLUMNS = (
+    'email', 'blood_type', 'allergies', 'chronic_conditions', 'family_history', 'height', 'weight',
+)
+IMPORT_COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+
+# Fields written besides the file's columns when a row's national_id already
+# exists (the blocking keys derive from the required name and phone columns)
+UPSERT_EXTRA_FIELDS = ['dedup_name_key', 'dedup_phone_key', 'updated_at']
+
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_BATCH_SIZE = 1000
+
+# Rejected rows kept on the result for display (all of them go to the reject file)
+REJECT_SAMPLE_SIZE = 20
+
+GENDER_VALUES = {'m': 'M', 'male': 'M', 'f': 'F', 'female': 'F', 'o': 'O', 'other': 'O'}
+BLOOD_TYPES = {value for value, _ in Patient.BLOOD_TYPE_CHOICES}
+EMAIL_PATTERN = r'[^@\s]+@[^@\s]+\.[^@\s]+'
+
+# Measurements must fit DecimalField(max_digits=5, decimal_places=2)
+MAX_MEASUREMENT = 1000
+
+
+class ImportResult:
+    """
+    Counters of one import run
+    """
+    
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.seconds = 0.0
+        self.reject_sample = []
+    
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def validate_chunk(frame, today=None):
+    """
+    Validate and clean a chunk of CSV rows
+    
+    Args:
+        frame: DataFrame of strings with (some of) the IMPORT_COLUMNS
+        today: Date after which a birth date is rejected (default: today)
+    
+    Returns:
+        (valid, rejects): cleaned rows ready for Patient(**row), and the
+        rejected rows as read plus 'row' (1-based data row) and 'errors'
+    """
+    today = today or timezone.localdate()
+    text = frame.reindex(columns=IMPORT_COLUMNS, fill_value='').apply(lambda column: column.str.strip())
+    present = text != ''
+    checks = [(~present[column], f'{column} is required') for column in REQUIRED_COLUMNS]
+    
+    for column in IMPORT_COLUMNS:
+        field = Patient._meta.get_field(column)
+        # Choice columns are checked against their choices after normalization
+        if field.max_length and not field.choices:
+            checks.append(
+                (text[column].str.len() > field.max_length, f'{column} is longer than {field.max_length} characters')
+            )
+    
+    birth_dates = pd.to_datetime(text['date_of_birth'], format='%Y-%m-%d', errors='coerce')
+    checks.append((present['date_of_birth'] & birth_dates.isna(), 'date_of_birth is not a YYYY-MM-DD date'))
+    checks.append((birth_dates > pd.Timestamp(today), 'date_of_birth is in the future'))
+    
+    gender = text['gender'].str.lower().map(GENDER_VALUES)
+    checks.append((present['gender'] & gender.isna(), 'gender must be M, F or O'))
+    
+    blood_type = text['blood_type'].str.upper()
+    checks.append((present['blood_type'] & ~blood_type.isin(BLOOD_TYPES), 'blood_type is not a valid blood type'))
+    
+    checks.append((present['email'] & ~text['email'].str.fullmatch(EMAIL_PATTERN), 'email is not valid'))
+    
+    measurements = {}
+    for column in ('height', 'weight'):
+        measurements[column] = pd.to_numeric(text[column].where(present[column]), errors='coerce').round(2)
+        checks.append((present[column] & measurements[column].isna(), f'{column} is not a number'))
+        out_of_range = (measurements[column] <= 0) | (measurements[column] >= MAX_MEASUREMENT)
+        checks.append((out_of_range, f'{column} must be between 0 and {MAX_MEASUREMENT}'))
+    
+    errors = pd.Series('', index=frame.index, dtype=object)
+    for failed, message in checks:
+        failed = failed.fillna(False).astype(bool)
+        errors = errors.mask(failed, errors + message + '; ')
+    rejected = errors != ''
+    
+    rejects = frame[rejected].copy()
+    rejects.insert(0, 'row', frame.index[rejected] + 1)
+    rejects['errors'] = errors[rejected].str.rstrip('; ')
+    
+    valid = text.assign(
+        date_of_birth=birth_dates.dt.date,
+        gender=gender,
+        blood_type=blood_type,
+        **measurements,
+    )[~rejected]
+    for column in OPTIONAL_COLUMNS:
+        valid[column] = valid[column].astype(object).where(present[column][~rejected], None)
+    return valid, rejects
+
+
+def _measurement(value):
+    return None if value is None or pd.isna(value) else Decimal(f'{value:.2f}')
+
+
+def build_patients(valid, created_by=None):
+    """
+    Unsaved Patient instances (blocking keys set) from validated rows
+    """
+    patients = []
+    for row in valid.to_dict('records'):
+        row['height'] = _measurement(row['height'])
+        row['weight'] = _measurement(row['weight'])
+        patient = Patient(created_by=created_by, **row)
+        patient.update_blocking_keys()
+        patients.append(patient)
+    return patients
+
+
+def keep_stored_values(valid, stored):
+    """
+    Fill the blank optional cells of existing patients with their stored values
+    
+    Args:
+        valid: Validated rows
+        stored: DataFrame of the existing patients' OPTIONAL_COLUMNS, indexed by national_id
+    """
+    valid = valid.copy()
+    for column in OPTIONAL_COLUMNS:
+        blank = valid[column].isna()
+        if blank.any():
+            filled = valid['national_id'].map(stored[column]).astype(object)
+            valid[column] = valid[column].where(~blank, filled.where(filled.notna(), None))
+    return valid
+
+
+def import_chunk(valid, created_by=None, batch_size=IMPORT_BATCH_SIZE, columns=IMPORT_COLUMNS):
+    """
+    Upsert one chunk of validated rows in a single transaction
+    
+    Args:
+        columns: Columns of the file; existing patients keep the other fields
+    
+    Returns:
+        (created, updated) patient counts
+    """
+    # The last row wins when a national_id repeats, as it would across chunks
+    valid = valid.drop_duplicates('national_id', keep='last')
+    national_ids = valid['national_id'].tolist()
+    update_fields = [
+        column for column in IMPORT_COLUMNS if column in columns and column != 'national_id'
+    ] + UPSERT_EXTRA_FIELDS
+    
+    with transaction.atomic():
+        stored = pd.DataFrame.from_records(
+            Patient.objects.filter(national_id__in=national_ids).values('national_id', *OPTIONAL_COLUMNS),
+            columns=['national_id', *OPTIONAL_COLUMNS],
+        ).set_index('national_id')
+        existing = set(stored.index)
+        if existing:
+            valid = keep_stored_values(valid, stored)
+        Patient.objects.bulk_create(
+            build_patients(valid, created_by), batch_size=batch_size,
+            update_conflicts=True, unique_fields=['national_id'], update_fields=update_fields,
+        )
+        
+        # What the Patient post_save receivers would have done, in bulk
+        saved = list(Patient.objects.filter(national_id__in=national_ids).only(
+            'id', 'first_name', 'last_name', 'national_id', 'phone_number', 'allergies', 'is_active',
+        ))
+        allergies_changed = sync_allergy_entries_many(saved)
+        index_patients(saved)
+        patient_ids = [patient.pk for patient in saved]
+        invalidate_chart_summaries(patient_ids)
+        patients_imported.send(
+            sender=Patient,
+            patient_ids=patient_ids,
+            allergies_changed_ids=[
+                patient.pk for patient in saved if patient.pk in allergies_changed and patient.national_id in existing
+            ],
+        )
+    cache.delete(ACTIVE_PATIENT_COUNT_KEY)
+    return len(national_ids) - len(existing), len(existing)
+
+
+def import_patients(source, created_by=None, reject_file=None, chunk_size=IMPORT_CHUNK_SIZE,
+                    batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Import patients from a CSV file, chunk by chunk
+    
+    Args:
+        source: Path or binary/text file object of a CSV with a header row
+            naming IMPORT_COLUMNS (others are ignored)
+        created_by: User recorded as creator of new patients
+        reject_file: Optional text file the rejected rows are written to as CSV
+        chunk_size: Rows read, validated and committed at a time
+        batch_size: Rows per INSERT statement
+        progress: Optional callable(ImportResult) called after each chunk
+    
+    Returns:
+        ImportResult
+    
+    Raises:
+        ValueError: If the file cannot be parsed or lacks a required column
+    """
+    result = ImportResult()
+    started = time.perf_counter()
+    today = timezone.localdate()
+    reject_header = True
+    
+    chunks = pd.read_csv(
+        source, dtype=str, keep_default_na=False, chunksize=chunk_size, encoding='utf-8-sig',
+        usecols=lambda column: column in IMPORT_COLUMNS,
+    )
+    for chunk in chunks:
+        missing = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+        if missing:
+            raise ValueError(f'Missing required columns: {", ".join(missing)}')
+        
+        valid, rejects = validate_chunk(chunk, today)
+        if len(valid):
+            created, updated = import_chunk(valid, created_by, batch_size, chunk.columns)
+            result.created += created
+            result.updated += updated
+            result.skipped += len(valid) - created - updated
+        
+        if len(rejects):
+            if reject_file is not None:
+                rejects.to_csv(reject_file, header=reject_header, index=False, quoting=csv.QUOTE_MINIMAL)
+                reject_header = False
+            room = REJECT_SAMPLE_SIZE - len(result.reject_sample)
+            result.reject_sample.extend(
+                rejects[['row', 'national_id', 'errors']].head(max(room, 0)).itertuples(index=False, name=None)
+            )
+        
+        result.rows += len(chunk)
+        result.rejected += len(rejects)
+        result.seconds = time.perf_counter() - started
+        if progress:
+            progress(result)
+    
+    result.seconds = time.perf_counter() - started
+    return result
@@ -0,0 +1,42 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand
+
+from patients.duplicates import DUPLICATE_THRESHOLD, MAX_BLOCK_SIZE, find_duplicate_pairs
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    help = 'List likely duplicate patient records, comparing only patients that share a blocking key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=DUPLICATE_THRESHOLD, help='Minimum match score (0-1)')
+        parser.add_argument('--max-block-size', type=int, default=MAX_BLOCK_SIZE,
+                            help='Skip blocks with more patients than this')
+        parser.add_argument('--output', help='Write the pairs to this CSV file instead of the console')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        pairs = find_duplicate_pairs(threshold=options['threshold'], max_block_size=options['max_block_size'])
+        elapsed = time.perf_counter() - started
+        
+        if options['output']:
+            ids = sorted({pk for pair in pairs for pk in pair[1:]})
+            names = {}
+            for start in range(0, len(ids), 1000):
+                names.update(
+                    (pk, (f'{first} {last}', national_id))
+                    for pk, first, last, national_id in Patient.objects.filter(id__in=ids[start:start + 1000])
+                    .values_list('id', 'first_name', 'last_name', 'national_id')
+                )
+            with open(options['output'], 'w', newline='') as output:
+                writer = csv.writer(output)
+                writer.writerow(['score', 'patient_id', 'name', 'national_id', 'other_patient_id', 'other_name', 'other_national_id'])
+                for score, first, second in pairs:
+                    writer.writerow([score, first, *names[first], second, *names[second]])
+        else:
+            for score, first, second in pairs:
+                self.stdout.write(f'{score:.3f}  patient {first} <-> patient {second}')
+        
+        self.stdout.write(self.style.SUCCESS(f'{len(pairs)} likely duplicate pairs found in {elapsed:.1f}s.'))
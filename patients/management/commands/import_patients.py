@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from patients.importing import IMPORT_BATCH_SIZE, IMPORT_CHUNK_SIZE, import_patients
+
+
+class Command(BaseCommand):
+    help = 'Import patients from a CSV file in chunks; existing national IDs are updated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='CSV file with a header row of Patient field names')
+        parser.add_argument('--rejects', help='Where to write rejected rows (default: <csv_file>.rejects.csv)')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+                            help='Rows validated and committed per transaction')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Rows per INSERT statement')
+        parser.add_argument('--created-by', help='Username recorded as creator of new patients')
+
+    def handle(self, *args, **options):
+        created_by = None
+        if options['created_by']:
+            try:
+                created_by = get_user_model().objects.get(username=options['created_by'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'No user named {options["created_by"]}')
+        reject_path = options['rejects'] or f'{options["csv_file"]}.rejects.csv'
+
+        def progress(result):
+            self.stdout.write(
+                f'{result.rows} rows: {result.created} created, {result.updated} updated, '
+                f'{result.rejected} rejected ({result.rows_per_second:,.0f} rows/s)'
+            )
+
+        try:
+            with open(reject_path, 'w', newline='') as reject_file:
+                result = import_patients(
+                    options['csv_file'], created_by=created_by, reject_file=reject_file,
+                    chunk_size=options['chunk_size'], batch_size=options['batch_size'], progress=progress,
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Import failed: {error}')
+
+        if result.rejected:
+            self.stdout.write(self.style.WARNING(f'{result.rejected} rejected rows written to {reject_path}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {result.rows} rows in {result.seconds:.1f}s ({result.rows_per_second:,.0f} rows/s); '
+            f'{result.created} created, {result.updated} updated, {result.skipped} superseded by a later row.'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from patients.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the patient search index from the Patient table (SQLite FTS5; a no-op on PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Patients indexed per batch')
+
+    def handle(self, *args, **options):
+        total = rebuild_search_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Search index holds {total} active patients.'))
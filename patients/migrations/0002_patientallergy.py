@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-18 01:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_allergies(apps, schema_editor):
+    from patients.allergies import parse_allergies
+    
+    Patient = apps.get_model('patients', 'Patient')
+    PatientAllergy = apps.get_model('patients', 'PatientAllergy')
+    entries = []
+    for patient_id, allergies in Patient.objects.exclude(allergies='').values_list('id', 'allergies').iterator():
+        entries.extend(PatientAllergy(patient_id=patient_id, allergen=a) for a in parse_allergies(allergies))
+        if len(entries) >= 5000:
+            PatientAllergy.objects.bulk_create(entries, ignore_conflicts=True)
+            entries = []
+    PatientAllergy.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientAllergy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('allergen', models.CharField(db_index=True, max_length=200)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allergy_entries', to='patients.patient')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='patientallergy',
+            constraint=models.UniqueConstraint(fields=('patient', 'allergen'), name='unique_patient_allergen'),
+        ),
+        migrations.RunPython(backfill_allergies, migrations.RunPython.noop),
+    ]
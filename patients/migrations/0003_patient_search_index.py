@@ -0,0 +1,47 @@
+# Generated by Django 4.2 on 2026-10-18 02:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from patients.search import POSTGRES_DOCUMENT, SEARCH_TABLE, document_values
+
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(name, identifiers, tokenize='trigram')"
+        )
+        Patient = apps.get_model('patients', 'Patient')
+        rows = [
+            (patient.id, *document_values(patient))
+            for patient in Patient.objects.filter(is_active=True).iterator(chunk_size=5000)
+        ]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, identifiers) VALUES (%s, %s, %s)', rows
+            )
+    elif schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS patients_patient_search_trgm ON patients_patient '
+            f'USING gin (({POSTGRES_DOCUMENT}) gin_trgm_ops) WHERE is_active'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    from patients.search import SEARCH_TABLE
+
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+    elif schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS patients_patient_search_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0002_patientallergy'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
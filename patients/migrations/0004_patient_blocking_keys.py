@@ -0,0 +1,43 @@
+# Generated by Django 4.2 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+def backfill_blocking_keys(apps, schema_editor):
+    from patients.duplicates import name_key, normalize_phone
+    
+    Patient = apps.get_model('patients', 'Patient')
+    batch = []
+    for patient in Patient.objects.only('first_name', 'last_name', 'phone_number').iterator(chunk_size=5000):
+        patient.dedup_name_key = name_key(patient.first_name, patient.last_name)
+        patient.dedup_phone_key = normalize_phone(patient.phone_number)
+        batch.append(patient)
+        if len(batch) >= 5000:
+            Patient.objects.bulk_update(batch, ['dedup_name_key', 'dedup_phone_key'])
+            batch = []
+    Patient.objects.bulk_update(batch, ['dedup_name_key', 'dedup_phone_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0003_patient_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='dedup_name_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=8),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='dedup_phone_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['date_of_birth'], name='patients_pa_date_of_4302f5_idx'),
+        ),
+        migrations.RunPython(backfill_blocking_keys, migrations.RunPython.noop),
+    ]
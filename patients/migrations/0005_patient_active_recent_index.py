@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0004_patient_blocking_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='patient_active_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0005_patient_active_recent_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['updated_at'], name='patients_pa_updated_efb345_idx'),
+        ),
+    ]
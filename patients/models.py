@@ -1,5 +1,10 @@
 from django.db import models
 from django.conf import settings
+from .allergies import parse_allergies
+from .duplicates import name_key, normalize_phone
+
+# Cache key of the cached number of active patients (cleared when patients change)
+ACTIVE_PATIENT_COUNT_KEY = 'patients:active_count'
 
 
 class Patient(models.Model):
@@ -49,16 +54,42 @@ class Patient(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
+    # Duplicate detection blocking keys (see patients.duplicates), set on save
+    dedup_name_key = models.CharField(max_length=8, blank=True, default='', editable=False, db_index=True)
+    dedup_phone_key = models.CharField(max_length=15, blank=True, default='', editable=False, db_index=True)
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['national_id']),
             models.Index(fields=['last_name', 'first_name']),
+            models.Index(fields=['date_of_birth']),
+            models.Index(fields=['updated_at']),
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(is_active=True),
+                name='patient_active_recent_idx',
+            ),
         ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.national_id})"
     
+    def save(self, *args, **kwargs):
+        self.update_blocking_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # updated_at is the incremental export watermark, so it moves on every save
+            kwargs['update_fields'] = set(update_fields) | {'dedup_name_key', 'dedup_phone_key', 'updated_at'}
+        super().save(*args, **kwargs)
+    
+    def update_blocking_keys(self):
+        """
+        Recompute the duplicate detection blocking keys from name and phone
+        """
+        self.dedup_name_key = name_key(self.first_name, self.last_name)
+        self.dedup_phone_key = normalize_phone(self.phone_number)
+    
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}"
     
@@ -72,3 +103,25 @@ class Patient(models.Model):
             height_m = float(self.height) / 100
             return round(float(self.weight) / (height_m ** 2), 2)
         return None
+    
+    def get_allergy_set(self):
+        """
+        Normalized allergen terms, parsed once per distinct allergies value
+        """
+        return parse_allergies(self.allergies)
+
+
+class PatientAllergy(models.Model):
+    """
+    One normalized allergen of a patient, mirrored from Patient.allergies
+    """
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='allergy_entries')
+    allergen = models.CharField(max_length=200, db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'allergen'], name='unique_patient_allergen'),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient.get_full_name()}: {self.allergen}"
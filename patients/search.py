@@ -0,0 +1,244 @@
+"""
+Patient search index
+
+Searching patients with icontains on several columns is a leading-wildcard
+LIKE, which scans the whole table. Instead names, national IDs and phone
+numbers are indexed by trigram, on the database the project runs on:
+
+    SQLite      An FTS5 virtual table (trigram tokenizer) with one row per
+                active patient, keyed by patient id and kept in sync by the
+                Patient save/delete signals.
+    PostgreSQL  A pg_trgm GIN index on the lowercased search document,
+                maintained by the database itself.
+
+A search first looks for patients containing every query term (substring,
+so prefixes match), ranked by relevance. Remaining result slots are filled
+by trigram similarity, which tolerates typos such as "Jhon Smtih": every
+query term is compared with its best-matching word of the patient, so one
+misspelt word in a long name still scores high.
+"""
+
+import re
+from difflib import SequenceMatcher
+
+from django.db import connection
+from django.db.models import Q
+
+SEARCH_TABLE = 'patients_patient_search'
+
+# Lowercased, space-separated search document of a patient, in SQL
+POSTGRES_DOCUMENT = (
+    "lower(first_name || ' ' || last_name || ' ' || national_id || ' ' || "
+    "regexp_replace(phone_number, '[^0-9]', '', 'g'))"
+)
+
+MIN_TERM_LENGTH = 3
+
+# Typo-tolerant fallback: trigram candidates fetched, and the edit similarity
+# (difflib ratio of each term against its best-matching word, averaged over
+# the terms) a candidate needs to be shown
+FUZZY_CANDIDATES = 200
+FUZZY_MIN_SIMILARITY = 0.6
+
+_TERM_RE = re.compile(r'\w+')
+
+
+def search_terms(query):
+    """
+    Lowercase search terms of a query (punctuation such as phone separators splits terms)
+    """
+    return _TERM_RE.findall(query.lower())
+
+
+def document_values(patient):
+    """
+    (name, identifiers) text indexed for a patient
+    
+    Words are padded like pg_trgm does ("  john  smith "), so word-initial
+    trigrams exist and a misspelt word still shares some with the original.
+    """
+    words = f'{patient.first_name} {patient.last_name}'.lower().split()
+    phone = re.sub(r'\D', '', patient.phone_number or '')
+    return ''.join(f'  {word}' for word in words) + ' ', f'{patient.national_id} {phone}'.lower()
+
+
+def trigrams(term):
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def fuzzy_pieces(term):
+    """
+    Substrings of a term of which a misspelling likely keeps at least one intact
+    
+    A long term is split in two halves: a single typo leaves one half
+    unchanged, and halves are far more selective than trigrams. Short terms
+    use their padded trigrams.
+    """
+    if len(term) >= 2 * MIN_TERM_LENGTH:
+        middle = len(term) // 2
+        return {term[:middle], term[middle:]}
+    return trigrams(term)
+
+
+def term_similarity(term, words):
+    """
+    Edit similarity of a query term to its best-matching word, or word prefix
+    
+    The prefix as long as the term is also compared, so a partly typed word
+    ("abernat") matches as well as a complete one.
+    """
+    best = 0.0
+    # The term is the cached side; cheap upper bounds skip hopeless words
+    matcher = SequenceMatcher(None, b=term)
+    for word in words:
+        for candidate in {word, word[:len(term)]}:
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+                best = max(best, matcher.ratio())
+    return best
+
+
+def similarity(terms, name, identifiers):
+    """
+    Mean over the query terms of their similarity to the patient's best-matching word
+    """
+    words = name.split() + identifiers.split()
+    return sum(term_similarity(term, words) for term in terms) / len(terms)
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def index_patients(patients):
+    """
+    Add or refresh patients in the search index (inactive ones are removed)
+    """
+    if connection.vendor != 'sqlite':
+        return
+    patients = list(patients)
+    remove_patients([patient.id for patient in patients if not patient.is_active])
+    rows = [(patient.id, *document_values(patient)) for patient in patients if patient.is_active]
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, name, identifiers) VALUES (%s, %s, %s)', rows
+            )
+
+
+def remove_patients(patient_ids):
+    if connection.vendor != 'sqlite' or not patient_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(pk,) for pk in patient_ids])
+
+
+def rebuild_search_index(chunk_size=5000):
+    """
+    Re-index every patient; returns the number of active patients indexed
+    """
+    from .models import Patient
+    
+    if connection.vendor != 'sqlite':
+        return Patient.objects.filter(is_active=True).count()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    total = 0
+    chunk = []
+    fields = ('id', 'first_name', 'last_name', 'national_id', 'phone_number', 'is_active')
+    for patient in Patient.objects.filter(is_active=True).only(*fields).iterator(chunk_size=chunk_size):
+        chunk.append(patient)
+        if len(chunk) >= chunk_size:
+            index_patients(chunk)
+            total += len(chunk)
+            chunk = []
+    index_patients(chunk)
+    return total + len(chunk)
+
+
+def _sqlite_search(terms, limit):
+    searchable = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    if not searchable:
+        return []
+    with connection.cursor() as cursor:
+        # Every term as a substring, best bm25 rank first
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank LIMIT %s',
+            [' AND '.join(_fts_phrase(term) for term in searchable), limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if len(ids) < limit:
+            # Typo tolerance: candidates sharing a piece of every term (bm25
+            # favours more and rarer shared pieces), re-ranked by edit similarity
+            fuzzy_query = ' AND '.join(
+                '(' + ' OR '.join(_fts_phrase(piece) for piece in sorted(fuzzy_pieces(term))) + ')'
+                for term in searchable
+            )
+            cursor.execute(
+                f'SELECT rowid, name, identifiers FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                f'ORDER BY rank LIMIT %s',
+                [fuzzy_query, max(limit * 4, FUZZY_CANDIDATES)],
+            )
+            found = set(ids)
+            scored = sorted(
+                ((similarity(searchable, name, identifiers), pk)
+                 for pk, name, identifiers in cursor.fetchall() if pk not in found),
+                reverse=True,
+            )
+            ids += [pk for score, pk in scored if score >= FUZZY_MIN_SIMILARITY]
+    return ids[:limit]
+
+
+def _postgres_search(terms, limit):
+    searchable = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    if not searchable:
+        return []
+    patterns = [f'%{term}%' for term in searchable]
+    substring = ' AND '.join([f'{POSTGRES_DOCUMENT} LIKE %s'] * len(searchable))
+    # Word similarity: each term against its best-matching part of the document
+    fuzzy = ' AND '.join([f'%s <%% {POSTGRES_DOCUMENT}'] * len(searchable))
+    closeness = ' + '.join([f'word_similarity(%s, {POSTGRES_DOCUMENT})'] * len(searchable))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id FROM patients_patient WHERE is_active AND (({substring}) OR ({fuzzy})) '
+            f'ORDER BY ({substring}) DESC, {closeness} DESC LIMIT %s',
+            [*patterns, *searchable, *patterns, *searchable, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_patient_ids(query, limit=100):
+    """
+    Ids of active patients matching a free-text query, most relevant first
+    """
+    terms = search_terms(query)
+    if connection.vendor == 'postgresql':
+        return _postgres_search(terms, limit)
+    if connection.vendor == 'sqlite':
+        return _sqlite_search(terms, limit)
+    return []
+
+
+def search_patients(query, limit=100):
+    """
+    Active patients matching a free-text query, most relevant first
+    
+    Queries with no term of 3+ characters use a prefix match on the name and
+    identifier columns instead of the trigram index.
+    """
+    from .models import Patient
+    
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if all(len(term) < MIN_TERM_LENGTH for term in terms) or connection.vendor not in ('sqlite', 'postgresql'):
+        prefix = query.strip()
+        return list(Patient.objects.filter(is_active=True).filter(
+            Q(last_name__istartswith=prefix) | Q(first_name__istartswith=prefix) |
+            Q(national_id__startswith=prefix) | Q(phone_number__startswith=prefix)
+        ).order_by('last_name', 'first_name')[:limit])
+    
+    ids = search_patient_ids(query, limit)
+    patients = Patient.objects.in_bulk(ids)
+    return [patients[pk] for pk in ids if pk in patients and patients[pk].is_active]
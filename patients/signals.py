@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .allergies import sync_allergy_entries
+from .chart import invalidate_chart_summaries
+from .models import ACTIVE_PATIENT_COUNT_KEY, Patient
+from .search import index_patients, remove_patients
+
+# Sent with the patient after an existing patient's allergy list changed
+allergies_changed = Signal()
+
+# Sent after a bulk import (which sends no post_save) with the ids of the
+# patients written and of existing patients whose allergy list changed
+patients_imported = Signal()
+
+
+@receiver(post_save, sender=Patient)
+def sync_allergies_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and sync_allergy_entries(instance) and not created:
+        allergies_changed.send(sender=Patient, patient=instance)
+
+
+@receiver(post_save, sender=Patient)
+def index_patient_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_patients([instance])
+
+
+@receiver(post_delete, sender=Patient)
+def unindex_patient_on_delete(sender, instance, **kwargs):
+    remove_patients([instance.pk])
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def reset_patient_count(sender, **kwargs):
+    cache.delete(ACTIVE_PATIENT_COUNT_KEY)
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_patient_chart(sender, instance, **kwargs):
+    invalidate_chart_summaries([instance.pk])
+
+
+# Lazy senders: the medical and ai_prediction apps depend on this one
+@receiver(post_save, sender='medical.MedicalVisit')
+@receiver(post_delete, sender='medical.MedicalVisit')
+@receiver(post_save, sender='medical.Prescription')
+@receiver(post_delete, sender='medical.Prescription')
+@receiver(post_save, sender='ai_prediction.HealthRiskPrediction')
+@receiver(post_delete, sender='ai_prediction.HealthRiskPrediction')
+def invalidate_chart_of_record(sender, instance, **kwargs):
+    invalidate_chart_summaries([instance.patient_id])
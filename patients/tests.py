@@ -1,3 +1,209 @@
-from django.test import TestCase
+import io
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from medical.models import MedicalVisit, Prescription
+from .chart import chart_cache_key, get_chart_summary
+from .duplicates import find_duplicate_pairs
+from .importing import import_patients
+from .models import ACTIVE_PATIENT_COUNT_KEY, Patient
+from .search import search_patients
+from .views import PATIENTS_PER_PAGE
+
+
+class FuzzySearchTests(TestCase):
+    """
+    A single misspelt or partly typed word still finds the patient
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patients = {}
+        for number, (first_name, last_name) in enumerate([
+            ('Jonathan', 'Abernathy'), ('John', 'Smith'), ('Mary', 'Johnson'), ('Peter', 'Novak'),
+        ]):
+            cls.patients[last_name] = Patient.objects.create(
+                first_name=first_name, last_name=last_name, date_of_birth='1970-01-01', gender='O',
+                national_id=f'SEARCH-{number}', phone_number=f'555-010{number}', address='-',
+            )
+
+    def assertFinds(self, query, *last_names):
+        found = search_patients(query)
+        for last_name in last_names:
+            self.assertIn(self.patients[last_name], found, query)
+        return found
+
+    def test_misspelt_first_name(self):
+        self.assertEqual(self.assertFinds('Jonathon', 'Abernathy')[0], self.patients['Abernathy'])
+
+    def test_misspelt_last_name(self):
+        self.assertEqual(self.assertFinds('Abrenathy', 'Abernathy')[0], self.patients['Abernathy'])
+        self.assertEqual(self.assertFinds('Smiht', 'Smith')[0], self.patients['Smith'])
+
+    def test_misspelt_term_of_two(self):
+        self.assertEqual(self.assertFinds('Jon Smiht', 'Smith')[0], self.patients['Smith'])
+
+    def test_typo_results_follow_substring_matches(self):
+        found = self.assertFinds('Jon', 'Abernathy', 'Smith')
+        self.assertEqual(found[0], self.patients['Abernathy'])
+
+    def test_unrelated_patients_are_not_shown(self):
+        self.assertNotIn(self.patients['Novak'], search_patients('Smiht'))
+
+
+class DuplicatePairsTests(TestCase):
+    """
+    A pair sharing several blocking keys is reported once
+    """
+
+    def test_pair_in_every_scheme_is_reported_once(self):
+        first, second = [
+            Patient.objects.create(
+                first_name=first_name, last_name=last_name, date_of_birth='1970-01-01', gender='O',
+                national_id=national_id, phone_number='+1 555 0100', address='-',
+            )
+            for first_name, last_name, national_id in [('John', 'Smith', 'DUP-1'), ('Jon', 'Smyth', 'DUP-2')]
+        ]
+        self.assertEqual([pair[1:] for pair in find_duplicate_pairs()], [(first.id, second.id)])
+
+
+class ChartSummaryCacheTests(TestCase):
+    """
+    Chart summaries are only cached where every worker sees the invalidation
+    """
+
+    def setUp(self):
+        self.patient = Patient.objects.create(
+            first_name='Test', last_name='Patient', date_of_birth='1970-01-01', gender='O',
+            national_id='CHART-1', phone_number='000', address='-',
+        )
+        self.key = chart_cache_key(self.patient.pk)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+    })
+    def test_not_cached_in_process_local_cache(self):
+        self.assertEqual(get_chart_summary(self.patient.pk)['patient'], self.patient)
+        self.assertIsNone(caches['shared'].get(self.key))
+
+    def test_cached_in_shared_cache_and_invalidated(self):
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir},
+        }):
+            get_chart_summary(self.patient.pk)
+            self.assertIsNotNone(caches['shared'].get(self.key))
+            with self.captureOnCommitCallbacks(execute=True):
+                MedicalVisit.objects.create(patient=self.patient, chief_complaint='-', symptoms='-', diagnosis='-')
+            self.assertIsNone(caches['shared'].get(self.key))
+            self.assertEqual(len(get_chart_summary(self.patient.pk)['visits']), 1)
+
+
+class ImportUpsertTests(TestCase):
+    """
+    Re-importing a patient only changes what the file actually provides
+    """
+
+    HEADER = 'national_id,first_name,last_name,date_of_birth,gender,phone_number,address'
+
+    def setUp(self):
+        self.patient = Patient.objects.create(
+            first_name='Test', last_name='Patient', date_of_birth='1970-01-01', gender='F',
+            national_id='IMPORT-1', phone_number='000', address='-', allergies='penicillin',
+            chronic_conditions='asthma', height=170, weight=65,
+        )
+        visit = MedicalVisit.objects.create(patient=self.patient, chief_complaint='-', symptoms='-', diagnosis='-')
+        self.prescription = Prescription.objects.create(
+            visit=visit, patient=self.patient, medication_name='Penicillin V', dosage='1', frequency='daily',
+            duration='7 days',
+        )
+
+    def run_import(self, header, row):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_patients(io.StringIO(f'{header}\n{row}\n'))
+        self.assertEqual((result.updated, result.rejected), (1, 0))
+        self.patient.refresh_from_db()
+
+    def assertKeptClinicalData(self):
+        self.assertEqual(self.patient.allergies, 'penicillin')
+        self.assertEqual(self.patient.chronic_conditions, 'asthma')
+        self.assertEqual(self.patient.height, Decimal('170.00'))
+        self.assertTrue(self.patient.allergy_entries.filter(allergen='penicillin').exists())
+        self.assertTrue(Prescription.objects.get(pk=self.prescription.pk).has_allergy_alert)
+
+    def test_columns_missing_from_file_are_kept(self):
+        self.run_import(self.HEADER, 'IMPORT-1,Test,Patient,1970-01-01,F,555-0100,New address')
+        self.assertEqual(self.patient.phone_number, '555-0100')
+        self.assertKeptClinicalData()
+
+    def test_blank_cells_are_kept(self):
+        self.run_import(
+            f'{self.HEADER},allergies,chronic_conditions,height,weight',
+            'IMPORT-1,Test,Patient,1970-01-01,F,000,-,,,,72',
+        )
+        self.assertEqual(self.patient.weight, Decimal('72.00'))
+        self.assertKeptClinicalData()
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PatientListTests(TestCase):
+    """
+    The patient list pages active patients newest first with a cached total
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='doctor', password='doctor', role='DOCTOR')
+        for number in range(PATIENTS_PER_PAGE + 10):
+            Patient.objects.create(
+                first_name='Test', last_name=f'Patient {number}', date_of_birth='1970-01-01', gender='O',
+                national_id=f'LIST-{number}', phone_number='000', address='-', is_active=number != 3,
+            )
+        cls.expected = list(
+            Patient.objects.filter(is_active=True).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        cache.delete(ACTIVE_PATIENT_COUNT_KEY)
+        self.client.force_login(self.user)
+
+    def get(self, **params):
+        return self.client.get(reverse('patient_list'), params)
+
+    def test_pages_cover_active_patients_once(self):
+        first = self.get()
+        self.assertEqual([patient.id for patient in first.context['patients']], self.expected[:PATIENTS_PER_PAGE])
+        second = self.get(cursor=first.context['page'].next_cursor)
+        self.assertEqual([patient.id for patient in second.context['patients']], self.expected[PATIENTS_PER_PAGE:])
+        self.assertFalse(second.context['page'].has_next())
+
+    def test_long_text_columns_are_deferred(self):
+        patient = next(iter(self.get().context['patients']))
+        deferred = patient.get_deferred_fields()
+        self.assertTrue({'address', 'allergies', 'chronic_conditions', 'family_history'} <= deferred)
+
+    def test_page_query_count_does_not_depend_on_depth(self):
+        with CaptureQueriesContext(connection) as first_page:
+            first = self.get()
+        with CaptureQueriesContext(connection) as second_page:
+            self.get(cursor=first.context['page'].next_cursor)
+        # The second request reuses the cached total
+        self.assertEqual(len(second_page), len(first_page) - 1)
+        self.assertFalse(any('OFFSET' in query['sql'] for query in second_page.captured_queries))
+
+    def test_total_is_cached_until_patients_change(self):
+        self.assertEqual(self.get().context['total_patients'], len(self.expected))
+        self.assertEqual(cache.get(ACTIVE_PATIENT_COUNT_KEY), len(self.expected))
+        Patient.objects.filter(pk=self.expected[0]).update(is_active=False)
+        self.assertEqual(self.get().context['total_patients'], len(self.expected))
+
+        Patient.objects.get(pk=self.expected[1]).save()
+        self.assertEqual(self.get().context['total_patients'], len(self.expected) - 1)
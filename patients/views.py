@@ -1,9 +1,23 @@
+from django.http import Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from .models import Patient
-from .forms import PatientForm, PatientSearchForm
+from emr_project.pagination import cached_count, keyset_paginate
+from .chart import get_chart_summary
+from .models import ACTIVE_PATIENT_COUNT_KEY, Patient
+from .forms import PatientForm, PatientImportForm, PatientSearchForm
+from .duplicates import find_duplicate_candidates
+from .importing import import_patients
+from .search import search_patients
+
+SEARCH_RESULT_LIMIT = 100
+PATIENTS_PER_PAGE = 50
+
+# Columns shown by the patient list; the long text fields stay deferred
+PATIENT_LIST_FIELDS = (
+    'national_id', 'first_name', 'last_name', 'date_of_birth', 'gender',
+    'phone_number', 'blood_type', 'created_at',
+)
 
 
 @login_required
@@ -12,21 +26,26 @@ def patient_list(request):
     View to list all patients with search functionality
     """
     search_form = PatientSearchForm(request.GET)
-    patients = Patient.objects.filter(is_active=True)
+    search_query = search_form.cleaned_data.get('search_query') if search_form.is_valid() else None
+    page = None
     
-    if search_form.is_valid():
-        search_query = search_form.cleaned_data.get('search_query')
-        if search_query:
-            patients = patients.filter(
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(national_id__icontains=search_query) |
-                Q(phone_number__icontains=search_query)
-            )
+    if search_query:
+        # Ranked results from the trigram search index
+        patients = search_patients(search_query, limit=SEARCH_RESULT_LIMIT)
+    else:
+        active = Patient.objects.filter(is_active=True)
+        page = keyset_paginate(
+            active.only(*PATIENT_LIST_FIELDS), request.GET.get('cursor'),
+            per_page=PATIENTS_PER_PAGE, keys=('created_at', 'id'),
+        )
+        patients = page
     
     context = {
         'patients': patients,
+        'page': page,
+        'total_patients': cached_count(Patient.objects.filter(is_active=True), ACTIVE_PATIENT_COUNT_KEY),
         'search_form': search_form,
+        'search_query': search_query,
     }
     return render(request, 'patients/patient_list.html', context)
 
@@ -36,18 +55,14 @@ def patient_detail(request, patient_id):
     """
     View to display detailed patient information
     """
-    patient = get_object_or_404(Patient, id=patient_id, is_active=True)
-    
-    # Get related data
-    visits = patient.visits.all()[:10]  # Last 10 visits
-    prescriptions = patient.prescriptions.filter(is_active=True)[:10]
-    risk_predictions = patient.risk_predictions.all()[:5]
+    # Patient, recent visits, active prescriptions and predictions in one cache hit
+    summary = get_chart_summary(patient_id)
+    if summary is None:
+        raise Http404('No Patient matches the given query.')
+    patient = summary['patient']
     
     context = {
-        'patient': patient,
-        'visits': visits,
-        'prescriptions': prescriptions,
-        'risk_predictions': risk_predictions,
+        **summary,
         'bmi': patient.calculate_bmi(),
         'age': patient.get_age(),
     }
@@ -63,6 +78,17 @@ def patient_create(request):
         form = PatientForm(request.POST)
         if form.is_valid():
             patient = form.save(commit=False)
+            
+            # Ask for confirmation if the patient looks already registered
+            if not request.POST.get('confirm_new_patient'):
+                duplicates = find_duplicate_candidates(patient)
+                if duplicates:
+                    return render(request, 'patients/patient_form.html', {
+                        'form': form,
+                        'action': 'Create',
+                        'duplicates': duplicates,
+                    })
+            
             patient.created_by = request.user
             patient.save()
             messages.success(request, f'Patient {patient.get_full_name()} has been created successfully!')
@@ -110,3 +136,29 @@ def patient_delete(request, patient_id):
         return redirect('patient_list')
     
     return render(request, 'patients/patient_confirm_delete.html', {'patient': patient})
+
+
+@login_required
+def patient_import(request):
+    """
+    Admin view to import patients from an uploaded CSV file
+    """
+    if not request.user.is_admin():
+        messages.error(request, 'You do not have permission to import patients.')
+        return redirect('patient_list')
+    
+    form = PatientImportForm(request.POST or None, request.FILES or None)
+    result = None
+    if request.method == 'POST' and form.is_valid():
+        try:
+            result = import_patients(form.cleaned_data['csv_file'], created_by=request.user)
+        except ValueError as error:
+            form.add_error('csv_file', f'The file could not be imported: {error}')
+        else:
+            messages.success(
+                request,
+                f'{result.rows} rows processed in {result.seconds:.1f}s: {result.created} created, '
+                f'{result.updated} updated, {result.rejected} rejected.'
+            )
+    
+    return render(request, 'patients/patient_import.html', {'form': form, 'result': result})
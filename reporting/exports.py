@@ -0,0 +1,200 @@
+"""
+Streaming data exports
+
+Reporting extracts of patients, visits, prescriptions and risk predictions
+are read with values_list() and QuerySet.iterator(), so rows are fetched
+from the database in chunks and never held in memory as model instances.
+Encoded rows are emitted in buffers of about EXPORT_BUFFER_SIZE bytes, as
+CSV or NDJSON, optionally gzip-compressed on the fly. The first bytes go
+out as soon as the first chunk is read, whatever the size of the table.
+
+Incremental exports:
+    An export includes every row visible when it starts. It also reports a
+    watermark (X-Export-Watermark header, or by the command) that a consumer
+    passes back as `since` on the next run, to get only the rows changed
+    after it.
+
+    updated_at is stamped when a row is written, not when its transaction
+    commits, so a row stamped just before an export started can become
+    visible only afterwards. The reported watermark therefore trails the
+    start of the export by EXPORT_WATERMARK_LAG seconds: consecutive
+    incremental exports overlap by that much, and consumers upsert rows by
+    id (which every dataset includes). Rows are missed only if their
+    transaction commits more than EXPORT_WATERMARK_LAG seconds after writing.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from ai_prediction.models import HealthRiskPrediction
+from medical.models import MedicalVisit, Prescription
+from patients.models import Patient
+
+# Each dataset: model, exported columns, date-range column and watermark column
+EXPORT_DATASETS = {
+    'patients': {
+        'model': Patient,
+        'fields': (
+            'id', 'national_id', 'first_name', 'last_name', 'date_of_birth', 'gender', 'phone_number',
+            'email', 'address', 'blood_type', 'allergies', 'chronic_conditions', 'family_history',
+            'height', 'weight', 'is_active', 'created_by_id', 'created_at', 'updated_at',
+        ),
+        'date_field': 'created_at',
+        'watermark_field': 'updated_at',
+    },
+    'visits': {
+        'model': MedicalVisit,
+        'fields': (
+            'id', 'patient_id', 'doctor_id', 'visit_date', 'chief_complaint', 'symptoms', 'diagnosis',
+            'blood_pressure_systolic', 'blood_pressure_diastolic', 'heart_rate', 'temperature',
+            'respiratory_rate', 'doctor_notes', 'treatment_plan', 'follow_up_date', 'created_at', 'updated_at',
+        ),
+        'date_field': 'visit_date',
+        'watermark_field': 'updated_at',
+    },
+    'prescriptions': {
+        'model': Prescription,
+        'fields': (
+            'id', 'visit_id', 'patient_id', 'doctor_id', 'medication_name', 'dosage', 'frequency', 'duration',
+            'instructions', 'has_allergy_alert', 'allergy_alert_message', 'has_conflict_alert',
+            'conflict_alert_message', 'is_active', 'prescribed_date', 'updated_at',
+        ),
+        'date_field': 'prescribed_date',
+        'watermark_field': 'updated_at',
+    },
+    # Predictions are never edited, so their creation time is the watermark
+    'predictions': {
+        'model': HealthRiskPrediction,
+        'fields': (
+            'id', 'patient_id', 'predicted_by_id', 'age', 'bmi', 'blood_pressure_systolic',
+            'blood_pressure_diastolic', 'has_family_history', 'risk_level', 'risk_score', 'model_version',
+            'recommendations', 'notes', 'prediction_date',
+        ),
+        'date_field': 'prediction_date',
+        'watermark_field': 'prediction_date',
+    },
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows fetched per database round trip, and bytes per emitted piece
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+def _json_value(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Cannot export {type(value).__name__} as JSON')
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class Export:
+    """
+    One export of a dataset, bounded by its watermark
+    """
+    
+    def __init__(self, dataset, date_from=None, date_to=None, since=None, until=None):
+        """
+        Args:
+            dataset: Key of EXPORT_DATASETS
+            date_from, date_to: Optional inclusive date range on the dataset's date column
+            since: Optional watermark of a previous export; only rows changed after it
+            until: Optional upper bound on the watermark column (default: now)
+        
+        Raises:
+            ValueError: If the dataset is unknown
+        """
+        if dataset not in EXPORT_DATASETS:
+            raise ValueError(f'Unknown dataset: {dataset}')
+        self.dataset = dataset
+        self.spec = EXPORT_DATASETS[dataset]
+        self.date_from = date_from
+        self.date_to = date_to
+        self.since = since
+        self.until = until or timezone.now()
+        # Where the next incremental export resumes (see the module docstring)
+        self.watermark = self.until - timedelta(seconds=getattr(settings, 'EXPORT_WATERMARK_LAG', 120))
+        self.rows = 0
+    
+    @property
+    def fields(self):
+        return self.spec['fields']
+    
+    def queryset(self):
+        """
+        Rows of the export as tuples of self.fields, in primary key order
+        """
+        watermark, date_field = self.spec['watermark_field'], self.spec['date_field']
+        rows = self.spec['model'].objects.filter(**{f'{watermark}__lte': self.until})
+        if self.since:
+            rows = rows.filter(**{f'{watermark}__gt': self.since})
+        if self.date_from:
+            rows = rows.filter(**{f'{date_field}__gte': _start_of_day(self.date_from)})
+        if self.date_to:
+            rows = rows.filter(**{f'{date_field}__lt': _start_of_day(self.date_to + timedelta(days=1))})
+        return rows.order_by('id').values_list(*self.fields)
+    
+    def _encoded(self, export_format):
+        """
+        Encoded text in pieces of about EXPORT_BUFFER_SIZE characters
+        """
+        buffer = io.StringIO()
+        rows = self.queryset().iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        if export_format == 'csv':
+            writer = csv.writer(buffer)
+            writer.writerow(self.fields)
+            write = writer.writerow
+        else:
+            fields = self.fields
+            
+            def write(row):
+                buffer.write(json.dumps(dict(zip(fields, row)), default=_json_value, separators=(',', ':')))
+                buffer.write('\n')
+        
+        for row in rows:
+            write(row)
+            self.rows += 1
+            if buffer.tell() >= EXPORT_BUFFER_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    def stream(self, export_format='csv', compress=False):
+        """
+        Yield the export as bytes, gzip-compressed on the fly if compress
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f'Unknown format: {export_format}')
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+        for piece in self._encoded(export_format):
+            data = piece.encode()
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor:
+            yield compressor.flush()
+    
+    def content_type(self, export_format, compress=False):
+        return 'application/gzip' if compress else EXPORT_FORMATS[export_format]
+    
+    def filename(self, export_format, compress=False):
+        name = f'{self.dataset}-{self.until:%Y%m%dT%H%M%S}.{export_format}'
+        return f'{name}.gz' if compress else name
@@ -0,0 +1,21 @@
+from django import forms
+
+from .exports import EXPORT_FORMATS
+
+
+class ExportForm(forms.Form):
+    """
+    Query parameters of a data export
+    """
+    format = forms.ChoiceField(choices=[(name, name) for name in EXPORT_FORMATS], required=False)
+    gzip = forms.BooleanField(required=False)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    since = forms.DateTimeField(required=False, help_text='Watermark of a previous export (ISO 8601)')
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError('date_from must not be after date_to.')
+        return cleaned_data
@@ -0,0 +1,131 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from medical.models import MedicalVisit
+from patients.models import Patient
+from .exports import Export
+
+
+def export_rows(export, export_format='csv'):
+    text = b''.join(export.stream(export_format)).decode()
+    if export_format == 'csv':
+        return list(csv.DictReader(io.StringIO(text)))
+    return [json.loads(line) for line in text.splitlines()]
+
+
+@override_settings(EXPORT_WATERMARK_LAG=120)
+class ExportTests(TestCase):
+    """
+    Exports select rows by date range and watermark, and stream CSV, NDJSON or gzip
+    """
+
+    def setUp(self):
+        self.patients = [
+            Patient.objects.create(
+                first_name='Test', last_name=f'Patient {number}', date_of_birth='1970-01-01', gender='O',
+                national_id=f'EXPORT-{number}', phone_number='000', address='-',
+            )
+            for number in range(3)
+        ]
+        # Created and last changed 10, 5 and 0 days ago
+        now = timezone.now()
+        for days, patient in zip((10, 5, 0), self.patients):
+            Patient.objects.filter(pk=patient.pk).update(
+                created_at=now - timedelta(days=days), updated_at=now - timedelta(days=days),
+            )
+
+    def national_ids(self, export):
+        return [row['national_id'] for row in export_rows(export)]
+
+    def test_full_export_includes_rows_written_just_now(self):
+        self.assertEqual(self.national_ids(Export('patients')), ['EXPORT-0', 'EXPORT-1', 'EXPORT-2'])
+
+    def test_watermark_trails_the_export(self):
+        export = Export('patients')
+        self.assertEqual(export.until - export.watermark, timedelta(seconds=120))
+
+    def test_since_returns_rows_changed_after_the_watermark(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertEqual(self.national_ids(Export('patients', since=since)), ['EXPORT-1', 'EXPORT-2'])
+
+    def test_incremental_exports_overlap_by_the_lag(self):
+        first = Export('patients')
+        export_rows(first)
+        Patient.objects.filter(pk=self.patients[0].pk).update(updated_at=first.until - timedelta(seconds=30))
+        self.assertIn('EXPORT-0', self.national_ids(Export('patients', since=first.watermark)))
+
+    def test_date_range_is_inclusive(self):
+        today = timezone.localdate()
+        export = Export('patients', date_from=today - timedelta(days=5), date_to=today - timedelta(days=1))
+        self.assertEqual(self.national_ids(export), ['EXPORT-1'])
+        export = Export('patients', date_from=today - timedelta(days=5), date_to=today)
+        self.assertEqual(self.national_ids(export), ['EXPORT-1', 'EXPORT-2'])
+
+    def test_ndjson(self):
+        rows = export_rows(Export('patients'), 'ndjson')
+        self.assertEqual(rows[0]['national_id'], 'EXPORT-0')
+        self.assertEqual(rows[0]['date_of_birth'], '1970-01-01')
+
+    def test_gzip_output_decompresses_to_the_plain_export(self):
+        export = Export('patients', until=timezone.now())
+        compressed = b''.join(export.stream('csv', compress=True))
+        plain = b''.join(Export('patients', until=export.until).stream('csv'))
+        self.assertEqual(gzip.decompress(compressed), plain)
+        self.assertEqual(export.rows, 3)
+
+    def test_unknown_dataset(self):
+        with self.assertRaises(ValueError):
+            Export('users')
+
+
+class ExportViewTests(TestCase):
+    """
+    The export endpoint is admin-only and reports the watermark for the next run
+    """
+
+    def setUp(self):
+        patient = Patient.objects.create(
+            first_name='Test', last_name='Patient', date_of_birth='1970-01-01', gender='O',
+            national_id='EXPORT-V', phone_number='000', address='-',
+        )
+        MedicalVisit.objects.create(patient=patient, chief_complaint='-', symptoms='-', diagnosis='-')
+        self.admin = User.objects.create_user(username='admin', password='admin', role='ADMIN')
+
+    def test_streams_gzipped_csv_with_watermark(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('export_data', args=['visits']), {'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('X-Export-Watermark', response)
+        text = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(len(text.splitlines()), 2)
+
+    def test_invalid_date_range(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('export_data', args=['visits']), {'date_from': '2026-02-01', 'date_to': '2026-01-01'},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_doctors_cannot_export(self):
+        self.client.force_login(User.objects.create_user(username='doctor', password='doctor', role='DOCTOR'))
+        response = self.client.get(reverse('export_data', args=['patients']))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_command_writes_file(self):
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/patients.ndjson'
+            call_command('export_data', 'patients', '--format', 'ndjson', '--output', path, stdout=output)
+            with open(path) as exported:
+                self.assertEqual(json.loads(exported.readline())['national_id'], 'EXPORT-V')
+        self.assertIn('--since', output.getvalue())
@@ -0,0 +1,42 @@
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect
+
+from .exports import EXPORT_DATASETS, Export
+from .forms import ExportForm
+
+
+@login_required
+def export_data(request, dataset):
+    """
+    Admin endpoint streaming a dataset as CSV or NDJSON (optionally gzipped)
+    
+    Query parameters: format (csv|ndjson), gzip (1), date_from/date_to
+    (YYYY-MM-DD) and since (watermark of a previous export). The watermark
+    of this export is returned in the X-Export-Watermark header.
+    """
+    if not request.user.is_admin():
+        messages.error(request, 'You do not have permission to export data.')
+        return redirect('dashboard')
+    if dataset not in EXPORT_DATASETS:
+        raise Http404('Unknown dataset')
+    
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    export_format = form.cleaned_data['format'] or 'csv'
+    compress = form.cleaned_data['gzip']
+    export = Export(
+        dataset,
+        date_from=form.cleaned_data['date_from'],
+        date_to=form.cleaned_data['date_to'],
+        since=form.cleaned_data['since'],
+    )
+    
+    response = StreamingHttpResponse(
+        export.stream(export_format, compress), content_type=export.content_type(export_format, compress),
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export.filename(export_format, compress)}"'
+    response['X-Export-Watermark'] = export.watermark.isoformat()
+    return response